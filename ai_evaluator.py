@@ -1,17 +1,44 @@
 """AI evaluator."""
 
-import csv
-import os
+import functools
+import hashlib
+import random
+import threading
+import time
+from dataclasses import dataclass, field
 from textwrap import dedent
+from typing import TYPE_CHECKING, Iterable, Iterator
 
-from openai import OpenAI
 from pydantic import BaseModel
 
-from job_description import JobDescription, cached_job_description
+from compaction import compact_description
+from job_description import JobDescription, cached_job_description, near_duplicates
+from job_store import job_store
+from metrics import METRICS
+from profiles import DEFAULT_PROFILE, PROMPT_FILE, Profile
+
+if TYPE_CHECKING:  # openai takes most of a second to import, see openai_client
+    from openai import OpenAI
+    from openai.types import CompletionUsage
 
 EVALUATIONS_DIR = "jobs_evaluated"
 
 MODEL = "gpt-4o"
+# Screen jobs with SCREENING_MODEL first, only close calls go to MODEL, see cascade.py
+CASCADE = False
+SCREENING_MODEL = "gpt-4o-mini"
+# Strip boilerplate from descriptions before sending them, see compaction.py
+COMPACT_DESCRIPTIONS = True
+# USD per million tokens: prompt, cached prompt, completion
+PRICES = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+}
+
+MAX_RETRIES = 6
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+COMPLETIONS_ENDPOINT = "openai/chat/completions"
 
 PROMPT = """
     You are a recruiter helping me to find a job given a description of my skills and experience.
@@ -64,44 +91,364 @@ class JobEvaluation(BotOutput):
     job_id: str
 
 
-def prompt() -> str:
-    """Format the prompt."""
-    with open("cv.txt", "r", encoding="utf-8") as f:
+@functools.cache
+def _profile(profile: Profile = DEFAULT_PROFILE) -> tuple[str, str, str]:
+    """CV, skills and prompt template of a profile."""
+    with open(profile.path("cv.txt"), "r", encoding="utf-8") as f:
         cv = f.read()
-    with open("skills.txt", "r", encoding="utf-8") as f:
+    with open(profile.path("skills.txt"), "r", encoding="utf-8") as f:
         skills = f.read()
-    return dedent(PROMPT.format(cv=cv, skills=skills))
-
-
-def ask_bot_to_evaluate(job: JobDescription) -> JobEvaluation:
-    """Get a job evaluation."""
-    completion = OpenAI().beta.chat.completions.parse(
-        model=MODEL,
-        temperature=0.2,
-        messages=[
-            {"role": "system", "content": prompt()},
-            {"role": "user", "content": f"{job.title}: {job.description}"},
-        ],
-        response_format=BotOutput,
+    template = profile.read(PROMPT_FILE) if profile.name else None
+    return cv, skills, template or PROMPT
+
+
+@functools.cache
+def prompt(profile: Profile = DEFAULT_PROFILE) -> str:
+    """Format the prompt, once per process and profile."""
+    cv, skills, template = _profile(profile)
+    return dedent(template.format(cv=cv, skills=skills))
+
+
+def _fingerprint(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+@functools.cache
+def prompt_fingerprint(profile: Profile = DEFAULT_PROFILE, model: str = MODEL) -> str:
+    """Hash of everything that affects an evaluation, stored with each cached one."""
+    return _fingerprint(*_profile(profile), model)
+
+
+@functools.cache
+def context_fingerprint(profile: Profile = DEFAULT_PROFILE, model: str = MODEL) -> str:
+    """Hash of everything but the skills that affects an evaluation.
+
+    An evaluation with a stale prompt fingerprint but the current context
+    fingerprint is only stale because skills.txt changed, see rescore.py.
+    """
+    cv, _, template = _profile(profile)
+    return _fingerprint(cv, template, model)
+
+
+def clear_caches() -> None:
+    """Read the CVs, skills and prompt templates again, e.g. after they were edited."""
+    for cached in (_profile, prompt, prompt_fingerprint, context_fingerprint):
+        cached.cache_clear()
+
+
+@dataclass
+class TokenUsage:
+    """Token usage summed over all completions of the run."""
+
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    cost_usd: float = 0.0  # Estimated, at the prices of the model of each completion
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, usage: "CompletionUsage | None", model: str = MODEL) -> None:
+        """Add the usage of a single completion."""
+        if usage is None:
+            return
+        cached_tokens = _cached_tokens(usage)
+        usage_cost = usage_cost_usd(usage, model)
+        with self._lock:
+            self.prompt_tokens += usage.prompt_tokens
+            self.completion_tokens += usage.completion_tokens
+            self.cached_tokens += cached_tokens
+            self.cost_usd += usage_cost
+        METRICS.increment("openai_tokens_total", usage.prompt_tokens, kind="prompt")
+        METRICS.increment("openai_tokens_total", cached_tokens, kind="cached")
+        METRICS.increment(
+            "openai_tokens_total", usage.completion_tokens, kind="completion"
+        )
+        METRICS.increment("openai_cost_usd_total", usage_cost)
+
+    def reset(self) -> None:
+        """Start counting from zero, e.g. before the next run of a daemon."""
+        with self._lock:
+            self.prompt_tokens = self.completion_tokens = self.cached_tokens = 0
+            self.cost_usd = 0.0
+
+    def summary(self) -> str:
+        """Human readable summary."""
+        cached_share = (
+            self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0
+        )
+        return (
+            f"Tokens: {self.prompt_tokens} prompt ({self.cached_tokens} cached, "
+            f"{cached_share:.0%}), {self.completion_tokens} completion, "
+            f"~${self.cost_usd:.2f}"
+        )
+
+
+def cost(
+    prompt_tokens: int, cached_tokens: int, completion_tokens: int, model: str = MODEL
+) -> float:
+    """Estimated cost in USD of the tokens, 0 for models without known prices."""
+    prompt_price, cached_price, completion_price = PRICES.get(model, (0, 0, 0))
+    return (
+        (prompt_tokens - cached_tokens) * prompt_price
+        + cached_tokens * cached_price
+        + completion_tokens * completion_price
+    ) / 1e6
+
+
+def _cached_tokens(usage: "CompletionUsage") -> int:
+    details = usage.prompt_tokens_details
+    return (details.cached_tokens or 0) if details else 0
+
+
+def usage_cost_usd(usage: "CompletionUsage | None", model: str = MODEL) -> float:
+    """Estimated cost in USD of a completion, if it had been made with `model`."""
+    if usage is None:
+        return 0.0
+    return cost(
+        usage.prompt_tokens, _cached_tokens(usage), usage.completion_tokens, model
+    )
+
+
+TOKEN_USAGE = TokenUsage()
+
+
+def chat_messages(
+    job: JobDescription,
+    compact: bool = COMPACT_DESCRIPTIONS,
+    profile: Profile = DEFAULT_PROFILE,
+) -> list[dict[str, str]]:
+    """Chat messages asking the bot to evaluate a job.
+
+    The system prompt is identical for every job and comes first so the
+    provider-side prompt cache keeps hitting.
+    """
+    description = compact_description(job) if compact else job.description
+    return [
+        {"role": "system", "content": prompt(profile)},
+        {"role": "user", "content": f"{job.title}: {description}"},
+    ]
+
+
+@functools.cache
+def openai_client() -> "OpenAI":
+    """OpenAI client shared by all evaluations, retries are done in ask_bot_to_evaluate.
+
+    openai is imported here rather than at the top, so scripts that only read
+    the cache, like jsons_to_csv, start without it.
+    """
+    from openai import OpenAI
+
+    return OpenAI(max_retries=0)
+
+
+@functools.cache
+def retryable_errors() -> tuple[type[Exception], ...]:
+    """Rate limits and transient errors of the OpenAI API."""
+    import openai
+
+    return (
+        openai.RateLimitError,
+        openai.APIConnectionError,
+        openai.APITimeoutError,
+        openai.InternalServerError,
     )
+
+
+def ask_bot_to_evaluate(
+    job: JobDescription,
+    compact: bool = COMPACT_DESCRIPTIONS,
+    profile: Profile = DEFAULT_PROFILE,
+    model: str = MODEL,
+) -> JobEvaluation:
+    """Get a job evaluation, retrying rate limits and transient errors with jittered backoff."""
+    return ask_bot_with_usage(job, compact, profile, model)[0]
+
+
+def ask_bot_with_usage(
+    job: JobDescription,
+    compact: bool = COMPACT_DESCRIPTIONS,
+    profile: Profile = DEFAULT_PROFILE,
+    model: str = MODEL,
+) -> tuple[JobEvaluation, "CompletionUsage | None"]:
+    """Same as ask_bot_to_evaluate, also returning the token usage."""
+    messages = chat_messages(job, compact, profile)
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            with METRICS.timer("http_request_seconds", endpoint=COMPLETIONS_ENDPOINT):
+                completion = openai_client().beta.chat.completions.parse(
+                    model=model,
+                    temperature=0.2,
+                    messages=messages,
+                    response_format=BotOutput,
+                )
+            break
+        except retryable_errors() as e:
+            import openai
+
+            if isinstance(e, openai.RateLimitError):
+                METRICS.increment(
+                    "http_rate_limited_total", endpoint=COMPLETIONS_ENDPOINT
+                )
+            if attempt == MAX_RETRIES:
+                raise
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+            print(
+                f"😴 {type(e).__name__} for job {job.job_id}, retrying in {delay:.1f}s"
+            )
+            time.sleep(delay)
+    TOKEN_USAGE.add(completion.usage, model)
     bot_output = completion.choices[0].message.parsed
     assert bot_output is not None
-    return JobEvaluation(job_id=job.job_id, **bot_output.model_dump())
+    job_evaluation = JobEvaluation(job_id=job.job_id, **bot_output.model_dump())
+    return job_evaluation, completion.usage
 
 
-def cached_job_evaluation(job: JobDescription) -> JobEvaluation:
-    """Cached job evaluation."""
-    if not os.path.exists(EVALUATIONS_DIR):
-        os.makedirs(EVALUATIONS_DIR)
-    file_name = f"{EVALUATIONS_DIR}/{job.job_id}.json"
-    if os.path.exists(file_name):
-        with open(file_name, encoding="utf-8") as file:
-            return JobEvaluation.model_validate_json(file.read())
+@functools.cache
+def _adopt_legacy_evaluations() -> None:
+    """Mark evaluations cached before prompt fingerprints as current, once.
 
-    job_evaluation = ask_bot_to_evaluate(job)
+    The old cache was made with the same prompt, and treating it as stale would
+    pay for evaluating all of it again.
+    """
+    adopted = job_store().stamp_legacy_evaluations(prompt_fingerprint())
+    if adopted:
+        print(f"Adopted {adopted} evaluations cached before prompt fingerprints")
 
-    with open(file_name, "w", encoding="utf-8") as file:
-        file.write(job_evaluation.model_dump_json())
+
+def _current_fingerprints(profile: Profile) -> set[str]:
+    """Fingerprints of the evaluations of a profile that are not stale.
+
+    With CASCADE, evaluations decided by SCREENING_MODEL are current too.
+    """
+    if not profile.name:
+        _adopt_legacy_evaluations()
+    current = {prompt_fingerprint(profile)}
+    if CASCADE:
+        current.add(prompt_fingerprint(profile, SCREENING_MODEL))
+    return current
+
+
+def load_job_evaluation(
+    job_id: str, any_prompt: bool = False, profile: Profile = DEFAULT_PROFILE
+) -> JobEvaluation | None:
+    """Load a cached job evaluation made with the current prompt (or with any prompt)."""
+    current = _current_fingerprints(profile)
+    cached = job_store().get_evaluation(job_id, profile.name)
+    if cached is None:
+        return None
+    data, fingerprint, _ = cached
+    if not any_prompt and fingerprint not in current:
+        return None
+    return JobEvaluation.model_validate_json(data)
+
+
+def unevaluated_job_ids(job_ids: list[str], profiles: Iterable[Profile]) -> set[str]:
+    """The ids among `job_ids` that some profile neither evaluated nor skipped.
+
+    Evaluations and pre-filter skips only count if they are current.
+    """
+    unevaluated: set[str] = set()
+    for profile in profiles:
+        current = _current_fingerprints(profile)
+        skip_fingerprint = prompt_fingerprint(profile)
+        evaluated = job_store().get_evaluation_fingerprints(job_ids, profile.name)
+        skipped = job_store().get_skip_fingerprints(job_ids, profile.name)
+        unevaluated.update(
+            job_id
+            for job_id in job_ids
+            if evaluated.get(job_id) not in current
+            and skipped.get(job_id) != skip_fingerprint
+        )
+    return unevaluated
+
+
+def save_job_evaluations(
+    job_evaluations: Iterable[JobEvaluation],
+    profile: Profile = DEFAULT_PROFILE,
+    model: str = MODEL,
+) -> None:
+    """Save job evaluations made by `model` to the cache in one transaction."""
+    fingerprint = prompt_fingerprint(profile, model)
+    context = context_fingerprint(profile, model)
+    job_store().put_evaluations(
+        (
+            profile.name,
+            e.job_id,
+            e.fit_to_requirements_percentage,
+            fingerprint,
+            context,
+            e.model_dump_json(),
+        )
+        for e in job_evaluations
+    )
+
+
+def save_job_evaluation(
+    job_evaluation: JobEvaluation,
+    profile: Profile = DEFAULT_PROFILE,
+    model: str = MODEL,
+) -> None:
+    """Save a job evaluation made by `model` to the cache."""
+    save_job_evaluations([job_evaluation], profile, model)
+
+
+def cached_job_evaluations(
+    min_fit: int | None = None, profile: Profile = DEFAULT_PROFILE
+) -> Iterator[tuple[JobDescription, JobEvaluation]]:
+    """Cached evaluations with at least `min_fit`, with their job descriptions."""
+    for evaluation_data, description_data in job_store().iter_evaluations(
+        min_fit, profile.name
+    ):
+        evaluation = JobEvaluation.model_validate_json(evaluation_data)
+        if description_data is None:
+            raise ValueError(
+                f"Job description for {evaluation.job_id} not found in the job store"
+            )
+        yield JobDescription.model_validate_json(description_data), evaluation
+
+
+def duplicate_evaluation(
+    job: JobDescription, profile: Profile = DEFAULT_PROFILE
+) -> JobEvaluation | None:
+    """Reuse the evaluation of a near-duplicate posting, if one was evaluated."""
+    for duplicate_id in near_duplicates(job):
+        original = load_job_evaluation(duplicate_id, profile=profile)
+        if original is not None:
+            job_evaluation = original.model_copy(update={"job_id": job.job_id})
+            save_job_evaluation(job_evaluation, profile)
+            return job_evaluation
+    return None
+
+
+def cached_job_evaluation(
+    job: JobDescription, profile: Profile = DEFAULT_PROFILE
+) -> JobEvaluation:
+    """Cached job evaluation, re-evaluated if the prompt, CV or skills changed.
+
+    Every profile has its own evaluations, see profiles.py.
+    """
+    job_evaluation = load_job_evaluation(job.job_id, profile=profile)
+    if job_evaluation is not None:
+        METRICS.increment("cache_lookups_total", cache="job_evaluation", result="hit")
+        return job_evaluation
+    job_evaluation = duplicate_evaluation(job, profile)
+    if job_evaluation is not None:
+        METRICS.increment(
+            "cache_lookups_total", cache="job_evaluation", result="duplicate"
+        )
+        return job_evaluation
+
+    METRICS.increment("cache_lookups_total", cache="job_evaluation", result="miss")
+    if CASCADE:
+        # Imported here, cascade.py builds on this module
+        from cascade import cascade_evaluation
+
+        return cascade_evaluation(job, profile)
+    job_evaluation = ask_bot_to_evaluate(job, profile=profile)
+    save_job_evaluation(job_evaluation, profile)
     return job_evaluation
 
 
@@ -136,31 +483,12 @@ def format_bot_output(bot_output: BotOutput) -> str:
     )
 
 
-def jsons_to_csv():
-    """Convert JSONs to a CSV."""
-    out = []
-    for file_name in os.listdir(EVALUATIONS_DIR):
-        with open(f"{EVALUATIONS_DIR}/{file_name}", encoding="utf-8") as f:
-
-            job = JobEvaluation.model_validate_json(f.read())
-            row = {
-                "id": job.job_id,
-                "what_the_company_does": job.what_the_company_does,
-                "job_description_summary": job.job_description_summary,
-                "fit_to_requirements_percentage": job.fit_to_requirements_percentage,
-                "fit_to_requirements_explanation": job.fit_to_requirements_explanation,
-                "seniority_level": job.seniority_level_1_to_5,
-                "requirements": format_requirements(job.requirements),
-            }
-        job_description = cached_job_description(job.job_id)
-        row.update(job_description.model_dump())
-        if "description" in row:
-            del row["description"]
-        out.append(row)
-    with open("jobs_evaluated.csv", "w", encoding="utf-8", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=out[0].keys())
-        writer.writeheader()
-        writer.writerows(out)
+def jsons_to_csv() -> int:
+    """Export the cached evaluations to a CSV, see export.py."""
+    # Imported here, export parses in worker processes that don't need OpenAI
+    from export import export_evaluations
+
+    return export_evaluations()
 
 
 if __name__ == "__main__":
@@ -1,39 +1,80 @@
 """Airtable API wrapper."""
 
 import os
-
-from pyairtable import Api
-from pyairtable.formulas import match
+from typing import Optional
 
 from ai_evaluator import JobEvaluation, format_bot_output
 from applications_table import AppTable
+from http_client import AdaptiveRateLimiter
+from metrics import METRICS
 
 from scrape_linkedin import JobDescription
 
+BATCH_SIZE = 10  # Airtable's limit of records per request
+REQUESTS_PER_SECOND = 5  # Airtable's rate limit per base
+
 
 class AirTable(AppTable):
-    """Airtable API wrapper."""
+    """Airtable API wrapper.
+
+    The ids already in the table are loaded once, new rows are queued and
+    upserted on `id` in batches of BATCH_SIZE records.
+    """
+
+    def __init__(self, app_id: Optional[str] = None, table_id: Optional[str] = None):
+        """Table `table_id` of base `app_id`, $APP_ID and $TABLE_ID by default."""
+        # Imported here, pyairtable takes most of a second to import
+        from pyairtable import Api
 
-    def __init__(self):
-        self.table = Api(os.environ["AIRTABLE_API_KEY"]).table(
-            os.environ["APP_ID"], os.environ["TABLE_ID"]
+        api = Api(
+            os.environ["AIRTABLE_API_KEY"],
+            endpoint_url=os.environ.get(
+                "AIRTABLE_ENDPOINT_URL", "https://api.airtable.com"
+            ),
         )
+        self.table = api.table(
+            app_id or os.environ["APP_ID"], table_id or os.environ["TABLE_ID"]
+        )
+        self.limiter = AdaptiveRateLimiter(
+            rate=REQUESTS_PER_SECOND, max_rate=REQUESTS_PER_SECOND
+        )
+        self.pending: list[dict] = []
+        self.limiter.acquire()
+        with METRICS.timer("http_request_seconds", endpoint="airtable/list"):
+            self.job_ids = {
+                record["fields"]["id"]
+                for record in self.table.all(fields=["id"])
+                if "id" in record["fields"]
+            }
 
     def job_id_in_table(self, job_id: str) -> bool:
-        res = self.table.first(formula=match({"id": job_id}))
-        return res is not None
+        return job_id in self.job_ids
 
     def add_to_table(
         self, description: JobDescription, evaluation: JobEvaluation
     ) -> None:
-        self.table.create(
+        self.job_ids.add(description.job_id)
+        self.pending.append(
             {
-                "Job description": description.description,
-                "Company": description.company,
-                "Job": description.title,
-                "id": description.job_id,
-                "Stage": "Bot suggestion",
-                "url": description.url,
-                "bot opinion": format_bot_output(evaluation),
+                "fields": {
+                    "Job description": description.description,
+                    "Company": description.company,
+                    "Job": description.title,
+                    "id": description.job_id,
+                    "Stage": "Bot suggestion",
+                    "url": description.url,
+                    "bot opinion": format_bot_output(evaluation),
+                }
             }
         )
+        if len(self.pending) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        """Upsert the queued rows, one rate-limited request per BATCH_SIZE rows."""
+        while self.pending:
+            batch = self.pending[:BATCH_SIZE]
+            self.limiter.acquire()
+            with METRICS.timer("http_request_seconds", endpoint="airtable/upsert"):
+                self.table.batch_upsert(batch, key_fields=["id"])
+            del self.pending[:BATCH_SIZE]
@@ -7,7 +7,13 @@ from scrape_linkedin import JobDescription
 
 
 class AppTable(ABC):
-    """Abstract base class for application tables."""
+    """Abstract base class for application tables.
+
+    Implementations may buffer added rows, call `flush` (or use the table as a
+    context manager) to make sure everything is written.
+    """
+
+    job_ids: set[str]  # Ids of the jobs in the table
 
     @abstractmethod
     def job_id_in_table(self, job_id: str) -> bool:
@@ -18,3 +24,12 @@ class AppTable(ABC):
         self, description: JobDescription, evaluation: JobEvaluation
     ) -> None:
         """Add a job to the table."""
+
+    def flush(self) -> None:
+        """Write any buffered rows."""
+
+    def __enter__(self) -> "AppTable":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.flush()
@@ -0,0 +1,207 @@
+"""
+Offline evaluation of large backlogs through the OpenAI Batch API.
+
+Uncached jobs are written as one JSONL request file per batch, submitted, polled
+and the results are streamed into the evaluations cache. The ids of submitted
+batches are kept in a state file so a restarted run resumes polling them
+instead of paying for the same jobs twice.
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+
+from openai import OpenAI
+
+from ai_evaluator import (
+    MODEL,
+    BotOutput,
+    JobEvaluation,
+    chat_messages,
+    duplicate_evaluation,
+    load_job_evaluation,
+    openai_client,
+    save_job_evaluations,
+)
+from job_description import JobDescription, cached_job_descriptions
+from prefilter import prefiltered
+
+BATCH_DIR = "batches"
+STATE_FILE = f"{BATCH_DIR}/in_flight.json"
+ENDPOINT = "/v1/chat/completions"
+MAX_REQUESTS_PER_BATCH = 50_000
+POLL_INTERVAL = 60
+RESULTS_CHUNK_SIZE = 1000
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def _strict(schema: dict) -> dict:
+    """The schema with no additional properties on the model and its nested models."""
+    for definition in [schema, *schema.get("$defs", {}).values()]:
+        if definition.get("type") == "object":
+            definition["additionalProperties"] = False
+    return schema
+
+
+def response_format() -> dict:
+    """Strict JSON schema response format of BotOutput, as parse() sends it."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": BotOutput.__name__,
+            "schema": _strict(BotOutput.model_json_schema()),
+            "strict": True,
+        },
+    }
+
+
+def batch_request(job: JobDescription) -> dict:
+    """A single Batch API request line for a job."""
+    return {
+        "custom_id": job.job_id,
+        "method": "POST",
+        "url": ENDPOINT,
+        "body": {
+            "model": MODEL,
+            "temperature": 0.2,
+            "messages": chat_messages(job),
+            "response_format": response_format(),
+        },
+    }
+
+
+def write_request_file(jobs: list[JobDescription], file_name: str) -> None:
+    """Write the batch request JSONL file."""
+    with open(file_name, "w", encoding="utf-8") as f:
+        for job in jobs:
+            f.write(json.dumps(batch_request(job)) + "\n")
+
+
+def load_state() -> list[str]:
+    """Ids of batches that were submitted but not yet collected."""
+    if not os.path.exists(STATE_FILE):
+        return []
+    with open(STATE_FILE, encoding="utf-8") as f:
+        return json.load(f)["batch_ids"]
+
+
+def save_state(batch_ids: list[str]) -> None:
+    """Persist the ids of in-flight batches."""
+    if not batch_ids:
+        if os.path.exists(STATE_FILE):
+            os.remove(STATE_FILE)
+        return
+    Path(BATCH_DIR).mkdir(exist_ok=True)
+    with open(STATE_FILE, "w", encoding="utf-8") as f:
+        json.dump({"batch_ids": batch_ids}, f)
+
+
+def submit_batches(client: OpenAI, jobs: list[JobDescription]) -> list[str]:
+    """Submit the jobs in batches of at most MAX_REQUESTS_PER_BATCH."""
+    Path(BATCH_DIR).mkdir(exist_ok=True)
+    batch_ids = []
+    for start in range(0, len(jobs), MAX_REQUESTS_PER_BATCH):
+        chunk = jobs[start : start + MAX_REQUESTS_PER_BATCH]
+        file_name = f"{BATCH_DIR}/requests_{int(time.time())}_{start}.jsonl"
+        write_request_file(chunk, file_name)
+        with open(file_name, "rb") as f:
+            input_file = client.files.create(file=f, purpose="batch")
+        batch = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=ENDPOINT,
+            completion_window="24h",
+        )
+        print(f"📤 Submitted batch {batch.id} with {len(chunk)} jobs")
+        batch_ids.append(batch.id)
+        save_state(batch_ids)
+    return batch_ids
+
+
+def collect_results(client: OpenAI, file_id: str) -> int:
+    """Stream a batch output file into the evaluations cache."""
+    stored = 0
+    evaluations: list[JobEvaluation] = []
+    with client.files.with_streaming_response.content(file_id) as response:
+        for line in response.iter_lines():
+            if not line:
+                continue
+            result = json.loads(line)
+            job_id = result["custom_id"]
+            result_response = result.get("response")
+            if (
+                result.get("error")
+                or not result_response
+                or result_response["status_code"] != 200
+            ):
+                print(f"Failed to evaluate job {job_id}: {result.get('error')}")
+                continue
+            try:
+                message = result_response["body"]["choices"][0]["message"]
+                bot_output = BotOutput.model_validate_json(message["content"])
+            except (KeyError, IndexError, TypeError, ValueError) as e:
+                # Refused or truncated, e.g. content is None or the JSON is cut off
+                print(
+                    f"Failed to parse the evaluation of job {job_id}: "
+                    f"{str(e).splitlines()[0]}"
+                )
+                continue
+            evaluations.append(JobEvaluation(job_id=job_id, **bot_output.model_dump()))
+            if len(evaluations) == RESULTS_CHUNK_SIZE:
+                save_job_evaluations(evaluations)
+                stored += len(evaluations)
+                evaluations = []
+    save_job_evaluations(evaluations)
+    return stored + len(evaluations)
+
+
+def wait_for_batches(
+    client: OpenAI, batch_ids: list[str], poll_interval: float = POLL_INTERVAL
+) -> int:
+    """Poll the batches until they finish and collect their results."""
+    stored = 0
+    pending = list(batch_ids)
+    while pending:
+        for batch_id in list(pending):
+            batch = client.batches.retrieve(batch_id)
+            if batch.status not in TERMINAL_STATUSES:
+                continue
+            if batch.output_file_id:
+                stored += collect_results(client, batch.output_file_id)
+            if batch.status != "completed":
+                print(f"Batch {batch_id} ended with status {batch.status}")
+            pending.remove(batch_id)
+            save_state(pending)
+        if pending:
+            print(f"⏳ Waiting for {len(pending)} batches")
+            time.sleep(poll_interval)
+    return stored
+
+
+def evaluate_in_batch(
+    jobs: list[JobDescription],
+    client: OpenAI | None = None,
+    poll_interval: float = POLL_INTERVAL,
+) -> int:
+    """Evaluate all uncached jobs through the Batch API, resuming in-flight batches."""
+    client = client or openai_client()
+    stored = 0
+    in_flight = load_state()
+    if in_flight:
+        print(f"Resuming {len(in_flight)} in-flight batches")
+        stored += wait_for_batches(client, in_flight, poll_interval)
+
+    uncached = [
+        job
+        for job in jobs
+        if load_job_evaluation(job.job_id) is None and duplicate_evaluation(job) is None
+    ]
+    if uncached:
+        batch_ids = submit_batches(client, uncached)
+        stored += wait_for_batches(client, batch_ids, poll_interval)
+    print(f"Stored {stored} evaluations")
+    return stored
+
+
+if __name__ == "__main__":
+    evaluate_in_batch(prefiltered(list(cached_job_descriptions())))
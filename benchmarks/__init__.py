@@ -0,0 +1 @@
+"""Benchmarks, run them from the project root with `python -m benchmarks.<name>`."""
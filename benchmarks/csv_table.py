@@ -0,0 +1,62 @@
+"""Per-insert cost of CsvTable as the table grows to 100k rows."""
+
+import os
+import tempfile
+import time
+
+from ai_evaluator import JobEvaluation
+from csv_table import CsvTable
+from job_description import JobDescription
+
+NUM_ROWS = 100_000
+REPORT_EVERY = 10_000
+
+EVALUATION = JobEvaluation(
+    job_id="",
+    requirements=[],
+    fit_to_requirements_percentage=90,
+    fit_to_requirements_explanation="Good fit",
+    seniority_level_1_to_5=4,
+    what_the_company_does="Benchmarks",
+    job_description_summary="Benchmarking",
+)
+
+
+def job(i: int) -> JobDescription:
+    """A fake job description."""
+    return JobDescription(
+        job_id=str(i),
+        url=f"https://www.linkedin.com/jobs/view/{i}",
+        company=f"Company {i % 1000}",
+        title="Software Engineer",
+        description="",
+        posted_date="2024-01-01",
+    )
+
+
+def main() -> None:
+    """Insert NUM_ROWS rows, reporting the mean cost per insert of each block."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        table_name = os.path.join(tmp_dir, "table.csv")
+        jobs = [job(i) for i in range(NUM_ROWS)]
+        with CsvTable(table_name) as table:
+            start = time.perf_counter()
+            for i, description in enumerate(jobs, 1):
+                if not table.job_id_in_table(description.job_id):
+                    table.add_to_table(description, EVALUATION)
+                if i % REPORT_EVERY == 0:
+                    elapsed = time.perf_counter() - start
+                    print(f"{i:>7} rows: {elapsed / REPORT_EVERY * 1e6:6.1f} µs/insert")
+                    start = time.perf_counter()
+
+        start = time.perf_counter()
+        table = CsvTable(table_name)
+        print(
+            f"Reopened and indexed {len(table.job_ids)} rows in "
+            f"{time.perf_counter() - start:.2f}s"
+        )
+        table.close()
+
+
+if __name__ == "__main__":
+    main()
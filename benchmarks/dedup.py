@@ -0,0 +1,50 @@
+"""Near-duplicate lookup latency with 100k indexed postings."""
+
+import random
+import time
+
+from dedup import DuplicateIndex, dedup_key, simhash
+
+NUM_JOBS = 100_000
+NUM_LOOKUPS = 10_000
+TITLES = ["Software Engineer", "Backend Engineer", "Frontend Developer", "SRE"]
+
+
+def main() -> None:
+    """Index NUM_JOBS random fingerprints, then time lookups of near-duplicates."""
+    rng = random.Random(0)
+    index = DuplicateIndex()
+    fingerprints = []
+    for i in range(NUM_JOBS):
+        key = dedup_key(f"Company {i % 20_000} GmbH", rng.choice(TITLES) + " (m/w/d)")
+        hash_ = rng.getrandbits(64)
+        index.add(str(i), key, hash_)
+        fingerprints.append((key, hash_))
+
+    latencies = []
+    found = 0
+    for _ in range(NUM_LOOKUPS):
+        key, hash_ = rng.choice(fingerprints)
+        near_hash = hash_ ^ (1 << rng.randrange(64))
+        start = time.perf_counter()
+        found += bool(index.duplicates_of("new", key, near_hash))
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(f"{len(index)} indexed, {found}/{NUM_LOOKUPS} near-duplicates found")
+    print(
+        f"lookup mean {sum(latencies) / len(latencies) * 1e6:.1f} µs, "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:.1f} µs"
+    )
+
+    words = [f"word{i}" for i in range(2000)]
+    description = " ".join(rng.choice(words) for _ in range(600))
+    start = time.perf_counter()
+    for _ in range(100):
+        simhash(description)
+    print(
+        f"simhash of a 600 word description {(time.perf_counter() - start) * 10:.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
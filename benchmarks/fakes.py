@@ -0,0 +1,359 @@
+"""
+Local fakes of LinkedIn, OpenAI and Airtable for offline benchmarks.
+
+Each fake is an HTTP server on localhost running in a daemon thread. The
+LinkedIn fake replays the recorded pages in benchmarks/fixtures with a new
+job id, title, company and description for every job, so near-duplicate
+detection and the pre-filter see distinct postings. The OpenAI fake answers
+chat completions with BotOutput JSON after a configurable latency, and runs
+Batch API batches the same way, see batch_evaluator.py.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from linkedin_html import LxmlExtractor
+
+FIXTURES = Path(__file__).parent / "fixtures"
+FIRST_JOB_ID = 4_100_000_000
+TITLES = [
+    "Senior Software Engineer",
+    "Backend Engineer",
+    "Full Stack Developer (m/w/d)",
+    "Staff Engineer, Platform",
+    "Python Developer",
+    "Frontend Engineer",
+]
+
+
+class FakeServer:
+    """HTTP server on a free localhost port, serving from a daemon thread."""
+
+    def __init__(self, handler: type[BaseHTTPRequestHandler]):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        """Stop serving."""
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def body(self) -> dict:
+        """JSON request body."""
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def send(self, body: str | bytes, content_type: str = "application/json"):
+        """Send a 200 response."""
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class LinkedInPages:
+    """Search and job pages generated from the recorded fixtures."""
+
+    def __init__(self):
+        search = (FIXTURES / "linkedin_search.html").read_text(encoding="utf-8")
+        self.cards = re.findall(r"<li>.*?</li>", search, re.DOTALL)
+        self.card_ids = [re.search(r"jobPosting:(\d+)", c)[1] for c in self.cards]
+
+        self.job = (FIXTURES / "linkedin_job_long.html").read_text(encoding="utf-8")
+        posting = LxmlExtractor().job_posting(self.job)
+        self.job_id = re.search(r"/jobs/view/(\d+)", posting.url)[1]
+        self.title = posting.title
+        self.company = posting.company
+        markup = self.job.index('class="show-more-less-html__markup')
+        self.description_start = self.job.index(">", markup) + 1
+        self.description_end = self.job.index("<!---->", self.description_start)
+
+        with open("cv.txt", encoding="utf-8") as f:
+            cv_words = f.read().split()
+        self.words = cv_words + posting.description.split()
+
+    def search(self, start: int) -> str:
+        """Search page with the job ids from `start` on."""
+        return "".join(
+            card.replace(card_id, str(FIRST_JOB_ID + start + i))
+            for i, (card, card_id) in enumerate(zip(self.cards, self.card_ids))
+        )
+
+    def job_page(self, job_id: str) -> str:
+        """Job page with a title, company and description of its own."""
+        rng = random.Random(job_id)
+        paragraphs = "".join(
+            f"<p>{' '.join(rng.choices(self.words, k=60))}</p>\n" for _ in range(6)
+        )
+        page = (
+            self.job[: self.description_start]
+            + paragraphs
+            + self.job[self.description_end :]
+        )
+        return (
+            page.replace(self.job_id, job_id)
+            .replace(self.title, rng.choice(TITLES))
+            .replace(self.company, f"Company {rng.randrange(2000)}")
+        )
+
+
+def fake_linkedin(latency: float = 0.0) -> FakeServer:
+    """Fake LinkedIn guest API, see scrape_linkedin.BASE_SEARCH_URL and JOB_URL."""
+    pages = LinkedInPages()
+
+    class Handler(_Handler):
+        def do_GET(self) -> None:
+            time.sleep(latency)
+            url = urlparse(self.path)
+            if "seeMoreJobPostings" in url.path:
+                start = int(parse_qs(url.query).get("start", ["0"])[0])
+                self.send(pages.search(start), "text/html")
+            else:
+                self.send(pages.job_page(url.path.rsplit("/", 1)[1]), "text/html")
+
+    return FakeServer(Handler)
+
+
+def _completion(request: dict) -> dict:
+    """Chat completion with a BotOutput of random fit, seeded by the job."""
+    messages = request["messages"]
+    rng = random.Random(messages[-1]["content"])
+    output = {
+        "requirements": [
+            {
+                "skill": skill,
+                "required_proficiency_level_1_to_5": rng.randint(1, 5),
+                "my_proficiency_level_1_to_5": rng.randint(1, 5),
+                "requirement_strength_1_to_5": rng.randint(1, 5),
+            }
+            for skill in ("Python", "SQL", "Kubernetes")
+        ],
+        "fit_to_requirements_percentage": rng.randint(40, 100),
+        "fit_to_requirements_explanation": "Benchmark evaluation.",
+        "seniority_level_1_to_5": rng.randint(1, 5),
+        "what_the_company_does": "Benchmarks",
+        "job_description_summary": "Benchmarking",
+    }
+    # Roughly 4 characters per token, the system prompt is cached
+    system_tokens = len(messages[0]["content"]) // 4
+    prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+    return {
+        "id": "chatcmpl-benchmark",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request["model"],
+        "choices": [
+            {
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": json.dumps(output)},
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": 120,
+            "total_tokens": prompt_tokens + 120,
+            "prompt_tokens_details": {"cached_tokens": system_tokens // 128 * 128},
+        },
+    }
+
+
+def _uploaded_file(content_type: str, body: bytes) -> tuple[str, bytes]:
+    """Name and content of the file of a multipart/form-data upload."""
+    message = BytesParser(policy=HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body
+    )
+    for part in message.iter_parts():
+        if part.get_param("name", header="content-disposition") == "file":
+            return part.get_filename() or "upload", part.get_payload(decode=True)
+    raise ValueError("No file in the upload")
+
+
+class BatchFiles:
+    """Uploaded files and batches of the Batch API fake.
+
+    A batch is in progress for `latency` seconds after it was created, then
+    its output file is written by answering every request like the chat
+    completions fake.
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.files: dict[str, bytes] = {}
+        self.batches: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def add_file(self, name: str, content: bytes, purpose: str) -> dict:
+        """Store a file, returning its file object."""
+        with self._lock:
+            file_id = f"file-{len(self.files)}"
+            self.files[file_id] = content
+        return {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": name,
+            "purpose": purpose,
+            "status": "processed",
+        }
+
+    def create_batch(self, request: dict) -> dict:
+        """Start a batch of the requests in an uploaded file."""
+        with self._lock:
+            batch = {
+                "id": f"batch-{len(self.batches)}",
+                "object": "batch",
+                "endpoint": request["endpoint"],
+                "input_file_id": request["input_file_id"],
+                "completion_window": request["completion_window"],
+                "status": "in_progress",
+                "created_at": int(time.time()),
+                "output_file_id": None,
+                "_done_at": time.monotonic() + self.latency,
+            }
+            self.batches[batch["id"]] = batch
+        return self.public(batch)
+
+    def retrieve(self, batch_id: str) -> dict:
+        """A batch, completing it once its latency passed."""
+        with self._lock:
+            batch = self.batches[batch_id]
+            if (
+                batch["status"] == "in_progress"
+                and time.monotonic() >= batch["_done_at"]
+            ):
+                lines = self.files[batch["input_file_id"]].decode("utf-8").splitlines()
+                output = []
+                for line in filter(None, lines):
+                    request = json.loads(line)
+                    response = {
+                        "status_code": 200,
+                        "request_id": f"req-{request['custom_id']}",
+                        "body": _completion(request["body"]),
+                    }
+                    output.append(
+                        json.dumps(
+                            {
+                                "id": f"batch-req-{request['custom_id']}",
+                                "custom_id": request["custom_id"],
+                                "response": response,
+                                "error": None,
+                            }
+                        )
+                    )
+                file_id = f"file-{len(self.files)}"
+                self.files[file_id] = "\n".join(output).encode("utf-8")
+                batch.update(status="completed", output_file_id=file_id)
+            return self.public(batch)
+
+    @staticmethod
+    def public(batch: dict) -> dict:
+        """The batch object as the API returns it."""
+        return {key: value for key, value in batch.items() if key[0] != "_"}
+
+
+def fake_openai(latency: float = 0.0, batch_latency: float = 0.0) -> FakeServer:
+    """Fake chat completions and Batch API answering with BotOutputs of random fit.
+
+    Batches are served under /files and /batches, see BatchFiles.
+    """
+    batch_files = BatchFiles(batch_latency)
+
+    class Handler(_Handler):
+        def do_GET(self) -> None:
+            path = urlparse(self.path).path
+            if match := re.search(r"/files/([^/]+)/content$", path):
+                self.send(batch_files.files[match[1]], "application/octet-stream")
+            elif match := re.search(r"/batches/([^/]+)$", path):
+                self.send(json.dumps(batch_files.retrieve(match[1])))
+            else:
+                self.send_error(404)
+
+        def do_POST(self) -> None:
+            path = urlparse(self.path).path
+            if path.endswith("/files"):
+                length = int(self.headers["Content-Length"])
+                name, content = _uploaded_file(
+                    self.headers["Content-Type"], self.rfile.read(length)
+                )
+                self.send(json.dumps(batch_files.add_file(name, content, "batch")))
+            elif path.endswith("/batches"):
+                self.send(json.dumps(batch_files.create_batch(self.body())))
+            else:
+                request = self.body()
+                time.sleep(latency)
+                self.send(json.dumps(_completion(request)))
+
+    return FakeServer(Handler)
+
+
+def fake_airtable() -> FakeServer:
+    """Fake Airtable API listing records and upserting them on `id`."""
+    records: dict[str, dict] = {}
+    lock = threading.Lock()
+    page_size = 100
+
+    class Handler(_Handler):
+        def list_records(self, offset: int) -> None:
+            with lock:
+                page = list(records.values())[offset : offset + page_size]
+                more = offset + page_size < len(records)
+            response: dict = {"records": page}
+            if more:
+                response["offset"] = str(offset + page_size)
+            self.send(json.dumps(response))
+
+        def do_GET(self) -> None:
+            query = parse_qs(urlparse(self.path).query)
+            self.list_records(int(query.get("offset", ["0"])[0]))
+
+        def do_POST(self) -> None:  # listRecords with fields in the body
+            self.list_records(int(self.body().get("offset") or 0))
+
+        def do_PATCH(self) -> None:
+            created, updated = [], []
+            with lock:
+                for record in self.body()["records"]:
+                    job_id = record["fields"]["id"]
+                    if job_id in records:
+                        records[job_id]["fields"].update(record["fields"])
+                        updated.append(records[job_id])
+                    else:
+                        records[job_id] = {
+                            "id": f"rec{len(records):014d}",
+                            "createdTime": "2024-01-01T00:00:00.000Z",
+                            "fields": record["fields"],
+                        }
+                        created.append(records[job_id])
+            self.send(
+                json.dumps(
+                    {
+                        "records": created + updated,
+                        "createdRecords": [r["id"] for r in created],
+                        "updatedRecords": [r["id"] for r in updated],
+                    }
+                )
+            )
+
+    return FakeServer(Handler)
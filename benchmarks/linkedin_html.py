@@ -0,0 +1,45 @@
+"""Equivalence and speed of the LinkedIn HTML extractors on saved pages."""
+
+import time
+from pathlib import Path
+
+from linkedin_html import Bs4Extractor, HtmlExtractor, LxmlExtractor
+
+FIXTURES = Path(__file__).parent / "fixtures"
+REPEAT = 50
+
+
+def extract(extractor: HtmlExtractor, page: Path, html: str):
+    """Job ids of search pages, postings of job pages."""
+    if page.name.startswith("linkedin_search"):
+        return extractor.job_ids(html)
+    return extractor.job_posting(html)
+
+
+def mean_seconds(extractor: HtmlExtractor, page: Path, html: str) -> float:
+    """Mean time to extract a page."""
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        extract(extractor, page, html)
+    return (time.perf_counter() - start) / REPEAT
+
+
+def main() -> None:
+    """Check that both extractors agree on every fixture, then time them."""
+    bs4, fast = Bs4Extractor(), LxmlExtractor()
+    for page in sorted(FIXTURES.glob("linkedin_*.html")):
+        html = page.read_text(encoding="utf-8")
+        expected, actual = extract(bs4, page, html), extract(fast, page, html)
+        if expected != actual:
+            raise AssertionError(f"{page.name}: {expected!r} != {actual!r}")
+        bs4_seconds = mean_seconds(bs4, page, html)
+        fast_seconds = mean_seconds(fast, page, html)
+        print(
+            f"{page.name:32} {len(html) / 1000:5.0f} kB  "
+            f"bs4 {bs4_seconds * 1000:6.2f} ms  lxml {fast_seconds * 1000:6.2f} ms  "
+            f"{bs4_seconds / max(fast_seconds, 1e-9):5.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
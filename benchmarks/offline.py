@@ -0,0 +1,298 @@
+"""
+Offline end-to-end benchmark against local fakes of LinkedIn, OpenAI and Airtable.
+
+Every size runs in a fresh process and working directory, so the job store
+and the caches start cold. The stages run the real code paths:
+
+- scrape: scrape_linkedin, then again with the job descriptions cached
+- evaluate: main.evalupate_jobs into a CsvTable, then again into AirTable
+  with the evaluations cached
+- export: ai_evaluator.jsons_to_csv
+
+With --batch, the evaluate stages go through batch_evaluator against the
+Batch API of the OpenAI fake instead: half of the jobs are submitted as if a
+run stopped after submitting, then evaluate_in_batch resumes polling that
+batch, submits the other half and collects both.
+
+Write the results with --json and pass them to --compare on a later commit
+to see the change in throughput per stage.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable
+
+from benchmarks.fakes import fake_airtable, fake_linkedin, fake_openai
+
+ROOT = Path(__file__).parent.parent
+SIZES = [100, 1000, 10_000]
+OPENAI_LATENCY = 0.05
+LINKEDIN_LATENCY = 0.01
+LINKEDIN_RATE = 500.0  # The real limiter starts at 4 req/s, see http_client
+BATCH_LATENCY = 1.0  # Seconds until a batch of the fake completes
+BATCH_POLL_INTERVAL = 0.2
+
+
+@dataclass
+class StageResult:
+    """Throughput and per item latency of one stage."""
+
+    size: int
+    stage: str
+    items: int
+    seconds: float
+    p50_ms: float
+    p95_ms: float
+
+    @property
+    def per_second(self) -> float:
+        return self.items / self.seconds if self.seconds else 0.0
+
+
+class Timed:
+    """Wraps a function, recording the latency of every call."""
+
+    def __init__(self, func: Callable):
+        self.func = func
+        self.latencies: list[float] = []
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.func(*args, **kwargs)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+
+def _percentile(values: list[float], share: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def run_size(size: int, batch: bool = False) -> list[StageResult]:
+    """Run all stages for `size` jobs in the current directory."""
+    # Imported here so the environment is set up before the clients are created
+    import ai_evaluator
+    import http_client
+    import main
+    import scrape_linkedin
+    from airtable import AirTable
+    from csv_table import CsvTable
+
+    scrape_linkedin.BASE_SEARCH_URL = (
+        os.environ["FAKE_LINKEDIN_URL"]
+        + "/jobs-guest/jobs/api/seeMoreJobPostings/search?"
+    )
+    scrape_linkedin.JOB_URL = (
+        os.environ["FAKE_LINKEDIN_URL"] + "/jobs-guest/jobs/api/jobPosting/{job_id}"
+    )
+    rate = float(os.environ["FAKE_LINKEDIN_RATE"])
+    http_client.LINKEDIN_LIMITER.rate = http_client.LINKEDIN_LIMITER.max_rate = rate
+
+    results = []
+
+    def stage(name: str, timed: Timed, run: Callable, items: int = 0) -> object:
+        start = time.perf_counter()
+        output = run()
+        seconds = time.perf_counter() - start
+        latencies = timed.latencies
+        results.append(
+            StageResult(
+                size,
+                name,
+                items or len(latencies),
+                seconds,
+                _percentile(latencies, 0.5) * 1000,
+                _percentile(latencies, 0.95) * 1000,
+            )
+        )
+        timed.latencies = []
+        return output
+
+    fetch = Timed(scrape_linkedin.get_linkedin_job_description)
+    scrape_linkedin.get_linkedin_job_description = fetch
+
+    def scrape() -> list:
+        return scrape_linkedin.scrape_linkedin("Software Engineer", size)
+
+    jobs = stage("scrape", fetch, scrape)
+    stage("scrape (cached)", fetch, scrape)
+
+    if batch:
+        import batch_evaluator
+
+        submit = Timed(batch_evaluator.submit_batches)
+        stage(
+            "batch submit",
+            submit,
+            lambda: submit(ai_evaluator.openai_client(), jobs[: len(jobs) // 2]),
+            items=len(jobs) // 2,
+        )
+        resume = Timed(batch_evaluator.evaluate_in_batch)
+        stored = stage(
+            "batch resume -> collect",
+            resume,
+            lambda: resume(jobs, poll_interval=BATCH_POLL_INTERVAL),
+            items=len(jobs),
+        )
+        if stored != len(jobs) or batch_evaluator.load_state():
+            raise RuntimeError(f"Batches stored {stored} of {len(jobs)} evaluations")
+    else:
+        evaluate = Timed(main.cached_job_evaluation)
+        main.cached_job_evaluation = evaluate
+        with CsvTable() as csv_table:
+            stage(
+                "evaluate -> csv",
+                evaluate,
+                lambda: main.evalupate_jobs(jobs, csv_table),
+            )
+        with AirTable() as air_table:
+            stage(
+                "evaluate (cached) -> airtable",
+                evaluate,
+                lambda: main.evalupate_jobs(jobs, air_table),
+            )
+
+    export = Timed(ai_evaluator.jsons_to_csv)
+    evaluations = sum(1 for _ in ai_evaluator.cached_job_evaluations())
+    stage("export csv", export, export, items=evaluations)
+    return results
+
+
+def run_in_subprocess(
+    size: int, env: dict[str, str], batch: bool = False
+) -> list[StageResult]:
+    """Run `size` in a fresh process and working directory."""
+    with tempfile.TemporaryDirectory() as work_dir:
+        for file in ("cv.txt", "skills.txt"):
+            shutil.copy(ROOT / file, work_dir)
+        result_file = os.path.join(work_dir, "result.json")
+        process = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.offline",
+                "--child",
+                str(size),
+                *(["--batch"] if batch else []),
+            ],
+            cwd=work_dir,
+            env={**env, "PYTHONPATH": str(ROOT), "BENCHMARK_RESULT": result_file},
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        if process.returncode != 0:
+            print(process.stderr[-3000:])
+            raise RuntimeError(f"Benchmark of {size} jobs failed")
+        with open(result_file, encoding="utf-8") as f:
+            return [StageResult(**result) for result in json.load(f)]
+
+
+def git_commit() -> str:
+    """Current commit, to label the results."""
+    process = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    return process.stdout.strip() or "unknown"
+
+
+def report(results: list[StageResult], baseline: dict | None = None) -> None:
+    """Print a table of the results, with the change against a baseline."""
+    before = {}
+    if baseline is not None:
+        before = {(r["size"], r["stage"]): r for r in baseline["results"]}
+        print(f"Compared to {baseline['commit']}")
+    print(
+        f"{'jobs':>6}  {'stage':30} {'items':>6} {'seconds':>8} {'items/s':>9}"
+        f" {'p50 ms':>8} {'p95 ms':>8}"
+    )
+    for r in results:
+        line = (
+            f"{r.size:>6}  {r.stage:30} {r.items:>6} {r.seconds:>8.2f}"
+            f" {r.per_second:>9.1f} {r.p50_ms:>8.1f} {r.p95_ms:>8.1f}"
+        )
+        old = before.get((r.size, r.stage))
+        if old and old["seconds"]:
+            old_per_second = old["items"] / old["seconds"]
+            if old_per_second:
+                line += f"  {r.per_second / old_per_second - 1:+.0%} items/s"
+        print(line)
+
+
+def main() -> None:
+    """Start the fakes, benchmark every size and report."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--openai-latency", type=float, default=OPENAI_LATENCY)
+    parser.add_argument("--linkedin-latency", type=float, default=LINKEDIN_LATENCY)
+    parser.add_argument("--linkedin-rate", type=float, default=LINKEDIN_RATE)
+    parser.add_argument(
+        "--batch", action="store_true", help="evaluate through the Batch API"
+    )
+    parser.add_argument("--batch-latency", type=float, default=BATCH_LATENCY)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="results of an earlier --json run")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        results = run_size(args.child, args.batch)
+        with open(os.environ["BENCHMARK_RESULT"], "w", encoding="utf-8") as f:
+            json.dump([asdict(r) for r in results], f)
+        return
+
+    os.chdir(ROOT)
+    linkedin = fake_linkedin(args.linkedin_latency)
+    openai = fake_openai(args.openai_latency, args.batch_latency)
+    env = {
+        **os.environ,
+        "FAKE_LINKEDIN_URL": linkedin.url,
+        "FAKE_LINKEDIN_RATE": str(args.linkedin_rate),
+        "OPENAI_BASE_URL": openai.url + "/v1",
+        "OPENAI_API_KEY": "benchmark",
+        "AIRTABLE_API_KEY": "benchmark",
+        "APP_ID": "appBenchmark",
+        "TABLE_ID": "tblBenchmark",
+    }
+    results = []
+    for size in args.sizes:
+        print(f"Benchmarking {size} jobs...")
+        airtable = fake_airtable()  # Empty for every size
+        results += run_in_subprocess(
+            size, {**env, "AIRTABLE_ENDPOINT_URL": airtable.url}, args.batch
+        )
+        airtable.close()
+    linkedin.close()
+    openai.close()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(
+                {"commit": git_commit(), "results": [asdict(r) for r in results]},
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
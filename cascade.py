@@ -0,0 +1,234 @@
+"""
+Two-tier evaluation: a cheap model screens every job, MODEL decides the close calls.
+
+SCREENING_MODEL answers the same prompt first. Only jobs whose screening fit is
+within ESCALATION_MARGIN points of the threshold of their profile are
+evaluated again by MODEL.
+Far from the threshold the cheap answer decides. A random CALIBRATION_RATE of
+the other jobs is escalated too, so the agreement between the tiers is
+measured on a sample the band doesn't bias.
+
+Both answers are cached in the job store with their latency and cost, and the
+tier that decided. Enable it with ai_evaluator.CASCADE.
+
+Run this script for a report of the latency and cost saved and of the
+agreement between the tiers. Add --calibrate N to also screen N jobs already
+evaluated by MODEL and compare.
+"""
+
+import argparse
+import random
+import statistics
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from ai_evaluator import (
+    MODEL,
+    SCREENING_MODEL,
+    JobEvaluation,
+    ask_bot_with_usage,
+    cached_job_evaluations,
+    prompt_fingerprint,
+    save_job_evaluation,
+    usage_cost_usd,
+)
+from job_description import JobDescription
+from job_store import ScreeningRow, job_store
+from metrics import METRICS
+from profiles import DEFAULT_PROFILE, THRESHOLD, Profile, load_profile
+
+ESCALATION_MARGIN = 15  # Screening fits this close to the threshold go to MODEL
+CALIBRATION_RATE = 0.05
+
+_run_rows: list[ScreeningRow] = []  # Screenings of this process
+_run_rows_lock = threading.Lock()
+
+
+def _screening(job: JobDescription, profile: Profile) -> ScreeningRow:
+    """Screening row of a job, cached unless the prompt or CV changed."""
+    fingerprint = prompt_fingerprint(profile, SCREENING_MODEL)
+    row = job_store().get_screening(profile.name, job.job_id)
+    if row is not None and row[2] == fingerprint:
+        return row
+    start = time.perf_counter()
+    evaluation, usage = ask_bot_with_usage(job, profile=profile, model=SCREENING_MODEL)
+    row = (
+        profile.name,
+        job.job_id,
+        fingerprint,
+        evaluation.fit_to_requirements_percentage,
+        evaluation.model_dump_json(),
+        time.perf_counter() - start,
+        usage_cost_usd(usage, SCREENING_MODEL),
+        None,
+        None,
+        # What MODEL would have cost for the same tokens
+        usage_cost_usd(usage, MODEL),
+        "screening",
+        "",
+    )
+    job_store().put_screening(row)
+    return row
+
+
+def _escalation_reason(fit: int, threshold: int) -> str:
+    """Why a screening fit goes to MODEL, "" if it doesn't."""
+    if abs(fit - threshold) <= ESCALATION_MARGIN:
+        return "band"
+    if random.random() < CALIBRATION_RATE:
+        return "calibration"
+    return ""
+
+
+def cascade_evaluation(
+    job: JobDescription, profile: Profile = DEFAULT_PROFILE
+) -> JobEvaluation:
+    """Evaluate a job with SCREENING_MODEL, and with MODEL if it is a close call.
+
+    The evaluation of the tier that decided is saved as the job's evaluation.
+    """
+    row = _screening(job, profile)
+    reason = row[11] or _escalation_reason(row[3], profile.fit_threshold)
+    if reason:
+        start = time.perf_counter()
+        evaluation, usage = ask_bot_with_usage(job, profile=profile)
+        row = (
+            *row[:7],
+            evaluation.fit_to_requirements_percentage,
+            time.perf_counter() - start,
+            usage_cost_usd(usage, MODEL),
+            "full",
+            reason,
+        )
+        job_store().put_screening(row)
+        save_job_evaluation(evaluation, profile)
+    else:
+        evaluation = JobEvaluation.model_validate_json(row[4])
+        save_job_evaluation(evaluation, profile, SCREENING_MODEL)
+    METRICS.increment("cascade_decisions_total", tier=row[10], reason=reason)
+    with _run_rows_lock:
+        _run_rows.append(row)
+    return evaluation
+
+
+@dataclass
+class CascadeStats:
+    """Savings of the cascade over screenings, and the agreement of the tiers."""
+
+    jobs: int
+    escalated: int
+    seconds: float  # Spent on both tiers
+    seconds_without: Optional[float]  # Estimated with MODEL only
+    cost_usd: float
+    cost_usd_without: float
+    calibrated: int
+    agreement: Optional[float]  # Same side of the threshold, on calibration jobs
+    mean_difference: Optional[float]  # Mean absolute fit difference
+
+    @classmethod
+    def of(
+        cls, rows: Iterable[ScreeningRow], threshold: int = THRESHOLD
+    ) -> "CascadeStats":
+        """Stats of screening rows."""
+        rows = list(rows)
+        escalated = [r for r in rows if r[7] is not None]
+        full_seconds = [r[8] for r in escalated if r[8] is not None]
+        mean_full_seconds = statistics.fmean(full_seconds) if full_seconds else None
+        calibration = [r for r in escalated if r[11] == "calibration"]
+        return cls(
+            jobs=len(rows),
+            escalated=len(escalated),
+            seconds=sum(r[5] for r in rows) + sum(full_seconds),
+            seconds_without=(
+                None if mean_full_seconds is None else mean_full_seconds * len(rows)
+            ),
+            cost_usd=sum(r[6] for r in rows) + sum(r[9] for r in escalated),
+            cost_usd_without=sum(r[9] for r in rows),
+            calibrated=len(calibration),
+            agreement=(
+                statistics.fmean(
+                    (r[3] >= threshold) == (r[7] >= threshold) for r in calibration
+                )
+                if calibration
+                else None
+            ),
+            mean_difference=(
+                statistics.fmean(abs(r[3] - r[7]) for r in calibration)
+                if calibration
+                else None
+            ),
+        )
+
+    def summary(self) -> str:
+        """Human readable summary."""
+        if not self.jobs:
+            return "🪜 Cascade: no jobs screened"
+        lines = [
+            f"🪜 Cascade: {self.escalated} of {self.jobs} jobs escalated to {MODEL}, "
+            f"~${self.cost_usd:.2f} instead of ~${self.cost_usd_without:.2f} "
+            f"(saved ~${self.cost_usd_without - self.cost_usd:.2f})"
+        ]
+        if self.seconds_without is not None:
+            lines.append(
+                f"   API time {self.seconds:.0f}s instead of ~"
+                f"{self.seconds_without:.0f}s "
+                f"(saved ~{self.seconds_without - self.seconds:.0f}s)"
+            )
+        if self.agreement is not None:
+            lines.append(
+                f"   Tiers agree on {self.agreement:.0%} of {self.calibrated} "
+                f"calibration jobs, fits differ by {self.mean_difference:.1f} "
+                "points on average"
+            )
+        return "\n".join(lines)
+
+
+def cascade_summary() -> str:
+    """Summary of the screenings of this process."""
+    with _run_rows_lock:
+        return CascadeStats.of(list(_run_rows)).summary()
+
+
+def calibrate(sample_size: int, profile: Profile = DEFAULT_PROFILE) -> int:
+    """Screen jobs already evaluated by MODEL, returning how many."""
+    full_fingerprint = prompt_fingerprint(profile)
+    screened = {row[1] for row in job_store().iter_screenings(profile.name)}
+    candidates = [
+        (job, evaluation)
+        for job, evaluation in cached_job_evaluations(profile=profile)
+        if job.job_id not in screened
+        and job_store().get_evaluation(job.job_id, profile.name)[1] == full_fingerprint
+    ]
+    sample = random.sample(candidates, min(sample_size, len(candidates)))
+    for job, evaluation in sample:
+        row = _screening(job, profile)
+        job_store().put_screening(
+            (
+                *row[:7],
+                evaluation.fit_to_requirements_percentage,
+                None,  # Not timed, it was evaluated before
+                row[9],
+                "full",
+                "calibration",
+            )
+        )
+    return len(sample)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report on the model cascade")
+    parser.add_argument("--calibrate", type=int, default=0, help="jobs to screen")
+    parser.add_argument("--threshold", type=int, help="the profile's by default")
+    parser.add_argument("--profile", default="", help="name of a profile")
+    args = parser.parse_args()
+    report_profile = load_profile(args.profile)
+    threshold = args.threshold or report_profile.fit_threshold
+    if args.calibrate:
+        print(f"Screened {calibrate(args.calibrate, report_profile)} jobs")
+    print(
+        CascadeStats.of(
+            job_store().iter_screenings(report_profile.name), threshold
+        ).summary()
+    )
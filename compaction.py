@@ -0,0 +1,267 @@
+"""
+Compaction of job descriptions before they are sent to the model.
+
+Boilerplate sections (about us, benefits, equal opportunity statements, how
+to apply) and lines repeated across a company's cached postings are removed.
+Sections about the role and its requirements are always kept whole, and so is
+any line that states a requirement.
+
+Run this script to see the token reduction over all cached descriptions, or
+with --check N to compare the scores of N cached jobs evaluated with and
+without compaction.
+"""
+
+import argparse
+import random
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+
+from dedup import normalize, normalize_company
+from job_description import JobDescription
+from job_store import job_store
+from metrics import METRICS
+
+CHARS_PER_TOKEN = 4  # Rough estimate for English text
+MIN_REPEATED_LENGTH = 40  # Shorter lines, e.g. bullet points, are never dropped
+MIN_REPEATS = 2  # Other postings of the company a line must appear in
+MAX_MEAN_ABS_DRIFT = 5.0  # Fit percentage points, see check_score_drift
+
+KEEP_HEADING = re.compile(
+    r"\b(requirements?|qualifications?|profile|skills|must[- ]haves?"
+    r"|nice[- ]to[- ]haves?|you bring|you'll bring|you will bring|about you"
+    r"|who you are|you have|looking for|responsibilities|what you'll do"
+    r"|what you will do|your role|the role|your tasks|your mission|tech stack"
+    r"|experience"
+    r"|anforderungen|dein profil|ihr profil|deine aufgaben|ihre aufgaben)\b"
+)
+BOILERPLATE_HEADING = re.compile(
+    r"^(about (us|the company|the team)|who we are|our (story|mission|values|culture)"
+    r"|what we offer|we offer|our offer|what's in it for you|what is in it for you"
+    r"|benefits|perks|why join us|why us|why work with us|equal opportunit\w*"
+    r"|diversity.*|privacy.*|data protection|how to apply|application process"
+    r"|über uns|was wir bieten|wir bieten|deine vorteile|ihre vorteile)\b"
+)
+BOILERPLATE_LINE = re.compile(
+    r"equal opportunity|equal employment|without regard to|regardless of (their )?"
+    r"(race|gender|age|religion|sex|origin|background)|all qualified applicants"
+    r"|reasonable accommodation|e-verify|privacy (notice|policy)"
+    r"|diverse (and|&) inclusive|committed to (building a )?divers",
+    re.IGNORECASE,
+)
+REQUIREMENT_LINE = re.compile(
+    r"\b(\d+\+? years?|years of|experience (with|in)|knowledge of|proficien\w*"
+    r"|degree|fluent|fluency|german|english|must|required|requirement)\b",
+    re.IGNORECASE,
+)
+MAX_HEADING_WORDS = 8
+
+
+@dataclass
+class CompactionStats:
+    """Description sizes before and after compaction, summed over the run."""
+
+    descriptions: int = 0
+    chars_before: int = 0
+    chars_after: int = 0
+    removed_lines: Counter = field(default_factory=Counter)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, before: str, after: str, removed: Counter) -> None:
+        """Add a compacted description."""
+        with self._lock:
+            self.descriptions += 1
+            self.chars_before += len(before)
+            self.chars_after += len(after)
+            self.removed_lines.update(removed)
+        METRICS.increment(
+            "description_tokens_total", len(before) / CHARS_PER_TOKEN, kind="before"
+        )
+        METRICS.increment(
+            "description_tokens_total", len(after) / CHARS_PER_TOKEN, kind="after"
+        )
+
+    def reset(self) -> None:
+        """Start counting from zero, e.g. before the next run of a daemon."""
+        with self._lock:
+            self.descriptions = self.chars_before = self.chars_after = 0
+            self.removed_lines = Counter()
+
+    def summary(self) -> str:
+        """Human readable summary."""
+        before = self.chars_before // CHARS_PER_TOKEN
+        after = self.chars_after // CHARS_PER_TOKEN
+        saved = 1 - after / before if before else 0
+        reasons = ", ".join(f"{n} {reason}" for reason, n in self.removed_lines.items())
+        return (
+            f"✂️  Compacted {self.descriptions} descriptions from ~{before} to "
+            f"~{after} tokens (-{saved:.0%}), removed lines: {reasons or 'none'}"
+        )
+
+
+COMPACTION_STATS = CompactionStats()
+
+
+def _line_key(line: str) -> int:
+    return hash(" ".join(line.lower().split()))
+
+
+class CompanyLines:
+    """Counts of the long lines in each company's postings."""
+
+    def __init__(self):
+        self._counts: dict[str, Counter] = {}
+        self._indexed: set[str] = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _keys(description: str) -> set[int]:
+        return {
+            _line_key(line)
+            for line in description.splitlines()
+            if len(line.strip()) >= MIN_REPEATED_LENGTH
+        }
+
+    def add(self, job: JobDescription) -> None:
+        """Count the lines of a posting, once per job id."""
+        with self._lock:
+            if job.job_id in self._indexed:
+                return
+            self._indexed.add(job.job_id)
+            company = normalize_company(job.company)
+            self._counts.setdefault(company, Counter()).update(
+                self._keys(job.description)
+            )
+
+    def repeated(self, job: JobDescription) -> set[int]:
+        """Keys of the lines of `job` found in MIN_REPEATS other postings."""
+        self.add(job)
+        counts = self._counts.get(normalize_company(job.company), Counter())
+        return {
+            key
+            for key in self._keys(job.description)
+            # The posting itself is counted too
+            if counts[key] - 1 >= MIN_REPEATS
+        }
+
+
+_company_lines: CompanyLines | None = None
+_company_lines_lock = threading.Lock()
+
+
+def company_lines() -> CompanyLines:
+    """Line counts of all cached postings, loaded on first use."""
+    global _company_lines
+    with _company_lines_lock:
+        if _company_lines is None:
+            lines = CompanyLines()
+            for data in job_store().iter_descriptions():
+                lines.add(JobDescription.model_validate_json(data))
+            _company_lines = lines
+        return _company_lines
+
+
+def heading_kind(line: str) -> str | None:
+    """Kind of section a heading starts: keep, boilerplate or other, else None."""
+    heading = re.sub(r"[^\w\s'&-]", "", line.lower()).strip()
+    if not heading or len(heading.split()) > MAX_HEADING_WORDS:
+        return None
+    if KEEP_HEADING.search(heading):
+        return "keep"
+    if BOILERPLATE_HEADING.search(heading):
+        return "boilerplate"
+    if line.rstrip().endswith(":"):
+        return "other"  # Unknown heading, ends the previous section
+    return None
+
+
+def compact(job: JobDescription) -> tuple[str, Counter]:
+    """The description without boilerplate, and the reasons for removed lines."""
+    repeated = company_lines().repeated(job)
+    company_heading = f"about {normalize_company(job.company)}"
+    section = None
+    kept = []
+    removed: Counter = Counter()
+    for line in job.description.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if normalize(stripped) == company_heading:
+            kind: str | None = "boilerplate"
+        else:
+            kind = heading_kind(stripped)
+        if kind is not None:
+            section = kind
+        if section == "keep":
+            kept.append(line)
+        elif BOILERPLATE_LINE.search(stripped):
+            removed["boilerplate"] += 1
+        elif REQUIREMENT_LINE.search(stripped):
+            kept.append(line)
+        elif section == "boilerplate":
+            removed["boilerplate section"] += 1
+        elif _line_key(stripped) in repeated:
+            removed["repeated"] += 1
+        else:
+            kept.append(line)
+    return "\n".join(kept), removed
+
+
+def compact_description(job: JobDescription) -> str:
+    """The description to send to the model, recorded in COMPACTION_STATS."""
+    description, removed = compact(job)
+    COMPACTION_STATS.add(job.description, description, removed)
+    return description
+
+
+def check_score_drift(sample_size: int) -> None:
+    """Evaluate a sample of cached jobs with and without compaction."""
+    # Imported here, ai_evaluator compacts descriptions with this module
+    from ai_evaluator import ask_bot_to_evaluate, cached_job_evaluations
+
+    jobs = [job for job, _ in cached_job_evaluations()]
+    sample = random.sample(jobs, min(sample_size, len(jobs)))
+    drifts = []
+    for job in sample:
+        full = ask_bot_to_evaluate(job, compact=False)
+        compacted = ask_bot_to_evaluate(job, compact=True)
+        drift = (
+            compacted.fit_to_requirements_percentage
+            - full.fit_to_requirements_percentage
+        )
+        drifts.append(drift)
+        print(
+            f"{job.title} at {job.company}: {full.fit_to_requirements_percentage}% "
+            f"-> {compacted.fit_to_requirements_percentage}%"
+        )
+    print(COMPACTION_STATS.summary())
+    if not drifts:
+        print("No cached evaluations to check")
+        return
+    mean_drift = sum(drifts) / len(drifts)
+    mean_abs_drift = sum(abs(d) for d in drifts) / len(drifts)
+    print(
+        f"Score drift over {len(drifts)} jobs: mean {mean_drift:+.1f}, "
+        f"mean absolute {mean_abs_drift:.1f}, max {max(drifts, key=abs):+d}"
+    )
+    if mean_abs_drift > MAX_MEAN_ABS_DRIFT:
+        raise SystemExit(f"❌ Scores drift by more than {MAX_MEAN_ABS_DRIFT} points")
+    print("✅ No significant score drift")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact cached job descriptions")
+    parser.add_argument(
+        "--check",
+        type=int,
+        metavar="N",
+        help="compare the scores of N cached jobs with and without compaction",
+    )
+    args = parser.parse_args()
+    if args.check:
+        check_score_drift(args.check)
+    else:
+        for data in job_store().iter_descriptions():
+            compact_description(JobDescription.model_validate_json(data))
+        print(COMPACTION_STATS.summary())
@@ -1,35 +1,93 @@
 """CSV table."""
 
-import os
 import csv
+import io
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
 from applications_table import AppTable
 
 from scrape_linkedin import JobDescription
 from ai_evaluator import JobEvaluation
+from metrics import METRICS
+
+try:
+    import fcntl
+except ImportError:  # Windows, only threads of this process are synchronized
+    fcntl = None  # type: ignore[assignment]
+
+FIELDNAMES = [
+    "id",
+    "title",
+    "company",
+    "url",
+    "fit",
+    "explanation",
+    "seniority",
+    "what_the_company_does",
+    "job_description_summary",
+]
 
 
 class CsvTable(AppTable):
-    """CSV table."""
+    """CSV table.
+
+    The ids in the file are indexed in memory once, rows are buffered and
+    appended with a single write under an exclusive lock. Rows other writers
+    appended in the meantime are indexed before each write so they are not
+    duplicated.
+    """
 
-    def __init__(self, table_name: str = "jobs_evaluated.csv"):
+    def __init__(self, table_name: str = "jobs_evaluated.csv", buffer_size: int = 100):
         self.table_name = table_name
+        self.buffer_size = buffer_size
+        self.job_ids: set[str] = set()
+        self.pending: list[dict] = []
+        self._fieldnames: list[str] = []
+        self._offset = 0
+        self._lock = threading.Lock()
+        self._file = open(table_name, "a+", encoding="utf-8", newline="")
+        with self._locked():
+            self._read_new_rows()
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._file, fcntl.LOCK_UN)
+
+    def _read_new_rows(self) -> set[str]:
+        """Index rows appended since the last read, returns their ids."""
+        self._file.seek(self._offset)
+        if self._offset == 0:
+            reader = csv.DictReader(self._file)
+            self._fieldnames = list(reader.fieldnames or [])
+        else:
+            reader = csv.DictReader(self._file, fieldnames=self._fieldnames)
+        # Older tables named the column "job_id"
+        id_column = "id" if "id" in self._fieldnames else "job_id"
+        new_ids = {row[id_column] for row in reader}
+        self._offset = self._file.tell()
+        self.job_ids.update(new_ids)
+        return new_ids
 
     def job_id_in_table(self, job_id: str) -> bool:
         """Check if a job ID is in the table."""
-        if not os.path.exists(self.table_name):
-            return False
-        with open(self.table_name, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row["id"] == job_id:
-                    return True
-        return False
+        return job_id in self.job_ids
 
     def add_to_table(
         self, description: JobDescription, evaluation: JobEvaluation
     ) -> None:
         """Add a job to the table."""
         row = {
+            "id": description.job_id,
             "job_id": description.job_id,
             "title": description.title,
             "company": description.company,
@@ -40,12 +98,39 @@ class CsvTable(AppTable):
             "what_the_company_does": evaluation.what_the_company_does,
             "job_description_summary": evaluation.job_description_summary,
         }
-        if not os.path.exists(self.table_name):
-            with open(self.table_name, "w", encoding="utf-8") as f:
-                fieldnames = row.keys()
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-
-        with open(self.table_name, "a", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=row.keys())
-            writer.writerow(row)
+        with self._lock:
+            self.job_ids.add(description.job_id)
+            self.pending.append(row)
+            full = len(self.pending) >= self.buffer_size
+        if full:
+            self.flush()
+
+    def flush(self) -> None:
+        """Append the buffered rows with a single write."""
+        with self._locked(), METRICS.timer("stage_seconds", stage="csv_flush"):
+            if not self.pending:
+                return
+            appended_by_others = self._read_new_rows()
+            rows = [row for row in self.pending if row["id"] not in appended_by_others]
+            self.pending = []
+
+            buffer = io.StringIO()
+            if not self._fieldnames:
+                self._fieldnames = FIELDNAMES
+                csv.writer(buffer).writerow(FIELDNAMES)
+            writer = csv.DictWriter(
+                buffer, fieldnames=self._fieldnames, extrasaction="ignore"
+            )
+            writer.writerows(rows)
+            self._file.write(buffer.getvalue())
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._offset = self._file.tell()
+
+    def close(self) -> None:
+        """Flush and close the file."""
+        self.flush()
+        self._file.close()
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
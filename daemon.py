@@ -0,0 +1,297 @@
+"""
+Long-running mode: scheduled searches and a watched Glassdoor export directory.
+
+Every run of main.py starts cold: it imports its dependencies, loads the ids
+of every table, opens new HTTP connections and a new OpenAI client, and looks
+up the same LinkedIn ids in the job store again. The daemon starts once and
+keeps all of that warm between runs: the tables stay open with their ids, the
+shared HTTP session and OpenAI client are reused, and the ids known to be
+stored are kept in memory, see search_orchestrator.py. What can change between
+runs is read again before each one: the CVs, skills and prompts, the IDF
+corpus of the pre-filter, and the jobs accepted into the tables that rank the
+evaluations.
+
+The searches configured in main.py run every SEARCH_INTERVAL_MINUTES, with
+their cached pages expired first so every scheduled search sees new postings
+however short the interval. The
+main.GLASSDOOR_EXPORTS directory is polled every WATCH_INTERVAL_SECONDS, and
+new export files are ingested once they stopped changing between two polls.
+
+The status of the daemon is served as JSON on http://localhost:STATUS_PORT/status
+and the metrics of the last run in the Prometheus text format on /metrics.
+
+Run this script to start the daemon, Ctrl+C stops it after the current run.
+"""
+
+import argparse
+import json
+import signal
+import threading
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass, field, fields, replace
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+import ai_evaluator
+import main
+import prefilter
+from ai_evaluator import TOKEN_USAGE, openai_client
+from compaction import COMPACTION_STATS
+from glassdoor_json_parser import export_files
+from evaluation_scheduler import Ranker
+from http_cache import SEARCH_PAGES, http_cache
+from job_store import job_store
+from metrics import METRICS
+from pipeline import Destination
+from profiles import DEFAULT_PROFILE, load_profiles
+from run_journal import run_journal
+
+SEARCH_INTERVAL_MINUTES = 60
+WATCH_INTERVAL_SECONDS = 30
+STATUS_HOST = "127.0.0.1"  # Only reachable from this machine
+STATUS_PORT = 8765
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+@dataclass
+class DaemonStatus:
+    """What the daemon did and is doing, served by the status endpoint."""
+
+    started: str = field(default_factory=_now)
+    state: str = "starting"  # starting, idle, running or stopping
+    runs: int = 0
+    failed_runs: int = 0
+    evaluated: int = 0
+    tokens: int = 0
+    cost_usd: float = 0.0
+    last_run_started: Optional[str] = None
+    last_run_seconds: Optional[float] = None
+    last_error: Optional[str] = None
+    next_search: Optional[str] = None
+    table_sizes: dict[str, int] = field(default_factory=dict)  # Per profile
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def update(self, **changes) -> None:
+        """Change some fields at once."""
+        with self._lock:
+            for name, value in changes.items():
+                setattr(self, name, value)
+
+    def record_run(
+        self,
+        seconds: float,
+        evaluated: int,
+        error: Optional[str],
+        table_sizes: dict[str, int],
+    ) -> None:
+        """Count a finished run, `error` is None if it succeeded."""
+        with self._lock:
+            self.runs += 1
+            self.failed_runs += error is not None
+            self.evaluated += evaluated
+            self.tokens += TOKEN_USAGE.prompt_tokens + TOKEN_USAGE.completion_tokens
+            self.cost_usd = round(self.cost_usd + TOKEN_USAGE.cost_usd, 4)
+            self.last_run_seconds = round(seconds, 1)
+            self.last_error = error or self.last_error
+            self.table_sizes = table_sizes
+
+    def as_dict(self) -> dict:
+        """The status, for JSON."""
+        with self._lock:
+            return {
+                f.name: getattr(self, f.name)
+                for f in fields(self)
+                if not f.name.startswith("_")
+            }
+
+
+class ExportWatcher:
+    """Export files not ingested yet, once they stopped changing between polls.
+
+    A file still being written changes size or modification time between two
+    polls, so it waits for the next one.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._versions: dict[Path, tuple[int, int]] = {}
+
+    def ready(self) -> list[str]:
+        """Paths of the new or changed export files that are complete."""
+        if not Path(self.path).exists():
+            return []
+        versions = {}
+        ready = []
+        for file in export_files(self.path):
+            stat = file.stat()
+            version = (stat.st_size, stat.st_mtime_ns)
+            if job_store().is_file_ingested(str(file), *version):
+                continue
+            if self._versions.get(file) == version:
+                ready.append(str(file))
+            versions[file] = version
+        self._versions = versions
+        return ready
+
+
+def status_server(
+    status: DaemonStatus, host: str = STATUS_HOST, port: int = STATUS_PORT
+) -> ThreadingHTTPServer:
+    """Server of /status and /metrics, call serve_forever to start it."""
+
+    class StatusHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path == "/status":
+                body = json.dumps(status.as_dict(), indent=2)
+                content_type = "application/json"
+            elif self.path == "/metrics":
+                body = METRICS.prometheus()
+                content_type = "text/plain; version=0.0.4"
+            else:
+                self.send_error(404)
+                return
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format: str, *args) -> None:
+            pass  # Keep the output of the runs readable
+
+    return ThreadingHTTPServer((host, port), StatusHandler)
+
+
+class Daemon:
+    """Runs main.run on a schedule and for new exports, keeping its state warm."""
+
+    def __init__(
+        self,
+        search_interval: float = SEARCH_INTERVAL_MINUTES * 60,
+        watch_interval: float = WATCH_INTERVAL_SECONDS,
+    ):
+        self.search_interval = search_interval
+        self.watch_interval = watch_interval
+        self.status = DaemonStatus()
+        self.stopping = threading.Event()
+        self.watcher = ExportWatcher(main.GLASSDOOR_EXPORTS)
+
+    def stop(self, *_) -> None:
+        """Stop after the current run, abort it if asked twice."""
+        if self.stopping.is_set():
+            raise KeyboardInterrupt  # The journal resumes the run on next start
+        print("🛑 Stopping after the current run, Ctrl+C again to abort it")
+        self.status.update(state="stopping")
+        self.stopping.set()
+
+    def run_once(
+        self,
+        destinations: list[Destination],
+        searches: bool,
+        glassdoor_exports: Optional[list[str]],
+    ) -> None:
+        """One run, a failure is reported and the next run tries again."""
+        start = time.monotonic()
+        self.status.update(state="running", last_run_started=_now())
+        error = None
+        evaluated = 0
+        # The counters printed by main.run are per run, the status sums the tokens
+        TOKEN_USAGE.reset()
+        METRICS.reset()
+        COMPACTION_STATS.reset()
+        http_cache().reset()
+        try:
+            ai_evaluator.clear_caches()
+            prefilter.clear_caches()
+            destinations = [
+                (
+                    replace(d, ranker=Ranker(d.profile, d.app_table.job_ids))
+                    if d.ranker is not None
+                    else d
+                )
+                for d in destinations
+            ]
+            if searches:
+                http_cache().expire(SEARCH_PAGES)
+            http_cache().purge()
+            evaluated = main.run(
+                destinations, run_journal(), searches, glassdoor_exports
+            )
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}".splitlines()[0]
+            print(f"⚠️  Run failed, trying again later: {error}")
+        finally:
+            METRICS.write()
+        self.status.record_run(
+            time.monotonic() - start,
+            evaluated,
+            error,
+            {d.profile.label: len(d.app_table.job_ids) for d in destinations},
+        )
+
+    def serve(self, port: int = STATUS_PORT) -> None:
+        """Run until stopped, serving the status on `port`."""
+        server = status_server(self.status, port=port)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"📡 Status on http://{STATUS_HOST}:{port}/status and /metrics")
+        journal = run_journal()
+        print(journal.summary())
+        # Warm up once, everything below is reused by every run
+        openai_client()
+        profiles = load_profiles() if main.MULTI_PROFILE else [DEFAULT_PROFILE]
+        with ExitStack() as tables:
+            destinations = main.open_destinations(profiles, tables)
+            next_search = time.monotonic()
+            # The first run ingests everything, like main.py
+            exports: Optional[list[str]] = None
+            while not self.stopping.is_set():
+                searches = time.monotonic() >= next_search
+                if searches:
+                    next_search = time.monotonic() + self.search_interval
+                if searches or exports:
+                    self.run_once(destinations, searches, exports)
+                if self.stopping.is_set():
+                    break
+                next_time = datetime.now() + timedelta(
+                    seconds=next_search - time.monotonic()
+                )
+                self.status.update(
+                    state="idle", next_search=next_time.isoformat(timespec="seconds")
+                )
+                self.stopping.wait(
+                    max(0, min(self.watch_interval, next_search - time.monotonic()))
+                )
+                exports = self.watcher.ready()
+                if exports:
+                    print(f"📥 New Glassdoor exports: {', '.join(exports)}")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run searches on a schedule")
+    parser.add_argument(
+        "--search-interval",
+        type=float,
+        default=SEARCH_INTERVAL_MINUTES,
+        help="minutes between searches",
+    )
+    parser.add_argument(
+        "--watch-interval",
+        type=float,
+        default=WATCH_INTERVAL_SECONDS,
+        help="seconds between polls of the Glassdoor exports",
+    )
+    parser.add_argument("--port", type=int, default=STATUS_PORT)
+    args = parser.parse_args()
+
+    daemon = Daemon(args.search_interval * 60, args.watch_interval)
+    signal.signal(signal.SIGINT, daemon.stop)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    daemon.serve(args.port)
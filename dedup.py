@@ -0,0 +1,134 @@
+"""
+Near-duplicate detection of job postings across ids and sources.
+
+A posting's fingerprint is its normalized company and title, plus a 64 bit
+SimHash of the description's word shingles. Two postings are near-duplicates
+when company and title match and the SimHashes differ in at most
+MAX_DISTANCE bits, e.g. LinkedIn reposts or the same role found on Glassdoor.
+"""
+
+import json
+import re
+import threading
+from hashlib import blake2b
+
+import numpy as np
+
+from job_store import job_store
+
+SHINGLE_SIZE = 3
+SHINGLE_MULTIPLIER = np.uint64(0x100000001B3)
+MAX_DISTANCE = 10  # unrelated texts differ in ~32 bits, reposts in a few
+
+WORD = re.compile(r"\w+")
+GENDER_TAG = re.compile(r"\(\s*[mwfdxh]\s*(?:/\s*[mwfdxh]\s*)+\)|\*in\b", re.IGNORECASE)
+LEGAL_FORM = re.compile(
+    r"\b(gmbh|ag|se|kg|inc|ltd|llc|co|bv|plc|corp|corporation|limited)\b"
+)
+
+
+def normalize(text: str) -> str:
+    """Lower case words without gender tags or punctuation."""
+    return " ".join(WORD.findall(GENDER_TAG.sub(" ", text).lower()))
+
+
+def normalize_company(company: str) -> str:
+    """Normalized company name without its legal form."""
+    return " ".join(LEGAL_FORM.sub("", normalize(company)).split())
+
+
+def dedup_key(company: str, title: str) -> str:
+    """Normalized company and title, ignoring the company's legal form."""
+    return f"{normalize_company(company)}|{normalize(title)}"
+
+
+def simhash(text: str) -> int:
+    """64 bit SimHash of the word shingles of a text.
+
+    Every distinct word is hashed once, shingle hashes are combined from the
+    word hashes with wrapping uint64 arithmetic.
+    """
+    words = WORD.findall(text.lower())
+    if not words:
+        return 0
+    vocabulary = {word: i for i, word in enumerate(dict.fromkeys(words))}
+    word_hashes = np.frombuffer(
+        b"".join(blake2b(word.encode(), digest_size=8).digest() for word in vocabulary),
+        dtype=np.uint64,
+    )
+    hashes = word_hashes[np.fromiter(map(vocabulary.__getitem__, words), np.int64)]
+    num_shingles = len(words) - SHINGLE_SIZE + 1
+    if num_shingles > 0:
+        shingles = np.zeros(num_shingles, dtype=np.uint64)
+        for offset in range(SHINGLE_SIZE):
+            shingles = shingles * SHINGLE_MULTIPLIER + hashes[offset:][:num_shingles]
+        hashes = shingles
+    hashes = np.unique(hashes)
+    bits = np.unpackbits(hashes.view(np.uint8)).reshape(-1, 64)
+    majority = bits.sum(axis=0) * 2 > len(hashes)
+    return int.from_bytes(np.packbits(majority).tobytes(), "big")
+
+
+def fingerprint(company: str, title: str, description: str) -> tuple[str, int]:
+    """Dedup key and SimHash of a posting."""
+    return dedup_key(company, title), simhash(description)
+
+
+class DuplicateIndex:
+    """In-memory index of fingerprints, bucketed by dedup key."""
+
+    def __init__(self):
+        self._buckets: dict[str, list[tuple[int, str]]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(bucket) for bucket in self._buckets.values())
+
+    def add(self, job_id: str, key: str, hash_: int) -> None:
+        """Index a posting."""
+        with self._lock:
+            bucket = self._buckets.setdefault(key, [])
+            if all(other_id != job_id for _, other_id in bucket):
+                bucket.append((hash_, job_id))
+
+    def duplicates_of(self, job_id: str, key: str, hash_: int) -> list[str]:
+        """Ids of other indexed postings that are near-duplicates."""
+        return [
+            other_id
+            for other_hash, other_id in self._buckets.get(key, ())
+            if other_id != job_id and (other_hash ^ hash_).bit_count() <= MAX_DISTANCE
+        ]
+
+
+_index: DuplicateIndex | None = None
+_index_lock = threading.Lock()
+
+
+def _backfill_fingerprints() -> None:
+    """Fingerprint stored postings that predate fingerprinting."""
+    rows = []
+    for job_id, data in job_store().iter_descriptions_without_fingerprint():
+        job = json.loads(data)
+        key, hash_ = fingerprint(job["company"], job["title"], job["description"])
+        rows.append((key, f"{hash_:016x}", job_id))
+    if rows:
+        job_store().put_fingerprints(rows)
+
+
+def duplicate_index() -> DuplicateIndex:
+    """The index of all postings in the job store, loaded on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _backfill_fingerprints()
+            index = DuplicateIndex()
+            for job_id, key, hash_hex in job_store().iter_fingerprints():
+                index.add(job_id, key, int(hash_hex, 16))
+            _index = index
+        return _index
+
+
+def remember(job_id: str, key: str, hash_: int) -> None:
+    """Add a newly stored posting to the index, if it is already loaded."""
+    if _index is not None:
+        _index.add(job_id, key, hash_)
@@ -53,3 +53,4 @@ if evaluation.fit_to_requirements_percentage >= 0.85 and not air_table.job_id_in
 ):
     print(f"🎯 Adding {job.company} to the table")
     air_table.add_to_table(job, evaluation)
+    air_table.flush()
@@ -0,0 +1,306 @@
+"""
+Columnar index of the cached evaluations, for fast filtering and ranking.
+
+The scalars of every evaluation (fit, seniority, posted date, company, title,
+source) are kept in NumPy arrays, with strings as codes into a table of their
+distinct values. The requirements are kept as a sparse job x skill matrix:
+one row per requirement with its job, skill and levels.
+
+The index is persisted to INDEX_FILE and reloaded in milliseconds. When the
+store has new evaluations, only those are read and merged in, a re-evaluated
+job replaces its old row. Queries are vectorized over all jobs at once.
+
+Every profile has its own index in its directory, see profiles.py.
+
+Run this script to query the index, e.g. --min-fit 80 --days 7 --top 20.
+"""
+
+import argparse
+import os
+import re
+import time
+from dataclasses import dataclass, fields
+from datetime import date
+from typing import Iterable, Optional
+
+import numpy as np
+
+from export import parse_chunk
+from job_description import source_of_url
+from job_store import job_store
+from profiles import DEFAULT_PROFILE, Profile, load_profile
+
+INDEX_FILE = "evaluation_index.npz"
+INDEX_CHUNK_SIZE = 5000
+ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+CATEGORICAL = ("company", "title", "source")
+
+
+def _factorize(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Distinct values and the code of every value."""
+    uniques, codes = np.unique(values.astype(str), return_inverse=True)
+    return uniques, codes.astype(np.int32)
+
+
+def _dates(values: list[str]) -> np.ndarray:
+    """ISO dates as datetime64[D], NaT where the date is unknown."""
+    return np.array(
+        [value if ISO_DATE.match(value) else "NaT" for value in values],
+        dtype="datetime64[D]",
+    )
+
+
+@dataclass
+class EvaluationIndex:
+    """Arrays of the cached evaluations, one entry per job."""
+
+    version: np.ndarray  # Number of evaluations and last rowid in the store
+    job_id: np.ndarray
+    fit: np.ndarray
+    seniority: np.ndarray
+    posted: np.ndarray
+    company_values: np.ndarray
+    company: np.ndarray
+    title_values: np.ndarray
+    title: np.ndarray
+    source_values: np.ndarray
+    source: np.ndarray
+    skill_values: np.ndarray  # Lowercase skill names
+    requirement_job: np.ndarray
+    requirement_skill: np.ndarray
+    requirement_required: np.ndarray
+    requirement_mine: np.ndarray
+    requirement_strength: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.job_id)
+
+    @classmethod
+    def _from_rows(
+        cls, rows: list[list], requirements: list[tuple], version: np.ndarray
+    ) -> "EvaluationIndex":
+        """Index of parsed export rows, see export.parse_chunk."""
+        company_values, company = _factorize(np.array([r[9] for r in rows], str))
+        title_values, title = _factorize(np.array([r[10] for r in rows], str))
+        source_values, source = _factorize(
+            np.array([source_of_url(r[8]) for r in rows], str)
+        )
+        skill_values, skill = _factorize(
+            np.array([r[1].strip().lower() for r in requirements], str)
+        )
+        return cls(
+            version=version,
+            job_id=np.array([r[0] for r in rows], str),
+            fit=np.array([r[3] for r in rows], np.int16),
+            seniority=np.array([r[5] for r in rows], np.int8),
+            posted=_dates([r[11] for r in rows]),
+            company_values=company_values,
+            company=company,
+            title_values=title_values,
+            title=title,
+            source_values=source_values,
+            source=source,
+            skill_values=skill_values,
+            requirement_job=np.array([r[0] for r in requirements], np.int32),
+            requirement_skill=skill,
+            requirement_required=np.array([r[2] for r in requirements], np.int8),
+            requirement_mine=np.array([r[3] for r in requirements], np.int8),
+            requirement_strength=np.array([r[4] for r in requirements], np.int8),
+        )
+
+    @classmethod
+    def read_store(
+        cls, after_rowid: int = 0, profile: Profile = DEFAULT_PROFILE
+    ) -> "EvaluationIndex":
+        """Index of the evaluations of a profile stored after `after_rowid`."""
+        store = job_store()
+        version = np.array(store.evaluations_version(profile.name), np.int64)
+        rows: list[list] = []
+        requirements: list[tuple] = []
+        for chunk in store.iter_evaluation_chunks(
+            INDEX_CHUNK_SIZE, after_rowid, int(version[1]), profile.name
+        ):
+            for row, job_requirements in parse_chunk(chunk):
+                requirements.extend((len(rows), *r) for r in job_requirements)
+                rows.append(row)
+        return cls._from_rows(rows, requirements, version)
+
+    def merge(self, newer: "EvaluationIndex") -> "EvaluationIndex":
+        """This index with the jobs of a newer one, which replace the same ids."""
+        job_id = np.concatenate([self.job_id, newer.job_id])
+        # Keep the last row of every job id
+        _, last = np.unique(job_id[::-1], return_index=True)
+        keep = np.zeros(len(job_id), bool)
+        keep[len(job_id) - 1 - last] = True
+        new_row = np.cumsum(keep) - 1
+
+        def joined(name: str) -> np.ndarray:
+            return np.concatenate([getattr(self, name), getattr(newer, name)])
+
+        def decoded(name: str) -> np.ndarray:
+            return np.concatenate(
+                [
+                    getattr(self, f"{name}_values")[getattr(self, name)],
+                    getattr(newer, f"{name}_values")[getattr(newer, name)],
+                ]
+            )
+
+        requirement_job = joined("requirement_job")
+        requirement_job[len(self.requirement_job) :] += len(self)
+        kept_requirements = keep[requirement_job]
+        skill_values, skill = _factorize(
+            np.concatenate(
+                [
+                    self.skill_values[self.requirement_skill],
+                    newer.skill_values[newer.requirement_skill],
+                ]
+            )[kept_requirements]
+        )
+        columns = {}
+        for name in CATEGORICAL:
+            columns[f"{name}_values"], columns[name] = _factorize(decoded(name)[keep])
+        return EvaluationIndex(
+            version=newer.version,
+            job_id=job_id[keep],
+            fit=joined("fit")[keep],
+            seniority=joined("seniority")[keep],
+            posted=joined("posted")[keep],
+            skill_values=skill_values,
+            requirement_job=new_row[requirement_job[kept_requirements]].astype(
+                np.int32
+            ),
+            requirement_skill=skill,
+            requirement_required=joined("requirement_required")[kept_requirements],
+            requirement_mine=joined("requirement_mine")[kept_requirements],
+            requirement_strength=joined("requirement_strength")[kept_requirements],
+            **columns,
+        )
+
+    def save(self, path: str = INDEX_FILE) -> None:
+        """Write the index, replacing the file at once."""
+        temporary = f"{path}.tmp.npz"
+        np.savez(temporary, **{f.name: getattr(self, f.name) for f in fields(self)})
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str = INDEX_FILE) -> "EvaluationIndex":
+        """Read a saved index."""
+        with np.load(path) as archive:
+            return cls(**{f.name: archive[f.name] for f in fields(cls)})
+
+    def query(
+        self,
+        min_fit: Optional[int] = None,
+        min_seniority: Optional[int] = None,
+        posted_within_days: Optional[int] = None,
+        source: Optional[str] = None,
+        company: Optional[str] = None,
+        skills: Iterable[str] = (),
+        top_k: Optional[int] = None,
+    ) -> np.ndarray:
+        """Rows of the matching jobs, best fit first and newest first on ties.
+
+        `skills` must all be among the job's requirements, case insensitive.
+        """
+        mask = np.ones(len(self), bool)
+        if min_fit is not None:
+            mask &= self.fit >= min_fit
+        if min_seniority is not None:
+            mask &= self.seniority >= min_seniority
+        if posted_within_days is not None:
+            oldest = np.datetime64(date.today(), "D") - posted_within_days
+            mask &= self.posted >= oldest  # NaT compares False
+        for name, value in (("source", source), ("company", company)):
+            if value is not None:
+                values = getattr(self, f"{name}_values")
+                codes = np.flatnonzero(np.char.lower(values) == value.lower())
+                mask &= np.isin(getattr(self, name), codes)
+        for skill in skills:
+            codes = np.flatnonzero(self.skill_values == skill.strip().lower())
+            has_skill = np.zeros(len(self), bool)
+            has_skill[self.requirement_job[np.isin(self.requirement_skill, codes)]] = (
+                True
+            )
+            mask &= has_skill
+        rows = np.flatnonzero(mask)
+        if top_k is not None and top_k < len(rows):
+            # Only sort the candidates that can make the top k
+            kth_fit = np.partition(self.fit[rows], len(rows) - top_k)[-top_k]
+            rows = rows[self.fit[rows] >= kth_fit]
+        # NaT sorts last ascending, so newest first is the reverse of the oldest
+        posted = self.posted[rows].astype(np.int64)
+        posted[np.isnat(self.posted[rows])] = np.iinfo(np.int64).min
+        order = np.lexsort((-posted, -self.fit[rows].astype(np.int32)))
+        return rows[order][:top_k]
+
+    def describe(self, row: int) -> str:
+        """One line summary of a job."""
+        posted = self.posted[row]
+        return (
+            f"{self.fit[row]:>3}% seniority {self.seniority[row]} "
+            f"{'unknown' if np.isnat(posted) else posted} "
+            f"{self.source_values[self.source[row]]:<9} {self.job_id[row]:<12} "
+            f"{self.title_values[self.title[row]]} at "
+            f"{self.company_values[self.company[row]]}"
+        )
+
+
+def evaluation_index(
+    path: Optional[str] = None,
+    rebuild: bool = False,
+    profile: Profile = DEFAULT_PROFILE,
+) -> EvaluationIndex:
+    """The index of all cached evaluations of a profile, updated with the new ones.
+
+    `path` defaults to INDEX_FILE in the directory of the profile.
+    """
+    path = path or profile.path(INDEX_FILE)
+    version = np.array(job_store().evaluations_version(profile.name), np.int64)
+    index = None
+    if not rebuild and os.path.exists(path):
+        index = EvaluationIndex.load(path)
+        if np.array_equal(index.version, version):
+            return index
+        index = index.merge(EvaluationIndex.read_store(int(index.version[1]), profile))
+        # Evaluations were deleted if the counts disagree
+        if len(index) != index.version[0]:
+            index = None
+    if index is None:
+        index = EvaluationIndex.read_store(profile=profile)
+    index.save(path)
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the cached evaluations")
+    parser.add_argument("--min-fit", type=int)
+    parser.add_argument("--min-seniority", type=int)
+    parser.add_argument("--days", type=int, help="posted in the last N days")
+    parser.add_argument("--source", help="e.g. linkedin or glassdoor")
+    parser.add_argument("--company")
+    parser.add_argument("--skill", action="append", default=[], help="repeatable")
+    parser.add_argument("--top", type=int, default=20, help="number of jobs")
+    parser.add_argument("--rebuild", action="store_true", help="re-read all")
+    parser.add_argument("--profile", default="", help="name of a profile")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = evaluation_index(rebuild=args.rebuild, profile=load_profile(args.profile))
+    loaded = time.perf_counter()
+    rows = index.query(
+        args.min_fit,
+        args.min_seniority,
+        args.days,
+        args.source,
+        args.company,
+        args.skill,
+        args.top,
+    )
+    queried = time.perf_counter()
+    for row in rows:
+        print(index.describe(row))
+    print(
+        f"{len(rows)} of {len(index)} jobs, loaded in {loaded - start:.3f}s, "
+        f"queried in {(queried - loaded) * 1000:.1f}ms"
+    )
@@ -0,0 +1,149 @@
+"""
+Evaluation scheduling: the most promising jobs first, within a budget.
+
+Jobs waiting for an evaluation are ranked by a cheap local estimate of their
+relevance: the TF-IDF similarity of their description to the CV and skills, to
+the jobs already in the table, and how recently they were posted, see
+Ranker.priorities. The pipeline evaluates the waiting jobs best first.
+
+A run can be given a token or wall-clock Budget for its evaluations. Once it
+is spent, cached evaluations are still used but no more API calls are made,
+and the remaining jobs are deferred to the next run, see
+RunJournal.record_deferred. The budget reports where it cut off.
+"""
+
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Iterable, Optional
+
+import numpy as np
+
+from ai_evaluator import TOKEN_USAGE
+from job_description import JobDescription
+from job_store import job_store
+from prefilter import profile_tokens, similarity_to, tokenize
+from profiles import DEFAULT_PROFILE, Profile
+
+# Weights of the relevance estimate. Similarities are mostly below 0.3, so
+# recency breaks ties rather than outranking relevant jobs.
+CV_WEIGHT = 1.0
+ACCEPTED_WEIGHT = 1.0
+RECENCY_WEIGHT = 0.1
+RECENCY_HALF_LIFE_DAYS = 7
+
+
+def _age_days(posted_dates: list[str], today: date) -> np.ndarray:
+    """Days since each ISO posted date, NaN where it is unknown."""
+    ages = np.full(len(posted_dates), np.nan)
+    for i, posted in enumerate(posted_dates):
+        try:
+            ages[i] = (today - date.fromisoformat(posted)).days
+        except ValueError:
+            pass
+    return ages
+
+
+class Ranker:
+    """Relevance estimate of jobs for a profile and the jobs in its table."""
+
+    def __init__(
+        self, profile: Profile = DEFAULT_PROFILE, accepted_job_ids: Iterable[str] = ()
+    ):
+        self.profile_counts = Counter(profile_tokens(profile))
+        self.accepted_counts: Counter[str] = Counter()
+        for job_id in accepted_job_ids:
+            data = job_store().get_description(job_id)
+            if data is not None:
+                job = JobDescription.model_validate_json(data)
+                self.accepted_counts.update(tokenize(f"{job.title} {job.description}"))
+
+    def priorities(self, jobs: list[JobDescription]) -> np.ndarray:
+        """Priority of every job, higher is evaluated first."""
+        if not jobs:
+            return np.zeros(0)
+        documents = [
+            Counter(tokenize(f"{job.title} {job.description}")) for job in jobs
+        ]
+        priority = CV_WEIGHT * similarity_to(documents, self.profile_counts)
+        if self.accepted_counts:
+            priority += ACCEPTED_WEIGHT * similarity_to(documents, self.accepted_counts)
+        ages = _age_days([job.posted_date for job in jobs], date.today())
+        recency = np.nan_to_num(0.5 ** (np.maximum(ages, 0) / RECENCY_HALF_LIFE_DAYS))
+        return priority + RECENCY_WEIGHT * recency
+
+
+def ranked(jobs: list[JobDescription], ranker: Ranker) -> list[JobDescription]:
+    """Jobs in order of priority, best first."""
+    order = np.argsort(-ranker.priorities(jobs), kind="stable")
+    return [jobs[i] for i in order]
+
+
+@dataclass
+class Budget:
+    """Tokens and seconds the evaluations of a run may spend, None for no limit.
+
+    Both count from when the budget is created.
+    """
+
+    max_tokens: Optional[int] = None
+    max_seconds: Optional[float] = None
+    evaluated: list[float] = field(default_factory=list)  # Priorities
+    deferred: list[float] = field(default_factory=list)
+    _start_tokens: int = field(init=False)
+    _start_time: float = field(init=False, default_factory=time.monotonic)
+    _spent_at: Optional[int] = field(init=False, default=None)  # Evaluations
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def __post_init__(self) -> None:
+        self._start_tokens = self._tokens()
+
+    @staticmethod
+    def _tokens() -> int:
+        return TOKEN_USAGE.prompt_tokens + TOKEN_USAGE.completion_tokens
+
+    def spent(self) -> bool:
+        """Whether no more API calls should be made."""
+        spent = (
+            self.max_tokens is not None
+            and self._tokens() - self._start_tokens >= self.max_tokens
+        ) or (
+            self.max_seconds is not None
+            and time.monotonic() - self._start_time >= self.max_seconds
+        )
+        if spent:
+            with self._lock:
+                if self._spent_at is None:
+                    self._spent_at = len(self.evaluated)
+        return spent
+
+    def record(self, priority: float, evaluated: bool) -> None:
+        """Record that a job was evaluated, or deferred for lack of budget."""
+        with self._lock:
+            (self.evaluated if evaluated else self.deferred).append(priority)
+
+    def summary(self) -> str:
+        """Human readable summary of where the budget cut off."""
+        limits = []
+        if self.max_tokens is not None:
+            limits.append(f"{self.max_tokens} tokens")
+        if self.max_seconds is not None:
+            limits.append(f"{self.max_seconds:.0f}s")
+        with self._lock:
+            if self._spent_at is None:
+                return (
+                    f"💰 Budget of {' / '.join(limits) or 'nothing'} not reached, "
+                    f"{len(self.evaluated)} jobs evaluated"
+                )
+            before = self.evaluated[: self._spent_at]
+            return (
+                f"💰 Budget of {' / '.join(limits)} reached after {self._spent_at} "
+                f"jobs (lowest priority {min(before, default=0):.3f}), "
+                f"{len(self.deferred)} jobs deferred to the next run "
+                f"(highest priority {max(self.deferred, default=0):.3f}), "
+                f"{len(self.evaluated) - self._spent_at} more finished or were cached, "
+                f"{self._tokens() - self._start_tokens} tokens and "
+                f"{time.monotonic() - self._start_time:.0f}s spent"
+            )
@@ -0,0 +1,304 @@
+"""
+Streaming export of the cached evaluations to CSV and a columnar file.
+
+Evaluations and the fields of their job descriptions are read from the job
+store in chunks and parsed in a process pool, with a few
+chunks in flight. Rows are written as the chunks arrive, so memory stays
+constant however many evaluations there are.
+
+The columnar file is a NumPy .npz archive. Scalars are plain arrays, strings
+are stored Arrow-style as the concatenated UTF-8 bytes of a column plus the
+offsets of every value, see load_columns. The requirements are flattened into
+one row per requirement, with the index of their job in `requirement_job`.
+
+Run this script to export jobs_evaluated.csv, add --columnar to also write
+jobs_evaluated.npz. With --profile, the evaluations of that profile are
+exported into its directory, see profiles.py.
+"""
+
+import argparse
+import csv
+import json
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterable, Optional
+
+import numpy as np
+from tqdm import tqdm
+
+from job_store import job_store
+from profiles import DEFAULT_PROFILE, Profile, load_profile
+
+CSV_FILE = "jobs_evaluated.csv"
+COLUMNAR_FILE = "jobs_evaluated.npz"
+EXPORT_CHUNK_SIZE = 2000
+
+CSV_FIELDS = [
+    "id",
+    "what_the_company_does",
+    "job_description_summary",
+    "fit_to_requirements_percentage",
+    "fit_to_requirements_explanation",
+    "seniority_level",
+    "requirements",
+    "job_id",
+    "url",
+    "company",
+    "title",
+    "posted_date",
+]
+# Columnar file: name -> CSV field it is taken from
+JOB_COLUMN_FIELDS = {
+    "job_id": "id",
+    "title": "title",
+    "company": "company",
+    "url": "url",
+    "posted_date": "posted_date",
+    "fit": "fit_to_requirements_percentage",
+    "seniority": "seniority_level",
+    "what_the_company_does": "what_the_company_does",
+    "job_description_summary": "job_description_summary",
+    "explanation": "fit_to_requirements_explanation",
+}
+# Columnar file: name -> dtype, "str" for strings
+JOB_COLUMNS = dict.fromkeys(JOB_COLUMN_FIELDS, "str") | {
+    "fit": np.int16,
+    "seniority": np.int8,
+}
+REQUIREMENT_COLUMNS = {
+    "requirement_job": np.int64,
+    "requirement_skill": "str",
+    "requirement_required": np.int8,
+    "requirement_mine": np.int8,
+    "requirement_strength": np.int8,
+}
+
+Requirement = tuple[str, int, int, int]  # skill, required, mine, strength
+ParsedRow = tuple[list, list[Requirement]]  # CSV row, requirements
+
+
+def format_requirements(requirements: list[Requirement], delimiter: str = ", ") -> str:
+    """Same format as ai_evaluator.format_requirements, on parsed tuples."""
+    ordered = sorted(requirements, key=lambda r: r[3], reverse=True)
+    return delimiter.join(
+        f"{skill}({strength}): {mine}/{required}"
+        for skill, required, mine, strength in ordered
+    )
+
+
+def parse_chunk(chunk: list[tuple[str, Optional[str], ...]]) -> list[ParsedRow]:
+    """CSV rows and requirements of evaluation JSON and job description fields."""
+    parsed = []
+    for evaluation_data, *description in chunk:
+        evaluation = json.loads(evaluation_data)
+        requirements = [
+            (
+                r["skill"],
+                r["required_proficiency_level_1_to_5"],
+                r["my_proficiency_level_1_to_5"],
+                r["requirement_strength_1_to_5"],
+            )
+            for r in evaluation["requirements"]
+        ]
+        row = [
+            evaluation["job_id"],
+            evaluation["what_the_company_does"],
+            evaluation["job_description_summary"],
+            evaluation["fit_to_requirements_percentage"],
+            evaluation["fit_to_requirements_explanation"],
+            evaluation["seniority_level_1_to_5"],
+            format_requirements(requirements),
+            evaluation["job_id"],
+            *(value or "" for value in description),  # url, company, title, posted
+        ]
+        parsed.append((row, requirements))
+    return parsed
+
+
+class ColumnWriter:
+    """Appends chunks of columns to temporary files, then packs them as .npz."""
+
+    def __init__(self, path: str, columns: dict):
+        self.path = path
+        self.columns = columns
+        self.lengths = dict.fromkeys(columns, 0)
+        self._string_bytes = dict.fromkeys(columns, 0)
+        self._dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(path)))
+        self._files = {}
+        for name, dtype in columns.items():
+            self._files[name] = open(os.path.join(self._dir, name), "wb")
+            if dtype == "str":
+                offsets = open(os.path.join(self._dir, f"{name}_offsets"), "wb")
+                np.zeros(1, np.int64).tofile(offsets)
+                self._files[f"{name}_offsets"] = offsets
+
+    def append(self, name: str, values: list) -> None:
+        """Append values to a column."""
+        if self.columns[name] == "str":
+            encoded = [value.encode("utf-8") for value in values]
+            lengths = np.fromiter(map(len, encoded), np.int64, len(encoded))
+            offsets = self._string_bytes[name] + np.cumsum(lengths)
+            self._files[name].write(b"".join(encoded))
+            offsets.tofile(self._files[f"{name}_offsets"])
+            if len(offsets):
+                self._string_bytes[name] = int(offsets[-1])
+        else:
+            np.asarray(values, self.columns[name]).tofile(self._files[name])
+        self.lengths[name] += len(values)
+
+    def close(self) -> None:
+        """Pack all columns into the .npz archive."""
+        for file in self._files.values():
+            file.close()
+        try:
+            with zipfile.ZipFile(self.path, "w", zipfile.ZIP_STORED) as archive:
+                for name, dtype in self.columns.items():
+                    if dtype == "str":
+                        self._pack(archive, name, np.uint8, self._string_bytes[name])
+                        self._pack(
+                            archive, f"{name}_offsets", np.int64, self.lengths[name] + 1
+                        )
+                    else:
+                        self._pack(archive, name, dtype, self.lengths[name])
+        finally:
+            shutil.rmtree(self._dir)
+
+    def discard(self) -> None:
+        """Drop the columns written so far."""
+        for file in self._files.values():
+            file.close()
+        shutil.rmtree(self._dir)
+
+    def _pack(self, archive: zipfile.ZipFile, name: str, dtype, length: int) -> None:
+        header = {
+            "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+            "fortran_order": False,
+            "shape": (length,),
+        }
+        with archive.open(f"{name}.npy", "w", force_zip64=True) as out, open(
+            os.path.join(self._dir, name), "rb"
+        ) as data:
+            np.lib.format.write_array_header_2_0(out, header)
+            shutil.copyfileobj(data, out)
+
+
+def load_columns(path: str = COLUMNAR_FILE) -> dict[str, np.ndarray]:
+    """Columns of a columnar export, string columns as arrays of str."""
+    with np.load(path) as archive:
+        arrays = {name: archive[name] for name in archive.files}
+    columns = {}
+    for name, array in arrays.items():
+        if name.endswith("_offsets"):
+            continue
+        offsets = arrays.get(f"{name}_offsets")
+        if offsets is None:
+            columns[name] = array
+        else:
+            data = array.tobytes()
+            columns[name] = np.array(
+                [
+                    data[start:end].decode("utf-8")
+                    for start, end in zip(offsets, offsets[1:])
+                ],
+                dtype=object,
+            )
+    return columns
+
+
+def _parsed_chunks(workers: int, profile: Profile) -> Iterable[list[ParsedRow]]:
+    """Parsed chunks in store order, with up to 2 chunks per worker in flight."""
+    chunks = job_store().iter_evaluation_chunks(EXPORT_CHUNK_SIZE, profile=profile.name)
+    if workers <= 1:
+        yield from map(parse_chunk, chunks)
+        return
+    with ProcessPoolExecutor(workers) as executor:
+        pending: deque[Future] = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(parse_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def export_evaluations(
+    csv_path: Optional[str] = CSV_FILE,
+    columnar_path: Optional[str] = None,
+    workers: Optional[int] = None,
+    profile: Profile = DEFAULT_PROFILE,
+) -> int:
+    """Export all cached evaluations of a profile, returning how many.
+
+    `workers` defaults to the number of CPUs, 1 parses in this process.
+    """
+    workers = workers or os.cpu_count() or 1
+    count = 0
+    csv_file = None
+    columns = None
+    try:
+        if csv_path is not None:
+            csv_file = open(csv_path, "w", encoding="utf-8", newline="")
+            writer = csv.writer(csv_file)
+            writer.writerow(CSV_FIELDS)
+        if columnar_path is not None:
+            columns = ColumnWriter(columnar_path, JOB_COLUMNS | REQUIREMENT_COLUMNS)
+        for parsed in tqdm(_parsed_chunks(workers, profile), desc="Exporting chunks"):
+            if csv_file is not None:
+                writer.writerows(row for row, _ in parsed)
+            if columns is not None:
+                _append_columns(columns, parsed, count)
+            count += len(parsed)
+    except BaseException:
+        if columns is not None:
+            columns.discard()
+        raise
+    finally:
+        if csv_file is not None:
+            csv_file.close()
+    if columns is not None:
+        columns.close()
+    return count
+
+
+def _append_columns(columns: ColumnWriter, parsed: list[ParsedRow], first: int) -> None:
+    rows = [row for row, _ in parsed]
+    for name, field in JOB_COLUMN_FIELDS.items():
+        index = CSV_FIELDS.index(field)
+        columns.append(name, [row[index] for row in rows])
+    requirements = [
+        (first + i, *requirement)
+        for i, (_, job_requirements) in enumerate(parsed)
+        for requirement in job_requirements
+    ]
+    for i, name in enumerate(REQUIREMENT_COLUMNS):
+        columns.append(name, [requirement[i] for requirement in requirements])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the cached evaluations")
+    parser.add_argument("--csv", help=f"CSV file to write, {CSV_FILE} by default")
+    parser.add_argument(
+        "--columnar",
+        nargs="?",
+        const=COLUMNAR_FILE,
+        help=f"also write a columnar .npz file, {COLUMNAR_FILE} by default",
+    )
+    parser.add_argument("--workers", type=int, help="parsing processes")
+    parser.add_argument("--profile", default="", help="name of a profile")
+    args = parser.parse_args()
+    export_profile = load_profile(args.profile)
+    if args.columnar == COLUMNAR_FILE:
+        args.columnar = export_profile.path(COLUMNAR_FILE)
+    start = time.perf_counter()
+    exported = export_evaluations(
+        args.csv or export_profile.path(CSV_FILE),
+        args.columnar,
+        args.workers,
+        export_profile,
+    )
+    print(f"Exported {exported} evaluations in {time.perf_counter() - start:.1f}s")
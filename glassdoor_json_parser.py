@@ -2,11 +2,18 @@
 
 import json
 import re
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Any, Iterator, TextIO
 from urllib.parse import parse_qs, urlparse
 
-from job_description import JOBS_DIR, JobDescription
+from job_description import JobDescription, content_hash, save_job_descriptions
+from job_store import job_store
+
+CHUNK_SIZE = 1 << 16
+STORE_BATCH_SIZE = 500
+SEPARATORS = re.compile(r"[\s,]*")
 
 
 def extract_job_id(url: str) -> str:
@@ -37,36 +44,127 @@ def parse_posted_time(posted: str) -> str:
     return (now - delta).date().isoformat()
 
 
-def parse_glassdoor_jobs(file_name: str) -> list[JobDescription]:
-    """Parse jobs scraped from Glassdoor."""
-    output_dir = Path(JOBS_DIR)
-    output_dir.mkdir(exist_ok=True)
-
-    if not Path(file_name).exists():
-        print(f"File with scraped Glassdoor jobs {file_name} does not exist")
-        return []
-
-    with open(file_name, "r", encoding="utf-8") as f:
-        jobs_data = json.load(f)
+def iter_json_array(file: TextIO, chunk_size: int = CHUNK_SIZE) -> Iterator[Any]:
+    """Yield the elements of a JSON array one by one, reading the file in chunks."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    started = False
+    while True:
+        pos = SEPARATORS.match(buffer, pos).end()  # type: ignore[union-attr]
+        if pos == len(buffer):
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise ValueError("Unexpected end of the JSON array")
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        if not started:
+            if buffer[pos] != "[":
+                raise ValueError("Expected a JSON array")
+            started = True
+            pos += 1
+            continue
+        if buffer[pos] == "]":
+            return
+        try:
+            item, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        yield item
 
-    jobs: list[JobDescription] = []
-    print(f"Found {len(jobs_data)} jobs")
-    for job in jobs_data:
 
-        job_id = extract_job_id(job["link"])
-        if not job_id:
-            print(f"Skipping job {job['title']} because it has no jobListingId")
+def export_files(path: str) -> list[Path]:
+    """The export file at `path`, or all JSON exports in the `path` directory."""
+    if Path(path).is_dir():
+        return sorted(Path(path).glob("*.json"))
+    if not Path(path).exists():
+        print(f"File with scraped Glassdoor jobs {path} does not exist")
+        return []
+    return [Path(path)]
+
+
+def _job_description(job: dict) -> JobDescription | None:
+    job_id = extract_job_id(job["link"])
+    if not job_id:
+        print(f"Skipping job {job['title']} because it has no jobListingId")
+        return None
+    return JobDescription(
+        job_id=job_id,
+        url=job["link"],
+        company=job["company"],
+        title=job["title"],
+        description=job["description"],
+        posted_date=parse_posted_time(job["age"]),
+    )
+
+
+def _store_new(jobs: list[JobDescription]) -> list[JobDescription]:
+    """Store the jobs that are new or changed, returning the ones to handle.
+
+    Those are the stored ones, and unchanged ones that no run recorded, e.g.
+    stored by a run that crashed before the pipeline got to them.
+    """
+    job_ids = [job.job_id for job in jobs]
+    stored_hashes = job_store().get_content_hashes(job_ids)
+    changed = [
+        job for job in jobs if stored_hashes.get(job.job_id) != content_hash(job)
+    ]
+    if changed:
+        save_job_descriptions(changed)
+    handled = job_store().get_journaled_job_ids(job_ids)
+    changed_ids = {job.job_id for job in changed}
+    return [
+        job for job in jobs if job.job_id in changed_ids or job.job_id not in handled
+    ]
+
+
+def ingest_glassdoor_exports(path: str) -> Iterator[JobDescription]:
+    """Stream new and changed jobs from a Glassdoor export file or directory.
+
+    Files already ingested in the same version are skipped, jobs are merged
+    and de-duplicated across files, and jobs whose content did not change
+    since they were stored are skipped once a run recorded them, see
+    run_journal.py.
+    """
+    start = time.perf_counter()
+    seen: set[str] = set()
+    total = 0
+    new = 0
+    for file in export_files(path):
+        stat = file.stat()
+        if job_store().is_file_ingested(str(file), stat.st_size, stat.st_mtime_ns):
             continue
-        filepath = output_dir / f"{job_id}.json"
-        job_desc = JobDescription(
-            job_id=job_id,
-            url=job["link"],
-            company=job["company"],
-            title=job["title"],
-            description=job["description"],
-            posted_date=parse_posted_time(job["age"]),
+        batch: list[JobDescription] = []
+        with open(file, "r", encoding="utf-8") as f:
+            for job_data in iter_json_array(f):
+                total += 1
+                job = _job_description(job_data)
+                if job is None or job.job_id in seen:
+                    continue
+                seen.add(job.job_id)
+                batch.append(job)
+                if len(batch) == STORE_BATCH_SIZE:
+                    stored = _store_new(batch)
+                    new += len(stored)
+                    yield from stored
+                    batch = []
+        stored = _store_new(batch) if batch else []
+        new += len(stored)
+        yield from stored
+        job_store().mark_file_ingested(str(file), stat.st_size, stat.st_mtime_ns)
+
+    elapsed = time.perf_counter() - start
+    if total:
+        print(
+            f"Ingested {total} Glassdoor jobs ({new} new or changed) in {elapsed:.2f}s,"
+            f" {total / elapsed:.0f} jobs/s"
         )
-        jobs.append(job_desc)
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(job_desc.__dict__, f, indent=2)
-    return jobs
+
+
+def parse_glassdoor_jobs(file_name: str) -> list[JobDescription]:
+    """Parse jobs scraped from Glassdoor, returning the new and changed ones."""
+    return list(ingest_glassdoor_exports(file_name))
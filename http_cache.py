@@ -0,0 +1,191 @@
+"""
+On-disk cache of HTTP responses, under http_client.get.
+
+Each URL pattern has a rule. Search pages are fresh for SEARCH_TTL, so a
+search run again within the hour costs no requests. Schedulers that want new
+results on every run expire them first, see daemon.py. Stale responses with an
+ETag or Last-Modified are revalidated with a conditional request, and a 304
+reuses the cached body. Job pages are not cached here, their descriptions
+are in the job store, but dead postings (404, 410) and pages that failed to
+parse are remembered for NEGATIVE_TTL so they are not requested on every run.
+
+Cached responses live in the job store. Run this script to drop the expired
+ones.
+"""
+
+import functools
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from job_store import HttpResponseRow, JobStore, job_store
+from metrics import METRICS
+
+SEARCH_TTL = 60 * 60
+SEARCH_PAGES = "/seeMoreJobPostings/"  # URL part of the search pages
+NEGATIVE_TTL = 7 * 24 * 60 * 60
+MAX_STALE = 7 * 24 * 60 * 60  # Revalidatable responses are kept this long
+NEGATIVE_STATUSES = frozenset({404, 410})
+UNPARSEABLE = 422  # Status recorded for pages that failed to parse
+
+
+@dataclass(frozen=True)
+class CacheRule:
+    """How the responses of URLs containing `pattern` are cached."""
+
+    pattern: str
+    ttl: float  # Seconds a successful response is fresh, 0 to not cache it
+    negative_ttl: float  # Seconds a dead URL is remembered, 0 to not remember
+
+
+RULES = [
+    CacheRule(SEARCH_PAGES, ttl=SEARCH_TTL, negative_ttl=0),
+    CacheRule("/jobPosting/", ttl=0, negative_ttl=NEGATIVE_TTL),
+]
+
+
+def rule_for(url: str) -> Optional[CacheRule]:
+    """The rule of a URL, None for URLs that are never cached."""
+    for rule in RULES:
+        if rule.pattern in url:
+            return rule
+    return None
+
+
+def _response(row: HttpResponseRow, cache_status: str) -> requests.Response:
+    """Response rebuilt from a cached row."""
+    url, status, body, encoding, etag, last_modified, _ = row
+    resp = requests.Response()
+    resp.url = url
+    resp.status_code = status
+    resp._content = body
+    resp.encoding = encoding
+    resp.reason = "Unparseable" if status == UNPARSEABLE else ""
+    resp.headers = CaseInsensitiveDict({"X-Cache": cache_status})
+    if etag:
+        resp.headers["ETag"] = etag
+    if last_modified:
+        resp.headers["Last-Modified"] = last_modified
+    return resp
+
+
+class HttpCache:
+    """Cache of responses following RULES, with hit counts."""
+
+    def __init__(self, store: JobStore):
+        self.store = store
+        self.lookups: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        """Start counting lookups from zero, e.g. before the next run of a daemon."""
+        with self._lock:
+            self.lookups.clear()
+
+    def _count(self, result: str) -> None:
+        with self._lock:
+            self.lookups[result] += 1
+        METRICS.increment("cache_lookups_total", cache="http", result=result)
+
+    def lookup(self, url: str) -> tuple[Optional[requests.Response], dict[str, str]]:
+        """A fresh cached response, else the headers of a conditional request."""
+        if rule_for(url) is None:
+            return None, {}
+        row = self.store.get_http_response(url)
+        if row is None:
+            return None, {}
+        status, etag, last_modified, expires = row[1], row[4], row[5], row[6]
+        if time.time() < expires:
+            self._count("negative" if status >= 400 else "hit")
+            return _response(row, "hit"), {}
+        headers = {}
+        if status < 400 and etag:
+            headers["If-None-Match"] = etag
+        if status < 400 and last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return None, headers
+
+    def update(self, url: str, resp: requests.Response) -> requests.Response:
+        """Cache a response from the network, resolving a 304 to the cached one."""
+        rule = rule_for(url)
+        if rule is None:
+            return resp
+        if resp.status_code == 304:
+            row = self.store.get_http_response(url)
+            if row is not None:
+                row = (*row[:6], time.time() + rule.ttl)
+                self.store.put_http_response(row)
+                self._count("revalidated")
+                return _response(row, "revalidated")
+        self._count("miss")
+        if resp.ok and rule.ttl:
+            ttl = rule.ttl
+        elif resp.status_code in NEGATIVE_STATUSES and rule.negative_ttl:
+            ttl = rule.negative_ttl
+        else:
+            return resp
+        self.store.put_http_response(
+            (
+                url,
+                resp.status_code,
+                resp.content,
+                resp.encoding,
+                resp.headers.get("ETag"),
+                resp.headers.get("Last-Modified"),
+                time.time() + ttl,
+            )
+        )
+        return resp
+
+    def mark_unparseable(self, url: str, reason: str) -> None:
+        """Remember that a page could not be parsed, answering it with a 422."""
+        rule = rule_for(url)
+        if rule is None or not rule.negative_ttl:
+            return
+        self.store.put_http_response(
+            (
+                url,
+                UNPARSEABLE,
+                reason.encode("utf-8"),
+                "utf-8",
+                None,
+                None,
+                time.time() + rule.negative_ttl,
+            )
+        )
+
+    def expire(self, url_part: str) -> int:
+        """Expire the responses of URLs containing `url_part`, returning how many."""
+        return self.store.expire_http_responses(url_part, time.time())
+
+    def purge(self) -> int:
+        """Drop expired responses, returning how many."""
+        now = time.time()
+        return self.store.delete_http_responses(now, now - MAX_STALE)
+
+    def summary(self) -> str:
+        """Human readable summary."""
+        with self._lock:
+            lookups = Counter(self.lookups)
+        total = sum(lookups.values())
+        hit_rate = (total - lookups["miss"]) / total if total else 0
+        return (
+            f"🗄️  HTTP cache: {lookups['hit']} hits, {lookups['revalidated']} "
+            f"revalidated, {lookups['negative']} dead pages skipped, "
+            f"{lookups['miss']} misses ({hit_rate:.0%} hit rate)"
+        )
+
+
+@functools.cache
+def http_cache() -> HttpCache:
+    """The cache shared by the whole process."""
+    return HttpCache(job_store())
+
+
+if __name__ == "__main__":
+    print(f"Dropped {http_cache().purge()} expired responses")
@@ -0,0 +1,119 @@
+"""Shared HTTP session with connection pooling, adaptive rate limiting and caching."""
+
+import threading
+import time
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from http_cache import http_cache
+from metrics import METRICS, endpoint
+
+POOL_SIZE = 16
+TIMEOUT = 30
+
+
+class AdaptiveRateLimiter:
+    """Rate limiter shared between threads that backs off on 429 and ramps back up.
+
+    Requests are spaced 1/rate seconds apart. A 429 halves the rate and pauses
+    everybody for a cooldown, every successful response adds `ramp_up` back.
+    """
+
+    def __init__(
+        self,
+        rate: float = 4.0,
+        min_rate: float = 0.2,
+        max_rate: float = 20.0,
+        ramp_up: float = 0.1,
+        backoff: float = 0.5,
+        cooldown: float = 5.0,
+    ):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.ramp_up = ramp_up
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until the caller is allowed to send a request."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1 / self.rate
+        if slot > now:
+            time.sleep(slot - now)
+
+    def on_success(self) -> None:
+        """Ramp the rate back up after a successful request."""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.ramp_up)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None) -> None:
+        """Back off after a 429 response."""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * self.backoff)
+            pause = retry_after if retry_after is not None else self.cooldown
+            self._next_slot = max(self._next_slot, time.monotonic() + pause)
+        print(f"😴 Rate limited, slowing down to {self.rate:.1f} req/s")
+
+
+def make_session(pool_size: int = POOL_SIZE) -> requests.Session:
+    """Create a keep-alive session whose pool fits `pool_size` concurrent workers."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+SESSION = make_session()
+LINKEDIN_LIMITER = AdaptiveRateLimiter()
+
+
+def _retry_after(resp: requests.Response) -> Optional[float]:
+    value = resp.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def get(
+    url: str,
+    limiter: AdaptiveRateLimiter = LINKEDIN_LIMITER,
+    max_retries: int = 5,
+    cache: bool = True,
+) -> requests.Response:
+    """GET through the shared session, retrying 429s under the shared limiter.
+
+    With `cache`, responses are served from and stored in the HTTP cache, see
+    http_cache.py.
+    """
+    headers: dict[str, str] = {}
+    if cache:
+        cached, headers = http_cache().lookup(url)
+        if cached is not None:
+            return cached
+    resp = None
+    label = endpoint(url)
+    for _ in range(max_retries + 1):
+        limiter.acquire()
+        with METRICS.timer("http_request_seconds", endpoint=label):
+            resp = SESSION.get(url, timeout=TIMEOUT, headers=headers)
+        METRICS.increment(
+            "http_responses_total", endpoint=label, status=str(resp.status_code)
+        )
+        if resp.status_code != 429:
+            limiter.on_success()
+            return http_cache().update(url, resp) if cache else resp
+        METRICS.increment("http_rate_limited_total", endpoint=label)
+        limiter.on_rate_limited(_retry_after(resp))
+    assert resp is not None
+    return resp
@@ -1,11 +1,16 @@
 """Job description definition and utils"""
 
 import functools
-import os
-from typing import Callable
+import hashlib
+from typing import Callable, Iterable, Iterator, Optional
+from urllib.parse import urlparse
 
 from pydantic import BaseModel
 
+from dedup import duplicate_index, fingerprint, remember
+from job_store import job_store
+from metrics import METRICS
+
 JOBS_DIR = "jobs_fetched"
 
 
@@ -20,24 +25,81 @@ class JobDescription(BaseModel):
     posted_date: str
 
 
+def source_of_url(url: str) -> str:
+    """The site a job was found on"""
+    host = urlparse(url).netloc
+    for source in ("linkedin", "glassdoor"):
+        if source in host:
+            return source
+    return host or "other"
+
+
+def content_hash(job: JobDescription) -> str:
+    """Hash of the posting's content, ignoring the derived posted date"""
+    digest = hashlib.sha1()
+    for part in (job.url, job.company, job.title, job.description):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def load_job_description(job_id: str) -> Optional[JobDescription]:
+    """Load a job description from the store if it is there"""
+    data = job_store().get_description(job_id)
+    if data is None:
+        return None
+    return JobDescription.model_validate_json(data)
+
+
+def save_job_descriptions(jobs: Iterable[JobDescription]) -> None:
+    """Save job descriptions to the store in one transaction"""
+    rows = []
+    for job in jobs:
+        key, simhash = fingerprint(job.company, job.title, job.description)
+        remember(job.job_id, key, simhash)
+        rows.append(
+            (
+                job.job_id,
+                source_of_url(job.url),
+                job.posted_date,
+                key,
+                f"{simhash:016x}",
+                content_hash(job),
+                job.model_dump_json(),
+            )
+        )
+    job_store().put_descriptions(rows)
+
+
+def near_duplicates(job: JobDescription) -> list[str]:
+    """Ids of stored postings that are near-duplicates of a job"""
+    key, simhash = fingerprint(job.company, job.title, job.description)
+    return duplicate_index().duplicates_of(job.job_id, key, simhash)
+
+
+def cached_job_descriptions() -> Iterator[JobDescription]:
+    """All job descriptions in the store"""
+    for data in job_store().iter_descriptions():
+        yield JobDescription.model_validate_json(data)
+
+
 def cache_job_description(
-    func: Callable[[str], JobDescription]
+    func: Callable[[str], JobDescription],
 ) -> Callable[[str], JobDescription]:
-    """Decorator that caches job descriptions to files"""
+    """Decorator that caches job descriptions in the job store"""
 
     @functools.wraps(func)
     def wrapper(job_id: str) -> JobDescription:
-        if not os.path.exists(JOBS_DIR):
-            os.makedirs(JOBS_DIR)
-
-        file_name = JOBS_DIR + f"/{job_id}.json"
-        if os.path.exists(file_name):
-            with open(file_name, encoding="utf-8") as file:
-                return JobDescription.model_validate_json(file.read())
+        job = load_job_description(job_id)
+        if job is not None:
+            METRICS.increment(
+                "cache_lookups_total", cache="job_description", result="hit"
+            )
+            return job
 
+        METRICS.increment("cache_lookups_total", cache="job_description", result="miss")
         job = func(job_id)
-        with open(file_name, "w", encoding="utf-8") as file:
-            file.write(job.model_dump_json())
+        save_job_descriptions([job])
         return job
 
     return wrapper
@@ -46,4 +108,4 @@ def cache_job_description(
 @cache_job_description
 def cached_job_description(job_id: str) -> JobDescription:
     """Get job description from cache or fail"""
-    raise ValueError(f"Job description for {job_id} not found in {JOBS_DIR}")
+    raise ValueError(f"Job description for {job_id} not found in the job store")
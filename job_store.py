@@ -0,0 +1,717 @@
+"""
+SQLite store for cached job descriptions and evaluations.
+
+Rows keep the pydantic JSON of the model next to the indexed columns used for
+lookups and filtering. The store is model agnostic, the typed wrappers live
+next to the models in job_description.py and ai_evaluator.py.
+
+Run this script once to migrate the old per-job JSON directories.
+"""
+
+import functools
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
+
+STORE_FILE = "jobs.db"
+MIGRATION_CHUNK_SIZE = 1000
+# PRAGMA user_version of the current schema:
+# 1: SimHashes combine word hashes, see dedup.simhash, older ones are recomputed
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS job_descriptions (
+    job_id TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    posted_date TEXT NOT NULL,
+    dedup_key TEXT,
+    simhash TEXT,
+    content_hash TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_descriptions_source ON job_descriptions (source);
+CREATE INDEX IF NOT EXISTS job_descriptions_posted_date
+    ON job_descriptions (posted_date);
+
+CREATE TABLE IF NOT EXISTS job_evaluations (
+    profile TEXT NOT NULL DEFAULT '',
+    job_id TEXT NOT NULL,
+    fit INTEGER NOT NULL,
+    prompt_fingerprint TEXT NOT NULL DEFAULT '',
+    context_fingerprint TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL,
+    PRIMARY KEY (profile, job_id)
+);
+CREATE INDEX IF NOT EXISTS job_evaluations_fit ON job_evaluations (profile, fit);
+
+CREATE TABLE IF NOT EXISTS screening_evaluations (
+    profile TEXT NOT NULL DEFAULT '',
+    job_id TEXT NOT NULL,
+    prompt_fingerprint TEXT NOT NULL,
+    fit INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    cost_usd REAL NOT NULL,
+    full_fit INTEGER,
+    full_seconds REAL,
+    full_cost_usd REAL NOT NULL,
+    decided_by TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    PRIMARY KEY (profile, job_id)
+);
+
+CREATE TABLE IF NOT EXISTS job_skips (
+    profile TEXT NOT NULL DEFAULT '',
+    job_id TEXT NOT NULL,
+    prompt_fingerprint TEXT NOT NULL DEFAULT '',
+    reason TEXT NOT NULL,
+    PRIMARY KEY (profile, job_id)
+);
+
+CREATE TABLE IF NOT EXISTS ingested_files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started TEXT NOT NULL,
+    finished TEXT
+);
+
+CREATE TABLE IF NOT EXISTS run_searches (
+    run_id INTEGER NOT NULL,
+    search TEXT NOT NULL,
+    next_offset INTEGER NOT NULL,
+    found INTEGER NOT NULL,
+    done INTEGER NOT NULL,
+    PRIMARY KEY (run_id, search)
+);
+
+CREATE TABLE IF NOT EXISTS run_jobs (
+    job_id TEXT PRIMARY KEY,
+    run_id INTEGER NOT NULL,
+    stage TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS run_jobs_status ON run_jobs (status, run_id);
+
+CREATE TABLE IF NOT EXISTS http_responses (
+    url TEXT PRIMARY KEY,
+    status INTEGER NOT NULL,
+    body BLOB NOT NULL,
+    encoding TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    expires REAL NOT NULL
+);
+"""
+
+# job_id, source, posted_date, dedup_key, simhash, content_hash, json
+DescriptionRow = tuple[str, str, str, str, str, str, str]
+# profile, job_id, fit, prompt_fingerprint, context_fingerprint, json
+EvaluationRow = tuple[str, str, int, str, str, str]
+# profile, job_id, prompt_fingerprint, reason, see prefilter.py
+SkipRow = tuple[str, str, str, str]
+# profile, job_id, prompt_fingerprint, fit, json, seconds, cost_usd, full_fit,
+# full_seconds, full_cost_usd, decided_by, reason, see cascade.py
+ScreeningRow = tuple[
+    str,
+    str,
+    str,
+    int,
+    str,
+    float,
+    float,
+    Optional[int],
+    Optional[float],
+    float,
+    str,
+    str,
+]
+# url, status, body, encoding, etag, last_modified, expires (unix time)
+HttpResponseRow = tuple[
+    str, int, bytes, Optional[str], Optional[str], Optional[str], float
+]
+
+
+class JobStore:
+    """SQLite store in WAL mode with one connection per thread."""
+
+    def __init__(self, path: str = STORE_FILE):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        # Columns added after the first version of the schema
+        for table, column, definition in (
+            ("job_evaluations", "prompt_fingerprint", "TEXT NOT NULL DEFAULT ''"),
+            ("job_evaluations", "context_fingerprint", "TEXT NOT NULL DEFAULT ''"),
+            ("job_descriptions", "dedup_key", "TEXT"),
+            ("job_descriptions", "simhash", "TEXT"),
+            ("job_descriptions", "content_hash", "TEXT"),
+        ):
+            columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(job_evaluations)")}
+        if "profile" not in columns:
+            self._add_evaluation_profiles()
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(job_skips)")}
+        if "profile" not in columns:
+            self._add_skip_profiles()
+        if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            with self.transaction():
+                # The backfill of dedup.duplicate_index recomputes them
+                conn.execute("UPDATE job_descriptions SET simhash = NULL")
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _add_evaluation_profiles(self) -> None:
+        """Key evaluations by profile and job id, existing ones are the default profile.
+
+        The primary key can't be altered, so the table is copied. Rowids are
+        kept, see evaluations_version.
+        """
+        with self.transaction() as conn:
+            conn.execute("ALTER TABLE job_evaluations RENAME TO job_evaluations_old")
+            conn.execute("DROP INDEX job_evaluations_fit")
+            conn.execute(
+                "CREATE TABLE job_evaluations ("
+                " profile TEXT NOT NULL DEFAULT '', job_id TEXT NOT NULL,"
+                " fit INTEGER NOT NULL, prompt_fingerprint TEXT NOT NULL DEFAULT '',"
+                " context_fingerprint TEXT NOT NULL DEFAULT '',"
+                " data TEXT NOT NULL, PRIMARY KEY (profile, job_id))"
+            )
+            conn.execute(
+                "CREATE INDEX job_evaluations_fit ON job_evaluations (profile, fit)"
+            )
+            conn.execute(
+                "INSERT INTO job_evaluations"
+                " (rowid, job_id, fit, prompt_fingerprint, data)"
+                " SELECT rowid, job_id, fit, prompt_fingerprint, data"
+                " FROM job_evaluations_old"
+            )
+            conn.execute("DROP TABLE job_evaluations_old")
+
+    def _add_skip_profiles(self) -> None:
+        """Key skips by profile and job id, dropping the old ones.
+
+        A skip only spares the pre-filter, the next run records them again.
+        """
+        with self.transaction() as conn:
+            conn.execute("DROP TABLE job_skips")
+            conn.execute(
+                "CREATE TABLE job_skips ("
+                " profile TEXT NOT NULL DEFAULT '', job_id TEXT NOT NULL,"
+                " prompt_fingerprint TEXT NOT NULL DEFAULT '', reason TEXT NOT NULL,"
+                " PRIMARY KEY (profile, job_id))"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run the enclosed writes in a single transaction."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def get_description(self, job_id: str) -> Optional[str]:
+        """JSON of a cached job description."""
+        row = (
+            self._connection()
+            .execute("SELECT data FROM job_descriptions WHERE job_id = ?", (job_id,))
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    def put_descriptions(self, rows: Iterable[DescriptionRow]) -> None:
+        """Insert or replace job descriptions in one transaction."""
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO job_descriptions"
+                " (job_id, source, posted_date, dedup_key, simhash, content_hash, data)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def iter_descriptions(self) -> Iterator[str]:
+        """JSON of all cached job descriptions, newest postings first."""
+        for (data,) in self._connection().execute(
+            "SELECT data FROM job_descriptions ORDER BY posted_date DESC"
+        ):
+            yield data
+
+    def count_descriptions(self) -> int:
+        """Number of cached job descriptions."""
+        return (
+            self._connection()
+            .execute("SELECT COUNT(*) FROM job_descriptions")
+            .fetchone()[0]
+        )
+
+    def existing_job_ids(self, job_ids: list[str]) -> set[str]:
+        """The ids among `job_ids` that have a cached description."""
+        placeholders = ",".join("?" * len(job_ids))
+        return {
+            job_id
+            for (job_id,) in self._connection().execute(
+                f"SELECT job_id FROM job_descriptions WHERE job_id IN ({placeholders})",
+                job_ids,
+            )
+        }
+
+    def get_content_hashes(self, job_ids: list[str]) -> dict[str, str]:
+        """Content hashes of the stored descriptions among `job_ids`."""
+        placeholders = ",".join("?" * len(job_ids))
+        return dict(
+            self._connection().execute(
+                "SELECT job_id, content_hash FROM job_descriptions"
+                f" WHERE job_id IN ({placeholders}) AND content_hash IS NOT NULL",
+                job_ids,
+            )
+        )
+
+    def iter_fingerprints(self) -> Iterator[tuple[str, str, str]]:
+        """Job id, dedup key and hex SimHash of all fingerprinted descriptions."""
+        yield from self._connection().execute(
+            "SELECT job_id, dedup_key, simhash FROM job_descriptions"
+            " WHERE simhash IS NOT NULL"
+        )
+
+    def iter_descriptions_without_fingerprint(self) -> Iterator[tuple[str, str]]:
+        """Job id and JSON of descriptions that were stored without a fingerprint."""
+        yield from self._connection().execute(
+            "SELECT job_id, data FROM job_descriptions WHERE simhash IS NULL"
+        ).fetchall()
+
+    def put_fingerprints(self, rows: Iterable[tuple[str, str, str]]) -> None:
+        """Set the dedup key and hex SimHash of stored descriptions."""
+        with self.transaction() as conn:
+            conn.executemany(
+                "UPDATE job_descriptions SET dedup_key = ?, simhash = ? WHERE job_id = ?",
+                rows,
+            )
+
+    def get_evaluation(
+        self, job_id: str, profile: str = ""
+    ) -> Optional[tuple[str, str, str]]:
+        """JSON, prompt and context fingerprint of a cached job evaluation."""
+        return (
+            self._connection()
+            .execute(
+                "SELECT data, prompt_fingerprint, context_fingerprint"
+                " FROM job_evaluations"
+                " WHERE profile = ? AND job_id = ?",
+                (profile, job_id),
+            )
+            .fetchone()
+        )
+
+    def get_evaluation_fingerprints(
+        self, job_ids: list[str], profile: str = ""
+    ) -> dict[str, str]:
+        """Prompt fingerprints of the cached evaluations among `job_ids`."""
+        placeholders = ",".join("?" * len(job_ids))
+        return dict(
+            self._connection().execute(
+                "SELECT job_id, prompt_fingerprint FROM job_evaluations"
+                f" WHERE profile = ? AND job_id IN ({placeholders})",
+                [profile, *job_ids],
+            )
+        )
+
+    def put_evaluations(self, rows: Iterable[EvaluationRow]) -> None:
+        """Insert or replace job evaluations in one transaction."""
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO job_evaluations"
+                " (profile, job_id, fit, prompt_fingerprint, context_fingerprint, data)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def stamp_legacy_evaluations(self, fingerprint: str) -> int:
+        """Give evaluations stored without a prompt fingerprint this one.
+
+        Returns how many there were, e.g. migrated from before fingerprints.
+        """
+        with self.transaction() as conn:
+            return conn.execute(
+                "UPDATE job_evaluations SET prompt_fingerprint = ?"
+                " WHERE prompt_fingerprint = ''",
+                (fingerprint,),
+            ).rowcount
+
+    def iter_evaluations(
+        self, min_fit: Optional[int] = None, profile: str = ""
+    ) -> Iterator[tuple[str, Optional[str]]]:
+        """JSON of cached evaluations and their job descriptions, if any."""
+        query = (
+            "SELECT e.data, d.data FROM job_evaluations e"
+            " LEFT JOIN job_descriptions d ON d.job_id = e.job_id"
+            " WHERE e.profile = ?"
+        )
+        params: tuple = (profile,)
+        if min_fit is not None:
+            query += " AND e.fit >= ?"
+            params += (min_fit,)
+        yield from self._connection().execute(query, params)
+
+    def iter_evaluation_chunks(
+        self,
+        chunk_size: int,
+        after_rowid: int = 0,
+        up_to_rowid: int = -1,
+        profile: str = "",
+    ) -> Iterator[list[tuple[str, Optional[str], ...]]]:
+        """Chunks of evaluation JSON with the url, company, title and posted date.
+
+        Evaluations are read in the order they were stored, only those whose
+        rowid is after `after_rowid` and up to `up_to_rowid` (if not -1).
+        """
+        cursor = self._connection().execute(
+            "SELECT e.data, json_extract(d.data, '$.url'),"
+            " json_extract(d.data, '$.company'), json_extract(d.data, '$.title'),"
+            " json_extract(d.data, '$.posted_date')"
+            " FROM job_evaluations e LEFT JOIN job_descriptions d ON d.job_id = e.job_id"
+            " WHERE e.profile = ? AND e.rowid > ? AND (? = -1 OR e.rowid <= ?)"
+            " ORDER BY e.rowid",
+            (profile, after_rowid, up_to_rowid, up_to_rowid),
+        )
+        while chunk := cursor.fetchmany(chunk_size):
+            yield chunk
+
+    def evaluations_version(self, profile: str = "") -> tuple[int, int]:
+        """Number of evaluations and the last rowid, which every write changes."""
+        return (
+            self._connection()
+            .execute(
+                "SELECT count(*), coalesce(max(rowid), 0) FROM job_evaluations"
+                " WHERE profile = ?",
+                (profile,),
+            )
+            .fetchone()
+        )
+
+    def get_screening(self, profile: str, job_id: str) -> Optional[ScreeningRow]:
+        """Cached screening evaluation of a job, see cascade.py."""
+        return (
+            self._connection()
+            .execute(
+                "SELECT * FROM screening_evaluations WHERE profile = ? AND job_id = ?",
+                (profile, job_id),
+            )
+            .fetchone()
+        )
+
+    def put_screening(self, row: ScreeningRow) -> None:
+        """Insert or replace a screening evaluation."""
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO screening_evaluations"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+
+    def iter_screenings(self, profile: str = "") -> Iterator[ScreeningRow]:
+        """All screening evaluations of a profile."""
+        yield from self._connection().execute(
+            "SELECT * FROM screening_evaluations WHERE profile = ?", (profile,)
+        )
+
+    def put_skips(self, rows: Iterable[SkipRow]) -> None:
+        """Record why jobs were skipped for a profile without an evaluation."""
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO job_skips"
+                " (profile, job_id, prompt_fingerprint, reason) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+    def get_skip_fingerprints(
+        self, job_ids: list[str], profile: str = ""
+    ) -> dict[str, str]:
+        """Prompt fingerprints of the skips among `job_ids`."""
+        placeholders = ",".join("?" * len(job_ids))
+        return dict(
+            self._connection().execute(
+                "SELECT job_id, prompt_fingerprint FROM job_skips"
+                f" WHERE profile = ? AND job_id IN ({placeholders})",
+                [profile, *job_ids],
+            )
+        )
+
+    def is_file_ingested(self, path: str, size: int, mtime_ns: int) -> bool:
+        """Whether this version of a file was already ingested."""
+        row = (
+            self._connection()
+            .execute(
+                "SELECT size, mtime_ns FROM ingested_files WHERE path = ?", (path,)
+            )
+            .fetchone()
+        )
+        return row == (size, mtime_ns)
+
+    def mark_file_ingested(self, path: str, size: int, mtime_ns: int) -> None:
+        """Remember that this version of a file was ingested."""
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ingested_files (path, size, mtime_ns)"
+                " VALUES (?, ?, ?)",
+                (path, size, mtime_ns),
+            )
+
+    def last_run(self) -> Optional[tuple[int, Optional[str]]]:
+        """Id and finish time of the latest run."""
+        return (
+            self._connection()
+            .execute("SELECT run_id, finished FROM runs ORDER BY run_id DESC LIMIT 1")
+            .fetchone()
+        )
+
+    def start_run(self, started: str) -> int:
+        """Add a run, returning its id."""
+        with self.transaction() as conn:
+            cursor = conn.execute("INSERT INTO runs (started) VALUES (?)", (started,))
+        assert cursor.lastrowid is not None
+        return cursor.lastrowid
+
+    def finish_run(self, run_id: int, finished: str) -> None:
+        """Mark a run as finished."""
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE runs SET finished = ? WHERE run_id = ?", (finished, run_id)
+            )
+
+    def get_search_frontier(
+        self, run_id: int, search: str
+    ) -> Optional[tuple[int, int, bool]]:
+        """Next offset, ids found and whether a search of a run is done."""
+        row = (
+            self._connection()
+            .execute(
+                "SELECT next_offset, found, done FROM run_searches"
+                " WHERE run_id = ? AND search = ?",
+                (run_id, search),
+            )
+            .fetchone()
+        )
+        return (row[0], row[1], bool(row[2])) if row else None
+
+    def put_search_frontier(
+        self, run_id: int, search: str, next_offset: int, found: int, done: bool
+    ) -> None:
+        """Record how far a search of a run got."""
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO run_searches"
+                " (run_id, search, next_offset, found, done) VALUES (?, ?, ?, ?, ?)",
+                (run_id, search, next_offset, found, int(done)),
+            )
+
+    def put_run_jobs(
+        self, run_id: int, job_ids: Iterable[str], stage: str, status: str
+    ) -> None:
+        """Record the last stage jobs went through.
+
+        Failed attempts are kept until a stage succeeds, so a job that failed
+        before gets the full run_journal.MAX_ATTEMPTS again if it fails later.
+        """
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO run_jobs (job_id, run_id, stage, status) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (job_id) DO UPDATE SET run_id = excluded.run_id,"
+                " stage = excluded.stage, status = excluded.status, error = NULL,"
+                " attempts = CASE WHEN excluded.status = 'ok' THEN 0 ELSE attempts END",
+                ((job_id, run_id, stage, status) for job_id in job_ids),
+            )
+
+    def put_run_failure(self, run_id: int, job_id: str, stage: str, error: str) -> None:
+        """Record a failed stage of a job, counting the attempt."""
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO run_jobs (job_id, run_id, stage, status, attempts, error)"
+                " VALUES (?, ?, ?, 'failed', 1, ?)"
+                " ON CONFLICT (job_id) DO UPDATE SET run_id = excluded.run_id,"
+                " stage = excluded.stage, status = 'failed',"
+                " attempts = attempts + 1, error = excluded.error",
+                (job_id, run_id, stage, error),
+            )
+
+    def get_run_job_ids(self, run_id: int) -> set[str]:
+        """Ids of the jobs recorded by a run."""
+        return {
+            job_id
+            for (job_id,) in self._connection().execute(
+                "SELECT job_id FROM run_jobs WHERE run_id = ?", (run_id,)
+            )
+        }
+
+    def get_journaled_job_ids(self, job_ids: list[str]) -> set[str]:
+        """The ids among `job_ids` that any run recorded."""
+        placeholders = ",".join("?" * len(job_ids))
+        return {
+            job_id
+            for (job_id,) in self._connection().execute(
+                f"SELECT job_id FROM run_jobs WHERE job_id IN ({placeholders})",
+                job_ids,
+            )
+        }
+
+    def get_unfinished_jobs(self, run_id: int, last_stage: str) -> list[str]:
+        """Ids of the jobs of a run that are neither failed nor past `last_stage`."""
+        return [
+            job_id
+            for (job_id,) in self._connection().execute(
+                "SELECT job_id FROM run_jobs"
+                " WHERE run_id = ? AND status = 'ok' AND stage != ?",
+                (run_id, last_stage),
+            )
+        ]
+
+    def get_failed_jobs(self, max_attempts: int) -> list[tuple[str, str, int, str]]:
+        """Job id, stage, attempts and error of failed or deferred jobs to retry."""
+        return (
+            self._connection()
+            .execute(
+                "SELECT job_id, stage, attempts, error FROM run_jobs"
+                " WHERE status IN ('failed', 'deferred') AND attempts < ?"
+                " ORDER BY job_id",
+                (max_attempts,),
+            )
+            .fetchall()
+        )
+
+    def get_http_response(self, url: str) -> Optional[HttpResponseRow]:
+        """Cached response of a URL, fresh or not."""
+        return (
+            self._connection()
+            .execute(
+                "SELECT url, status, body, encoding, etag, last_modified, expires"
+                " FROM http_responses WHERE url = ?",
+                (url,),
+            )
+            .fetchone()
+        )
+
+    def put_http_response(self, row: HttpResponseRow) -> None:
+        """Insert or replace a cached response."""
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO http_responses"
+                " (url, status, body, encoding, etag, last_modified, expires)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+
+    def expire_http_responses(self, url_part: str, now: float) -> int:
+        """Make the fresh responses of URLs containing `url_part` expire `now`."""
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE http_responses SET expires = ?"
+                " WHERE expires > ? AND instr(url, ?) > 0",
+                (now, now, url_part),
+            )
+        return cursor.rowcount
+
+    def delete_http_responses(self, expired_before: float, stale_before: float) -> int:
+        """Drop responses that expired, keeping revalidatable ones a while longer."""
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "DELETE FROM http_responses WHERE expires < ? AND (expires < ?"
+                " OR (etag IS NULL AND last_modified IS NULL))",
+                (expired_before, stale_before),
+            )
+        return cursor.rowcount
+
+
+@functools.cache
+def job_store() -> JobStore:
+    """The store shared by the whole process."""
+    return JobStore(STORE_FILE)
+
+
+def _read_json_files(directory: str) -> Iterator[dict]:
+    for file in Path(directory).glob("*.json"):
+        with open(file, encoding="utf-8") as f:
+            yield json.load(f)
+
+
+def _chunks(rows: Iterable, size: int) -> Iterator[list]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def migrate_from_directories(
+    store: JobStore,
+    jobs_dir: str,
+    evaluations_dir: str,
+    source_of_url: Callable[[str], str],
+) -> tuple[int, int]:
+    """Copy the per-job JSON files into the store, keeping rows already there."""
+    descriptions = 0
+    for chunk in _chunks(_read_json_files(jobs_dir), MIGRATION_CHUNK_SIZE):
+        with store.transaction() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO job_descriptions"
+                " (job_id, source, posted_date, data) VALUES (?, ?, ?, ?)",
+                (
+                    (
+                        d["job_id"],
+                        source_of_url(d["url"]),
+                        d["posted_date"],
+                        json.dumps(d),
+                    )
+                    for d in chunk
+                ),
+            )
+        descriptions += len(chunk)
+
+    evaluations = 0
+    for chunk in _chunks(_read_json_files(evaluations_dir), MIGRATION_CHUNK_SIZE):
+        with store.transaction() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO job_evaluations (job_id, fit, data)"
+                " VALUES (?, ?, ?)",
+                (
+                    (e["job_id"], e["fit_to_requirements_percentage"], json.dumps(e))
+                    for e in chunk
+                ),
+            )
+        evaluations += len(chunk)
+    return descriptions, evaluations
+
+
+if __name__ == "__main__":
+    from ai_evaluator import EVALUATIONS_DIR
+    from job_description import JOBS_DIR, source_of_url
+
+    migrated = migrate_from_directories(
+        job_store(), JOBS_DIR, EVALUATIONS_DIR, source_of_url
+    )
+    print(f"Migrated {migrated[0]} job descriptions and {migrated[1]} evaluations")
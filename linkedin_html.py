@@ -0,0 +1,207 @@
+"""
+Extraction of the fields we need from LinkedIn guest API pages.
+
+Only a handful of nodes are read from each page, so the extractor is
+pluggable: the lxml backend parses in C and queries the nodes with XPath,
+the BeautifulSoup backend is the original pure Python path. EXTRACTOR uses
+lxml when it is installed and falls back to BeautifulSoup for any page lxml
+fails on.
+"""
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+
+try:
+    import lxml.html
+except ImportError:  # lxml is optional, BeautifulSoup is used instead
+    lxml = None  # type: ignore[assignment]
+
+
+@dataclass(frozen=True)
+class JobPosting:
+    """Raw fields of a job posting page."""
+
+    company: str
+    title: str
+    url: str
+    description: str
+    posted: str  # e.g. "2 days ago"
+
+
+class HtmlExtractor(ABC):
+    """Extracts job ids from search pages and postings from job pages.
+
+    `job_posting` raises AttributeError if a required element is missing.
+    """
+
+    @abstractmethod
+    def job_ids(self, html: str) -> list[str]:
+        """Job ids of the postings on a search page."""
+
+    @abstractmethod
+    def job_posting(self, html: str) -> JobPosting:
+        """Fields of a job posting page."""
+
+
+def _job_id_of_urn(urn: str) -> str:
+    """Job id of an entity URN like "urn:li:jobPosting:123"."""
+    return urn.split(":")[3]
+
+
+class Bs4Extractor(HtmlExtractor):
+    """Full BeautifulSoup tree built with the pure Python html.parser."""
+
+    def job_ids(self, html: str) -> list[str]:
+        from bs4 import BeautifulSoup  # Only imported if lxml is missing or fails
+
+        ids = []
+        for job_item in BeautifulSoup(html, "html.parser").find_all("li"):
+            try:
+                urn = job_item.find(attrs={"data-entity-urn": True}).get(
+                    "data-entity-urn"
+                )
+                ids.append(_job_id_of_urn(urn))
+            except (AttributeError, IndexError) as e:
+                print(f"Failed to parse this job item:\n{job_item}\nError: {e}")
+        return ids
+
+    def job_posting(self, html: str) -> JobPosting:
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(html, "html.parser")
+        company_elem = soup.find("a", class_="topcard__org-name-link") or soup.find(
+            "span", class_="topcard__flavor"
+        )
+        title_h2 = soup.find("h2", class_="top-card-layout__title")
+        desc_elem = soup.find("div", class_="show-more-less-html__markup")
+        date_elem = soup.find(
+            "span", class_=lambda c: c and ("posted-time-ago__text" in c)
+        )
+        if (
+            company_elem is None
+            or title_h2 is None
+            or desc_elem is None
+            or date_elem is None
+            or title_h2.parent is None
+        ):
+            raise AttributeError("Failed to find required elements")
+        url = title_h2.parent.get("href")
+        if not isinstance(url, str):
+            raise AttributeError("Failed to find valid URL")
+        return JobPosting(
+            company=company_elem.text.strip(),
+            title=title_h2.text.strip(),
+            url=url,
+            description=desc_elem.get_text("\n", strip=True),
+            posted=date_elem.text.strip(),
+        )
+
+
+def _has_class(name: str) -> str:
+    """XPath predicate matching elements with the class `name`."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+class LxmlExtractor(HtmlExtractor):
+    """lxml parser in C, only the needed nodes are queried with XPath."""
+
+    COMPANY_LINK = f"//a[{_has_class('topcard__org-name-link')}]"
+    COMPANY_FLAVOR = f"//span[{_has_class('topcard__flavor')}]"
+    TITLE = f"//h2[{_has_class('top-card-layout__title')}]"
+    DESCRIPTION = f"//div[{_has_class('show-more-less-html__markup')}]"
+    POSTED = "//span[contains(@class, 'posted-time-ago__text')]"
+    # Like BeautifulSoup's get_text, script and style contents are not text
+    TEXT = ".//text()[not(ancestor::script or ancestor::style)]"
+
+    def __init__(self):
+        if lxml is None:
+            raise ImportError("LxmlExtractor needs lxml, pip install lxml")
+
+    @staticmethod
+    def _parse(html: str):
+        if not html.strip():
+            raise AttributeError("Empty page")
+        return lxml.html.document_fromstring(html)
+
+    @staticmethod
+    def _first(root, xpath: str):
+        found = root.xpath(f"({xpath})[1]")
+        return found[0] if found else None
+
+    def _text(self, elem) -> str:
+        return "".join(elem.xpath(self.TEXT))
+
+    def job_ids(self, html: str) -> list[str]:
+        if not html.strip():
+            return []
+        ids = []
+        for job_item in self._parse(html).iter("li"):
+            try:
+                urn = job_item.xpath("(.//*[@data-entity-urn])[1]/@data-entity-urn")
+                if not urn:
+                    raise AttributeError("No data-entity-urn")
+                ids.append(_job_id_of_urn(urn[0]))
+            except (AttributeError, IndexError) as e:
+                item = lxml.html.tostring(job_item, encoding="unicode")
+                print(f"Failed to parse this job item:\n{item}\nError: {e}")
+        return ids
+
+    def job_posting(self, html: str) -> JobPosting:
+        root = self._parse(html)
+        # BeautifulSoup prefers the org name link over the flavor span,
+        # wherever they are in the page
+        company_elem = self._first(root, self.COMPANY_LINK)
+        if company_elem is None:
+            company_elem = self._first(root, self.COMPANY_FLAVOR)
+        title_h2 = self._first(root, self.TITLE)
+        desc_elem = self._first(root, self.DESCRIPTION)
+        date_elem = self._first(root, self.POSTED)
+        if (
+            company_elem is None
+            or title_h2 is None
+            or desc_elem is None
+            or date_elem is None
+            or title_h2.getparent() is None
+        ):
+            raise AttributeError("Failed to find required elements")
+        url = title_h2.getparent().get("href")
+        if not isinstance(url, str):
+            raise AttributeError("Failed to find valid URL")
+        lines = (line.strip() for line in desc_elem.xpath(self.TEXT))
+        return JobPosting(
+            company=self._text(company_elem).strip(),
+            title=self._text(title_h2).strip(),
+            url=url,
+            description="\n".join(line for line in lines if line),
+            posted=self._text(date_elem).strip(),
+        )
+
+
+class FallbackExtractor(HtmlExtractor):
+    """Uses `primary`, and `fallback` for the pages `primary` fails on."""
+
+    def __init__(self, primary: HtmlExtractor, fallback: HtmlExtractor):
+        self.primary = primary
+        self.fallback = fallback
+
+    def job_ids(self, html: str) -> list[str]:
+        try:
+            return self.primary.job_ids(html)
+        except Exception:
+            return self.fallback.job_ids(html)
+
+    def job_posting(self, html: str) -> JobPosting:
+        try:
+            return self.primary.job_posting(html)
+        except Exception:
+            return self.fallback.job_posting(html)
+
+
+def default_extractor() -> HtmlExtractor:
+    """lxml with BeautifulSoup fallback if lxml is installed, else BeautifulSoup."""
+    if lxml is None:
+        return Bs4Extractor()
+    return FallbackExtractor(LxmlExtractor(), Bs4Extractor())
+
+
+EXTRACTOR = default_extractor()
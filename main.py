@@ -1,45 +1,246 @@
 """Main entry point"""
 
+import cProfile
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Optional
+
 from tqdm import tqdm
 
-from ai_evaluator import cached_job_evaluation, format_bot_output
+from ai_evaluator import (
+    CASCADE,
+    TOKEN_USAGE,
+    JobEvaluation,
+    cached_job_evaluation,
+    format_bot_output,
+)
 from airtable import AirTable
 from applications_table import AppTable
+from cascade import cascade_summary
+from compaction import COMPACTION_STATS
+from csv_table import CsvTable
+from evaluation_scheduler import Budget, Ranker, ranked
 from glassdoor_json_parser import parse_glassdoor_jobs
-from job_description import JobDescription
-from scrape_linkedin import scrape_linkedin
+from http_cache import http_cache
+from job_description import JobDescription, near_duplicates
+from metrics import METRICS, METRICS_JSON, METRICS_PROMETHEUS
+from pipeline import Destination, run_pipeline
+from prefilter import prefiltered
+from profiles import DEFAULT_PROFILE, Profile, load_profiles
+from run_journal import RunJournal, run_journal
+from scrape_linkedin import Geoid, Remote
+from search_orchestrator import search_matrix
 
-THRESHOLD = 80
 VERBOSE = False
+EVAL_CONCURRENCY = 8
+# Evaluate large backlogs (e.g. Glassdoor exports) offline through the Batch API
+USE_BATCH_API = False
+# Skip obvious mismatches locally, see prefilter.py
+PREFILTER = True
+# Also evaluate the jobs for every profile in profiles/, see profiles.py
+MULTI_PROFILE = False
+# Evaluate the most promising jobs first, see evaluation_scheduler.py
+PRIORITIZE = True
+# Stop calling the API after this many tokens or seconds, None for no limit
+EVAL_TOKEN_BUDGET: Optional[int] = None
+EVAL_TIME_BUDGET: Optional[float] = None
+# Every combination of these is searched on LinkedIn
+SEARCH_QUERIES = ["Software Engineer"]
+SEARCH_REGIONS = [Geoid.BERLIN]
+SEARCH_REMOTE_MODES = [Remote.ANY]
+SEARCH_RESULTS = 100  # Per search, searches stop earlier at known postings
+# An export file, or a directory where new export files are collected
+GLASSDOOR_EXPORTS = "glassdoor_exported_data.json"
+# Also profile the run with cProfile, e.g. `python -m pstats run_profile.pstats`
+PROFILE = False
+PROFILE_FILE = "run_profile.pstats"
+
 
+def _try_evaluate(
+    job: JobDescription, journal: Optional[RunJournal]
+) -> Optional[JobEvaluation]:
+    """Evaluate a job, putting it into the retry queue if that fails."""
+    try:
+        return cached_job_evaluation(job)
+    except Exception as e:
+        print(f"⚠️  Skipping {job.job_id}: {str(e).splitlines()[0]}")
+        if journal is not None:
+            journal.record_failure(job.job_id, "evaluate", e)
+        return None
 
-def evalupate_jobs(jobs: list[JobDescription], app_table: AppTable) -> None:
-    """Evaluate jobs"""
-    for job_description in tqdm(jobs, desc="Evaluating jobs"):
 
-        evaluation = cached_job_evaluation(job_description)
-        if VERBOSE:
-            print("\n" + format_bot_output(evaluation))
+def evalupate_jobs(
+    jobs: list[JobDescription],
+    app_table: AppTable,
+    concurrency: int = EVAL_CONCURRENCY,
+    journal: Optional[RunJournal] = None,
+    prefilter: bool = True,
+) -> None:
+    """Evaluate jobs with up to `concurrency` requests in flight.
 
-        if (
-            evaluation.fit_to_requirements_percentage >= THRESHOLD
-            and not app_table.job_id_in_table(job_description.job_id)
+    The most promising jobs are evaluated first, see evaluation_scheduler.py,
+    or the newest postings without PRIORITIZE. Evaluations run in a thread
+    pool, but results are consumed here in order so table inserts stay
+    sequential and deduplicated. Jobs that fail are skipped, see _try_evaluate.
+    """
+    jobs = list({job.job_id: job for job in jobs}.values())
+    if prefilter and PREFILTER:
+        with METRICS.timer("stage_seconds", stage="prefilter"):
+            jobs = prefiltered(jobs)
+    if PRIORITIZE:
+        jobs = ranked(jobs, Ranker(DEFAULT_PROFILE, app_table.job_ids))
+    else:
+        jobs.sort(key=lambda job: job.posted_date, reverse=True)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        evaluations = executor.map(lambda job: _try_evaluate(job, journal), jobs)
+        for job_description, evaluation in tqdm(
+            zip(jobs, evaluations), total=len(jobs), desc="Evaluating jobs"
         ):
-            print(
-                f"🎯 Adding {job_description.title} at {job_description.company} to the table "
-                f"({evaluation.fit_to_requirements_percentage}% fit)"
+            if evaluation is None:
+                continue
+            with METRICS.timer("stage_seconds", stage="publish"):
+                publish(job_description, evaluation, app_table)
+
+
+def publish(
+    job_description: JobDescription,
+    evaluation: JobEvaluation,
+    app_table: AppTable,
+    profile: Profile = DEFAULT_PROFILE,
+) -> None:
+    """Add an evaluated job to the table if it is a good enough fit"""
+    if VERBOSE:
+        print("\n" + format_bot_output(evaluation))
+
+    if evaluation.fit_to_requirements_percentage >= profile.fit_threshold and not any(
+        app_table.job_id_in_table(job_id)
+        for job_id in [job_description.job_id, *near_duplicates(job_description)]
+    ):
+        print(
+            f"🎯 Adding {job_description.title} at {job_description.company} to the table "
+            f"({evaluation.fit_to_requirements_percentage}% fit)"
+            + (f" for {profile.name}" if profile.name else "")
+        )
+        app_table.add_to_table(job_description, evaluation)
+
+
+def open_table(profile: Profile) -> AppTable:
+    """The table of a profile, the Airtable of the environment by default"""
+    if profile.airtable is not None:
+        return AirTable(*profile.airtable)
+    if profile.csv_file is not None:
+        return CsvTable(profile.csv_file)
+    return AirTable()
+
+
+def open_destinations(profiles: list[Profile], tables: ExitStack) -> list[Destination]:
+    """A destination for every profile, their tables are closed with `tables`"""
+    destinations = []
+    for profile in profiles:
+        table = tables.enter_context(open_table(profile))
+        destinations.append(
+            Destination(
+                profile,
+                table,
+                functools.partial(publish, profile=profile),
+                Ranker(profile, table.job_ids) if PRIORITIZE else None,
             )
-            app_table.add_to_table(job_description, evaluation)
+        )
+    if len(destinations) > 1:
+        print(f"👥 Profiles: {', '.join(d.profile.label for d in destinations)}")
+    return destinations
 
 
-if __name__ == "__main__":
-    my_table = AirTable()
+def run(
+    destinations: list[Destination],
+    journal: RunJournal,
+    searches: bool = True,
+    glassdoor_exports: Optional[list[str]] = None,
+) -> int:
+    """Scrape, evaluate and publish once, returning the number of evaluations
+
+    Runs the configured LinkedIn searches unless `searches` is False, and
+    ingests `glassdoor_exports`, [GLASSDOOR_EXPORTS] by default.
+    """
+    glassdoor_exports = (
+        [GLASSDOOR_EXPORTS] if glassdoor_exports is None else glassdoor_exports
+    )
+    glassdoor_jobs: list[JobDescription] = []
+    if USE_BATCH_API and glassdoor_exports:
+        # Imported here, the Batch API needs openai at import time
+        from batch_evaluator import evaluate_in_batch
+
+        with METRICS.timer("run_seconds", phase="glassdoor_ingest"):
+            glassdoor_jobs = [
+                job for path in glassdoor_exports for job in parse_glassdoor_jobs(path)
+            ]
+        # The exports are marked as ingested now, only the parsed jobs are left
+        glassdoor_exports = []
+        kept = prefiltered(glassdoor_jobs) if PREFILTER else glassdoor_jobs
+        with METRICS.timer("run_seconds", phase="batch_evaluation"):
+            evaluate_in_batch(kept)
+        if len(destinations) == 1:
+            with METRICS.timer("run_seconds", phase="publish_batch"):
+                evalupate_jobs(
+                    kept, destinations[0].app_table, journal=journal, prefilter=False
+                )
+            glassdoor_jobs = []
+        # Otherwise the other profiles get them through the pipeline, where the
+        # batch is in the cache of the default one
+    budget = None
+    if EVAL_TOKEN_BUDGET is not None or EVAL_TIME_BUDGET is not None:
+        budget = Budget(EVAL_TOKEN_BUDGET, EVAL_TIME_BUDGET)
+    print("Scraping LinkedIn search and parsing Glassdoor JSON...")
+    with METRICS.timer("run_seconds", phase="pipeline"):
+        evaluated = run_pipeline(
+            (
+                search_matrix(
+                    SEARCH_QUERIES, SEARCH_REGIONS, SEARCH_REMOTE_MODES, SEARCH_RESULTS
+                )
+                if searches
+                else []
+            ),
+            glassdoor_exports,
+            destinations,
+            prefilter=PREFILTER,
+            journal=journal,
+            budget=budget,
+            glassdoor_jobs=glassdoor_jobs,
+        )
+    journal.finish()
+    if budget is not None:
+        print(budget.summary())
+    print(http_cache().summary())
+    print(TOKEN_USAGE.summary())
+    if CASCADE:
+        print(cascade_summary())
+    print(COMPACTION_STATS.summary())
+    return evaluated
+
+
+def main() -> None:
+    """Scrape, evaluate and publish the jobs of all sources"""
     # Also possible to use:
     # my_table = CsvTable()
     # TODO: Add more Google Sheet support
-    print("Scraping LinkedIn search...")
-    linkedin_jobs = scrape_linkedin("Software Engineer", num_results=100)
-    evalupate_jobs(linkedin_jobs, my_table)
-    print("Parsing Glassdoor JSON...")
-    glassdoor_jobs = parse_glassdoor_jobs("glassdoor_exported_data.json")
-    evalupate_jobs(glassdoor_jobs, my_table)
+    journal = run_journal()
+    print(journal.summary())
+    http_cache().purge()
+    profiles = load_profiles() if MULTI_PROFILE else [DEFAULT_PROFILE]
+    with ExitStack() as tables:
+        run(open_destinations(profiles, tables), journal)
+
+
+if __name__ == "__main__":
+    profiler = cProfile.Profile() if PROFILE else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        main()
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(PROFILE_FILE)
+        METRICS.write()
+        print(f"📊 Run metrics written to {METRICS_JSON} and {METRICS_PROMETHEUS}")
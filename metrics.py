@@ -0,0 +1,204 @@
+"""
+Run-level instrumentation: counters and latency histograms.
+
+Everything is recorded in the process wide METRICS registry: HTTP latency per
+endpoint and 429 responses, cache hits and misses, token usage and cost, and
+time spent per stage. At the end of a run the registry is written as a JSON
+summary and in the Prometheus text format. Hooks registered with `add_hook`
+see every observation as it happens, e.g. to feed a profiler or a live view.
+"""
+
+import bisect
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, Optional
+from urllib.parse import urlparse
+
+# Upper bounds in seconds, from a cache lookup to a slow completion
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+METRICS_JSON = "run_metrics.json"
+METRICS_PROMETHEUS = "run_metrics.prom"
+
+Labels = tuple[tuple[str, str], ...]
+Hook = Callable[[str, dict[str, str], float], None]
+
+NUMERIC_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+@dataclass
+class Histogram:
+    """Counts of observations per bucket, with their count and sum."""
+
+    bucket_counts: list[int] = field(default_factory=lambda: [0] * (len(BUCKETS) + 1))
+    count: int = 0
+    total: float = 0.0
+
+    def observe(self, value: float) -> None:
+        """Add an observation."""
+        self.bucket_counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile.
+
+        None if it is above the last bucket, which has no bound and JSON has no
+        Infinity.
+        """
+        rank = q * self.count
+        seen = 0
+        for bound, bucket_count in zip(BUCKETS, self.bucket_counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return None
+
+
+class Metrics:
+    """Thread safe registry of labelled counters and histograms."""
+
+    def __init__(self):
+        self.counters: dict[tuple[str, Labels], float] = {}
+        self.histograms: dict[tuple[str, Labels], Histogram] = {}
+        self.started = time.time()
+        self._hooks: list[Hook] = []
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        """Drop all counters and histograms, e.g. before the next run of a daemon."""
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    def add_hook(self, hook: Hook) -> None:
+        """Call `hook(name, labels, value)` on every increment and observation."""
+        self._hooks.append(hook)
+
+    def _notify(self, name: str, labels: dict[str, str], value: float) -> None:
+        for hook in self._hooks:
+            hook(name, labels, value)
+
+    def increment(self, name: str, amount: float = 1, **labels: str) -> None:
+        """Add `amount` to a counter."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+        self._notify(name, labels, amount)
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Add an observation, in seconds, to a histogram."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.histograms.setdefault(key, Histogram()).observe(value)
+        self._notify(name, labels, value)
+
+    @contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        """Observe how long the enclosed block takes."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def _snapshot(self):
+        """Sorted copies of the counters and histograms."""
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(
+                (key, Histogram(list(h.bucket_counts), h.count, h.total))
+                for key, h in self.histograms.items()
+            )
+        return counters, histograms
+
+    def summary(self) -> dict:
+        """JSON serializable summary, with hit rates of the caches."""
+        counters, histograms = self._snapshot()
+        summary: dict = {
+            "seconds": time.time() - self.started,
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in counters
+            ],
+            "histograms": [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": h.count,
+                    "sum": h.total,
+                    "mean": h.total / h.count if h.count else 0.0,
+                    "p50": h.quantile(0.5),
+                    "p95": h.quantile(0.95),
+                    "p99": h.quantile(0.99),
+                }
+                for (name, labels), h in histograms
+            ],
+            "cache_hit_rates": {},
+        }
+        lookups: dict[str, dict[str, float]] = {}
+        for (name, labels), value in counters:
+            if name == "cache_lookups_total":
+                label_dict = dict(labels)
+                cache = lookups.setdefault(label_dict["cache"], {})
+                cache[label_dict["result"]] = value
+        for cache, results in sorted(lookups.items()):
+            total = sum(results.values())
+            misses = results.get("miss", 0)
+            summary["cache_hit_rates"][cache] = (total - misses) / total
+        return summary
+
+    def prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+
+        def labels_text(labels: Labels, extra: tuple = ()) -> str:
+            pairs = [*labels, *extra]
+            if not pairs:
+                return ""
+            escaped = (
+                (k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs
+            )
+            return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+        lines = []
+        counters, histograms = self._snapshot()
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{labels_text(labels)} {value:g}")
+        for (name, labels), h in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, bucket_count in zip((*BUCKETS, "+Inf"), h.bucket_counts):
+                cumulative += bucket_count
+                le = labels_text(labels, (("le", str(bound)),))
+                lines.append(f"{name}_bucket{le} {cumulative}")
+            lines.append(f"{name}_sum{labels_text(labels)} {h.total:g}")
+            lines.append(f"{name}_count{labels_text(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(
+        self, json_path: str = METRICS_JSON, prometheus_path: str = METRICS_PROMETHEUS
+    ) -> None:
+        """Write the JSON summary and the Prometheus text file."""
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2)
+        with open(prometheus_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+
+
+def endpoint(url: str) -> str:
+    """Host and path of a URL without query and ids, e.g. to label HTTP metrics."""
+    parsed = urlparse(url)
+    return parsed.netloc + NUMERIC_SEGMENT.sub("/{id}", parsed.path)
+
+
+METRICS = Metrics()
@@ -0,0 +1,399 @@
+"""
+Streaming scrape -> evaluate -> publish pipeline.
+
+Each stage runs in its own threads connected by bounded queues, so search
+pages, job description fetches, evaluations and table writes overlap and a
+slow stage applies backpressure to the ones before it. LinkedIn searches and
+Glassdoor exports feed the same stream of job descriptions.
+
+With a run journal, the stage every job went through is recorded, jobs that
+fail a stage go to the retry queue, and the retries and the unfinished jobs of
+a resumed run are fed in before the searches, see run_journal.py.
+
+One crawl can serve several profiles, each with its own table, see
+profiles.py. Every job is pre-filtered and evaluated once per profile, and
+the evaluators take jobs from the profiles in turn, so EVAL_WORKERS bounds the
+API calls in flight for all profiles together. Within a profile, the waiting
+jobs with the highest priority are evaluated first, and a budget can stop the
+API calls, see evaluation_scheduler.py.
+"""
+
+import heapq
+import itertools
+import queue
+import threading
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable, Iterable, Iterator, Optional
+
+from tqdm import tqdm
+
+from ai_evaluator import (
+    JobEvaluation,
+    cached_job_evaluation,
+    load_job_evaluation,
+    unevaluated_job_ids,
+)
+from applications_table import AppTable
+from evaluation_scheduler import Budget, Ranker
+from glassdoor_json_parser import ingest_glassdoor_exports
+from job_description import JobDescription
+from metrics import METRICS
+from prefilter import prefilter_jobs
+from profiles import Profile
+from run_journal import RunJournal
+from scrape_linkedin import Search, get_linkedin_job_description
+from search_orchestrator import crawl_searches
+
+QUEUE_SIZE = 64
+EVAL_QUEUE_SIZE = 512  # Per profile, the jobs among which the best go first
+FETCH_WORKERS = 8
+EVAL_WORKERS = 8
+PREFILTER_BATCH_SIZE = 64
+
+DONE = object()  # Sentinel closing a queue
+
+Publish = Callable[[JobDescription, JobEvaluation, AppTable], None]
+
+
+@dataclass(frozen=True)
+class Destination:
+    """A profile and the table its good matches are published to."""
+
+    profile: Profile
+    app_table: AppTable
+    publish: Publish
+    ranker: Optional[Ranker] = None  # Evaluation order, None for arrival order
+
+
+class FairQueue:
+    """Queue handing out the items of different keys in turn.
+
+    Within a key, the item with the highest `priority` goes first, or the
+    oldest one without priorities. Every key holds up to `maxsize` items,
+    `put` blocks while the key of the item is full. Putting DONE closes the
+    queue, `get` returns DONE once it is closed and empty.
+    """
+
+    def __init__(
+        self,
+        key: Callable[[Any], Hashable],
+        maxsize: int = QUEUE_SIZE,
+        priority: Optional[Callable[[Any], float]] = None,
+    ):
+        self.key = key
+        self.maxsize = maxsize
+        self.priority = priority
+        self._items: dict[Hashable, list] = {}  # Heaps of (-priority, seq, item)
+        self._turns: deque = deque()  # Keys with items, next one first
+        self._seq = itertools.count()
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def put(self, item: Any) -> None:
+        """Add an item, or close the queue with DONE."""
+        with self._condition:
+            if item is DONE:
+                self._closed = True
+                self._condition.notify_all()
+                return
+            key = self.key(item)
+            items = self._items.setdefault(key, [])
+            while len(items) >= self.maxsize:
+                self._condition.wait()
+            if not items:
+                self._turns.append(key)
+            priority = self.priority(item) if self.priority is not None else 0.0
+            heapq.heappush(items, (-priority, next(self._seq), item))
+            self._condition.notify_all()
+
+    def get(self) -> Any:
+        """Next item of the key whose turn it is."""
+        with self._condition:
+            while not self._turns and not self._closed:
+                self._condition.wait()
+            if not self._turns:
+                return DONE
+            key = self._turns.popleft()
+            items = self._items[key]
+            _, _, item = heapq.heappop(items)
+            if items:
+                self._turns.append(key)
+            self._condition.notify_all()
+            return item
+
+
+def _source(items: Callable[[], Iterable], outbox: queue.Queue) -> threading.Thread:
+    """Thread putting everything `items()` yields into `outbox`."""
+
+    def run() -> None:
+        try:
+            for item in items():
+                outbox.put(item)
+        except Exception as e:
+            print(f"⚠️  Source failed: {e}")
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def _stage(
+    name: str,
+    func: Callable,
+    inbox: queue.Queue,
+    outbox: queue.Queue,
+    workers: int,
+    job_id: Callable[[Any], str],
+    journal: Optional[RunJournal],
+    record_done: bool = True,
+) -> list[threading.Thread]:
+    """Worker threads putting `func(item)` of every inbox item into `outbox`.
+
+    Items that fail are skipped, and put into the retry queue of the journal.
+    With `record_done`, items that went through are recorded in the journal.
+    """
+
+    def run() -> None:
+        while (item := inbox.get()) is not DONE:
+            try:
+                with METRICS.timer("stage_seconds", stage=name):
+                    result = func(item)
+                if journal is not None and record_done:
+                    journal.record([job_id(item)], name)
+                outbox.put(result)
+            except Exception as e:
+                print(f"⚠️  Skipping {job_id(item)}: {str(e).splitlines()[0]}")
+                if journal is not None:
+                    journal.record_failure(job_id(item), name, e)
+        inbox.put(DONE)  # Let the other workers of this stage see it too
+
+    threads = [threading.Thread(target=run, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def _close_when_done(threads: list[threading.Thread], outbox: queue.Queue) -> None:
+    """Put DONE into `outbox` once all the threads feeding it have finished."""
+
+    def run() -> None:
+        for thread in threads:
+            thread.join()
+        outbox.put(DONE)
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def _job_ids(
+    searches: list[Search], journal: Optional[RunJournal], profiles: list[Profile]
+) -> Iterator[str]:
+    """Pending ids of the journal, then the new or not yet evaluated found ones."""
+    pending = journal.pending() if journal is not None else []
+    yield from pending
+    yield from crawl_searches(
+        searches,
+        journal=journal,
+        seen=pending,
+        stale=lambda job_ids: unevaluated_job_ids(job_ids, profiles),
+    )
+
+
+def _glassdoor_jobs(
+    paths: list[str], parsed: Iterable[JobDescription], journal: Optional[RunJournal]
+) -> Iterator[JobDescription]:
+    jobs = itertools.chain(
+        parsed, itertools.chain.from_iterable(map(ingest_glassdoor_exports, paths))
+    )
+    for job in jobs:
+        if journal is not None:
+            journal.record([job.job_id], "fetch")
+        yield job
+
+
+def _fan_out(
+    inbox: queue.Queue,
+    outbox: FairQueue,
+    destinations: list[Destination],
+    prefilter: bool,
+    remaining: Counter,
+    lock: threading.Lock,
+    journal: Optional[RunJournal],
+) -> threading.Thread:
+    """Thread de-duplicating, pre-filtering and ranking the jobs in micro-batches.
+
+    Every job kept for a profile is put into `outbox` as (destination, job,
+    priority), and counted in `remaining` under the job id, holding `lock`.
+    """
+
+    def run() -> None:
+        seen: set[str] = set()
+        done = False
+        while not done:
+            batch = [inbox.get()]
+            while len(batch) < PREFILTER_BATCH_SIZE and batch[-1] is not DONE:
+                try:
+                    batch.append(inbox.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is DONE:
+                batch.pop()
+                done = True
+            jobs = [job for job in batch if job.job_id not in seen]
+            seen.update(job.job_id for job in jobs)
+            if not jobs:
+                continue
+            kept: dict[str, list[tuple[Destination, float]]] = {
+                job.job_id: [] for job in jobs
+            }
+            for destination in destinations:
+                if prefilter:
+                    with METRICS.timer("stage_seconds", stage="prefilter"):
+                        result = prefilter_jobs(jobs, profile=destination.profile)
+                    kept_jobs = result.kept
+                else:
+                    kept_jobs = jobs
+                if destination.ranker is not None:
+                    with METRICS.timer("stage_seconds", stage="rank"):
+                        priorities = destination.ranker.priorities(kept_jobs)
+                else:
+                    priorities = [0.0] * len(kept_jobs)
+                for job, priority in zip(kept_jobs, priorities):
+                    kept[job.job_id].append((destination, float(priority)))
+            with lock:
+                remaining.update({job_id: len(d) for job_id, d in kept.items() if d})
+            if journal is not None:
+                journal.record_skipped(
+                    (job_id for job_id, d in kept.items() if not d), "prefilter"
+                )
+                journal.record((job_id for job_id, d in kept.items() if d), "prefilter")
+            for job in jobs:
+                for destination, priority in kept[job.job_id]:
+                    outbox.put((destination, job, priority))
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def _evaluate(
+    item: tuple[Destination, JobDescription, float], budget: Optional[Budget]
+) -> tuple[Destination, JobDescription, Optional[JobEvaluation]]:
+    """Evaluation of a job, None if the budget is spent and it isn't cached."""
+    destination, job, priority = item
+    if budget is not None and budget.spent():
+        evaluation = load_job_evaluation(job.job_id, profile=destination.profile)
+    else:
+        evaluation = cached_job_evaluation(job, destination.profile)
+    if budget is not None:
+        budget.record(priority, evaluated=evaluation is not None)
+    return destination, job, evaluation
+
+
+def run_pipeline(
+    searches: list[Search],
+    glassdoor_exports: list[str],
+    destinations: list[Destination],
+    prefilter: bool = True,
+    journal: Optional[RunJournal] = None,
+    budget: Optional[Budget] = None,
+    glassdoor_jobs: Iterable[JobDescription] = (),
+) -> int:
+    """Stream jobs from all sources through evaluation into the tables.
+
+    `glassdoor_exports` are export files or directories of them, see
+    glassdoor_json_parser.ingest_glassdoor_exports. `glassdoor_jobs` were
+    ingested from exports already, e.g. for the Batch API.
+
+    The `publish` of a destination is called on this thread for every
+    evaluation of its profile, in the order they finish. The tables are
+    flushed whenever no evaluation is waiting, so good matches show up while
+    the run is still going. With a `journal`, jobs are checkpointed through
+    every stage, published once every profile that kept them has flushed its
+    table. Jobs left without an evaluation by the `budget` are deferred to the
+    next run. Returns the number of evaluations.
+    """
+    ids: queue.Queue = queue.Queue(QUEUE_SIZE)
+    jobs: queue.Queue = queue.Queue(QUEUE_SIZE)
+    to_evaluate = FairQueue(
+        key=lambda item: item[0].profile,
+        maxsize=EVAL_QUEUE_SIZE,
+        priority=lambda item: item[2],
+    )
+    results: queue.Queue = queue.Queue(QUEUE_SIZE)
+    remaining: Counter = Counter()  # Job id -> profiles yet to publish it
+    lock = threading.Lock()
+
+    search_thread = _source(
+        lambda: _job_ids(searches, journal, [d.profile for d in destinations]), ids
+    )
+    _close_when_done([search_thread], ids)
+    fetchers = _stage(
+        "fetch",
+        get_linkedin_job_description,
+        ids,
+        jobs,
+        FETCH_WORKERS,
+        job_id=str,
+        journal=journal,
+    )
+    glassdoor_thread = _source(
+        lambda: _glassdoor_jobs(glassdoor_exports, glassdoor_jobs, journal), jobs
+    )
+    _close_when_done([*fetchers, glassdoor_thread], jobs)
+    fan_out = _fan_out(
+        jobs, to_evaluate, destinations, prefilter, remaining, lock, journal
+    )
+    _close_when_done([fan_out], to_evaluate)
+    evaluators = _stage(
+        "evaluate",
+        lambda item: _evaluate(item, budget),
+        to_evaluate,
+        results,
+        EVAL_WORKERS,
+        job_id=lambda item: item[1].job_id,
+        journal=journal,
+        # A job is evaluated once per profile, recording one of them would
+        # hide the failure of another from the retry queue
+        record_done=False,
+    )
+    _close_when_done(evaluators, results)
+
+    evaluated = 0
+    unflushed: list[str] = []  # Published, recorded once the tables are flushed
+
+    def flush() -> None:
+        with METRICS.timer("stage_seconds", stage="flush"):
+            for destination in destinations:
+                destination.app_table.flush()
+        if journal is not None and unflushed:
+            journal.record(unflushed, "publish")
+        unflushed.clear()
+
+    with tqdm(desc="Evaluated jobs") as progress:
+        while True:
+            try:
+                result = results.get_nowait()
+            except queue.Empty:
+                flush()
+                result = results.get()
+            if result is DONE:
+                break
+            destination, job, evaluation = result
+            if evaluation is None:
+                if journal is not None:
+                    journal.record_deferred([job.job_id], "evaluate")
+                continue
+            with METRICS.timer("stage_seconds", stage="publish"):
+                destination.publish(job, evaluation, destination.app_table)
+            with lock:
+                remaining[job.job_id] -= 1
+                published = remaining[job.job_id] == 0
+                if published:
+                    del remaining[job.job_id]
+            if published:
+                unflushed.append(job.job_id)
+            evaluated += 1
+            progress.update()
+    flush()
+    return evaluated
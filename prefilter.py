@@ -0,0 +1,288 @@
+"""
+Cheap local pre-filter that rejects obvious mismatches before any LLM call.
+
+Jobs are rejected by language and keyword rules, or when the TF-IDF cosine
+similarity of their description to the CV and skills is below MIN_SIMILARITY.
+Rejected jobs get a skip reason recorded in the job store instead of an
+evaluation, per profile and with the fingerprint of its CV and prompt, so
+searches don't hand them back until that changes.
+
+The IDF comes from a fixed corpus of stored job descriptions, persisted to
+IDF_FILE, so a job scores the same whichever jobs share its batch. Delete the
+file to rebuild it from the current store.
+"""
+
+import functools
+import itertools
+import json
+import os
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from ai_evaluator import prompt_fingerprint
+from job_description import JobDescription, cached_job_descriptions
+from job_store import job_store
+from profiles import DEFAULT_PROFILE, Profile
+
+MIN_SIMILARITY = 0.05
+IDF_FILE = "prefilter_idf.json"
+IDF_MIN_DOCUMENTS = 200  # Terms are weighted equally until the store has as many
+IDF_MAX_DOCUMENTS = 5000  # Newest postings first
+
+# German requirements are a deal breaker in the prompt, see ai_evaluator.PROMPT.
+# The requirement must attach to the language, "strong Python skills" in a
+# sentence about German customers is not one.
+GERMAN = r"(?:german|deutsch\w*)"
+GERMAN_REQUIRED = re.compile(
+    # Fluent German, excellent written and spoken German, sehr gute Deutschkenntnisse
+    r"\b(?:fluent|fluency|native|proficien\w*|excellent|very good|strong|business"
+    r"|fließend\w*|sehr gut\w*|verhandlungssicher\w*)"
+    r"(?:\s+(?:in|of|and|or|written|spoken|verbal|command|knowledge|skills))*"
+    rf"\s+{GERMAN}\b"
+    # German (C1), German: native
+    rf"|\b{GERMAN}\s*[(:,–-]?\s*(?:level\s*)?(?:c1|c2|native|fluent|fließend)\b"
+    # German is required, Deutschkenntnisse sind zwingend erforderlich
+    rf"|\b{GERMAN}(?:\s+(?:language|skills|proficiency|knowledge|sprachkenntnisse))*"
+    r"(?:\s+(?:is|are|ist|sind))?\s+(?:absolutely\s+|strictly\s+)?"
+    r"(?:required|mandatory|a must|essential|zwingend\w*|erforderlich)\b"
+    # You must speak German
+    r"|\b(?:must|need to|required to|have to)\s+(?:be able to\s+)?"
+    rf"(?:speak|know|read|write|understand)\s+{GERMAN}\b",
+    re.IGNORECASE,
+)
+# Deutsche Bank, Deutsche Telekom, but not Deutsche Sprachkenntnisse or Kenntnisse
+GERMAN_COMPANY = re.compile(r"\bDeutsche[nr]?\s+(?!Sprach|Kenntnis)[A-ZÄÖÜ]\w*")
+GERMAN_OPTIONAL = re.compile(
+    r"\b(plus|nice[- ]to[- ]have|advantage\w*|bonus|preferred|beneficial|ideally"
+    r"|not required|optional|wünschenswert|von vorteil)\b",
+    re.IGNORECASE,
+)
+GERMAN_STOPWORDS = frozenset(
+    "und der die das wir mit für sind ist eine ein du sie bei auf zu von dich"
+    " deine unsere ihre oder auch".split()
+)
+GERMAN_STOPWORD_SHARE = 0.08
+EXCLUDED_TITLE = re.compile(
+    r"\b(intern|internship|working student|werkstudent\w*|praktik\w*|ausbildung)\b",
+    re.IGNORECASE,
+)
+
+TOKEN = re.compile(r"[a-zäöüß][a-z0-9äöüß+#]*")
+SENTENCE = re.compile(r"[.!?\n]+")
+
+
+@dataclass
+class PrefilterResult:
+    """Outcome of the pre-filter for a batch of jobs."""
+
+    kept: list[JobDescription]
+    skipped: dict[str, str]  # job_id -> reason
+    seconds: float
+
+    def summary(self) -> str:
+        """Human readable summary."""
+        total = len(self.kept) + len(self.skipped)
+        return (
+            f"⏭️  Pre-filter skipped {len(self.skipped)} of {total} jobs "
+            f"({len(self.skipped)} API calls saved) in {self.seconds * 1000:.0f}ms"
+        )
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower case word tokens."""
+    return TOKEN.findall(text.lower())
+
+
+def posting_text(job: JobDescription) -> str:
+    """Lower case title and description of a posting, tokenized once per job."""
+    return f"{job.title} {job.description}".lower()
+
+
+def requires_german(description: str, lower: Optional[str] = None) -> bool:
+    """Whether a sentence asks for German without marking it as optional.
+
+    `lower` is the lower case text of the posting, if it was tokenized already.
+    Only the sentences that mention German go through the requirement patterns.
+    """
+    lower = description.lower() if lower is None else lower
+    if "german" not in lower and "deutsch" not in lower:
+        return False
+    for sentence in SENTENCE.split(description):
+        lower_sentence = sentence.lower()
+        if "german" not in lower_sentence and "deutsch" not in lower_sentence:
+            continue
+        sentence = GERMAN_COMPANY.sub("", sentence)
+        if GERMAN_REQUIRED.search(sentence) and not GERMAN_OPTIONAL.search(sentence):
+            return True
+    return False
+
+
+def written_in_german(counts: Counter[str]) -> bool:
+    """Whether the share of German stopwords says the posting is in German."""
+    total = counts.total()
+    if not total:
+        return False
+    german = sum(counts[word] for word in GERMAN_STOPWORDS)
+    return german / total >= GERMAN_STOPWORD_SHARE
+
+
+def rule_reason(job: JobDescription, text: str, counts: Counter[str]) -> str | None:
+    """Reason to skip a job by the language and keyword rules, if any.
+
+    `text` is its posting_text and `counts` the counts of its tokens.
+    """
+    if EXCLUDED_TITLE.search(job.title):
+        return "Excluded title"
+    if written_in_german(counts):
+        return "Posting is in German"
+    if requires_german(job.description, text):
+        return "Requires German"
+    return None
+
+
+@functools.cache
+def profile_tokens(profile: Profile = DEFAULT_PROFILE) -> list[str]:
+    """Tokens of the CV and the skills self-assessment."""
+    with open(profile.path("cv.txt"), "r", encoding="utf-8") as f:
+        cv = f.read()
+    with open(profile.path("skills.txt"), "r", encoding="utf-8") as f:
+        skills = f.read()
+    return tokenize(cv + "\n" + skills)
+
+
+def document_frequencies() -> tuple[int, dict[str, int]]:
+    """Number of documents of the IDF corpus and how many contain each term.
+
+    Read from IDF_FILE, or built from the stored job descriptions and saved
+    there once the store has IDF_MIN_DOCUMENTS. (0, {}) until then, which is
+    not cached so a long-lived process picks the corpus up once it is there.
+    """
+    if (
+        not os.path.exists(IDF_FILE)
+        and job_store().count_descriptions() < IDF_MIN_DOCUMENTS
+    ):
+        return 0, {}
+    return _corpus_frequencies()
+
+
+@functools.cache
+def _corpus_frequencies() -> tuple[int, dict[str, int]]:
+    if os.path.exists(IDF_FILE):
+        with open(IDF_FILE, "r", encoding="utf-8") as f:
+            corpus = json.load(f)
+        return corpus["documents"], corpus["frequencies"]
+    jobs = list(itertools.islice(cached_job_descriptions(), IDF_MAX_DOCUMENTS))
+    frequencies: Counter[str] = Counter()
+    for job in jobs:
+        frequencies.update(set(tokenize(f"{job.title} {job.description}")))
+    with open(IDF_FILE, "w", encoding="utf-8") as f:
+        json.dump({"documents": len(jobs), "frequencies": frequencies}, f)
+    return len(jobs), dict(frequencies)
+
+
+def clear_caches() -> None:
+    """Read the profiles and the IDF corpus again, e.g. after they changed."""
+    profile_tokens.cache_clear()
+    _corpus_frequencies.cache_clear()
+
+
+def similarity_to_profile(
+    documents: list[Counter[str]], profile: Profile = DEFAULT_PROFILE
+) -> np.ndarray:
+    """TF-IDF cosine similarity of each document's term counts to the profile."""
+    return similarity_to(documents, Counter(profile_tokens(profile)))
+
+
+def similarity_to(documents: list[Counter[str]], reference: Counter[str]) -> np.ndarray:
+    """TF-IDF cosine similarity of each document's term counts to a reference.
+
+    The IDF is the one of the corpus of document_frequencies plus the
+    reference, independent of the other documents. The term matrix is built
+    as CSR arrays (data, indices, indptr) so the weighting, norms and dot
+    products are vectorized over all documents.
+    """
+    counts = [reference, *documents]
+    vocabulary = {term: i for i, term in enumerate(set().union(*counts))}
+    data: list[int] = []
+    indices: list[int] = []
+    indptr = [0]
+    for row in counts:
+        indices.extend(map(vocabulary.__getitem__, row))
+        data.extend(row.values())
+        indptr.append(len(indices))
+
+    tf = 1 + np.log(np.asarray(data, dtype=np.float64))
+    term_index = np.asarray(indices, dtype=np.int64)
+    row_lengths = np.diff(np.asarray(indptr))
+    num_rows = len(row_lengths)
+    corpus_size, frequencies = document_frequencies()
+    if corpus_size:
+        document_frequency = np.fromiter(
+            (frequencies.get(term, 0) + (term in reference) for term in vocabulary),
+            np.float64,
+            len(vocabulary),
+        )
+        idf = np.log((2 + corpus_size) / (1 + document_frequency)) + 1
+    else:
+        idf = np.ones(len(vocabulary))
+    weights = tf * idf[term_index]
+
+    rows = np.repeat(np.arange(num_rows), row_lengths)
+    norms = np.sqrt(np.bincount(rows, weights=weights**2, minlength=num_rows))
+    reference_weights = np.zeros(len(vocabulary))
+    reference_weights[term_index[: indptr[1]]] = weights[: indptr[1]]
+    dots = np.bincount(
+        rows, weights=weights * reference_weights[term_index], minlength=num_rows
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        similarity = dots / (norms * norms[0])
+    return np.nan_to_num(similarity[1:])
+
+
+def prefilter_jobs(
+    jobs: list[JobDescription],
+    min_similarity: float = MIN_SIMILARITY,
+    profile: Profile = DEFAULT_PROFILE,
+) -> PrefilterResult:
+    """Split jobs into the ones worth evaluating for a profile and the ones to skip."""
+    start = time.perf_counter()
+    texts = [posting_text(job) for job in jobs]
+    documents = [Counter(TOKEN.findall(text)) for text in texts]
+    similarity = similarity_to_profile(documents, profile)
+    kept = []
+    skipped = {}
+    for job, text, counts, score in zip(jobs, texts, documents, similarity):
+        reason = rule_reason(job, text, counts)
+        if reason is None and score < min_similarity:
+            reason = f"Similarity {score:.3f} to CV below {min_similarity}"
+        if reason is None:
+            kept.append(job)
+        else:
+            skipped[job.job_id] = reason
+    result = PrefilterResult(kept, skipped, time.perf_counter() - start)
+    fingerprint = prompt_fingerprint(profile)
+    job_store().put_skips(
+        (profile.name, job_id, fingerprint, reason)
+        for job_id, reason in skipped.items()
+    )
+    return result
+
+
+def prefiltered(jobs: list[JobDescription]) -> list[JobDescription]:
+    """Jobs that passed the pre-filter, printing how many calls were saved."""
+    result = prefilter_jobs(jobs)
+    print(result.summary())
+    return result.kept
+
+
+if __name__ == "__main__":
+    # Run over all cached job descriptions, e.g. to tune MIN_SIMILARITY
+    all_jobs = list(cached_job_descriptions())
+    all_result = prefilter_jobs(all_jobs)
+    print(all_result.summary())
+    print(Counter(reason.split(" ")[0] for reason in all_result.skipped.values()))
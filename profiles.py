@@ -0,0 +1,117 @@
+"""
+Profiles of the people the jobs are evaluated for.
+
+The default profile is the cv.txt and skills.txt next to the scripts. Every
+directory in PROFILES_DIR with its own cv.txt and skills.txt is another
+profile, named after the directory. All profiles share one crawl and one job
+description cache, evaluations are cached per profile.
+
+A profile directory may also contain:
+- prompt.txt, a prompt template replacing ai_evaluator.PROMPT, with {cv} and
+  {skills} placeholders
+- profile.json, e.g. {"threshold": 75, "airtable": {"app_id": "...",
+  "table_id": "..."}} or {"csv": "jobs.csv"}. Without a table, good matches
+  go to applications.csv in the profile directory.
+
+Run this script to list the profiles.
+"""
+
+import json
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+PROFILES_DIR = "profiles"
+THRESHOLD = 80  # Fit from which jobs go into the table, unless a profile sets one
+PROFILE_FILES = ("cv.txt", "skills.txt")
+CONFIG_FILE = "profile.json"
+PROMPT_FILE = "prompt.txt"
+DEFAULT_CSV = "applications.csv"
+
+
+@dataclass(frozen=True)
+class Profile:
+    """A CV and skills self-assessment, with where its matches go."""
+
+    name: str  # "" for the default profile
+    directory: str = ""
+    threshold: Optional[int] = None  # None for THRESHOLD
+    airtable: Optional[tuple[str, str]] = None  # App id and table id
+    csv_file: Optional[str] = None
+
+    def path(self, filename: str) -> str:
+        """Path of a file of this profile."""
+        return os.path.join(self.directory, filename)
+
+    def read(self, filename: str) -> Optional[str]:
+        """Content of a file of this profile, None if it doesn't exist."""
+        try:
+            with open(self.path(filename), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    @property
+    def fit_threshold(self) -> int:
+        """Fit from which a job goes into the table of this profile."""
+        return THRESHOLD if self.threshold is None else self.threshold
+
+    @property
+    def label(self) -> str:
+        """Name to show, "default" for the default profile."""
+        return self.name or "default"
+
+
+DEFAULT_PROFILE = Profile("")
+
+
+def load_profile(name: str) -> Profile:
+    """The profile in PROFILES_DIR/`name`, the default profile for ""."""
+    if not name:
+        return DEFAULT_PROFILE
+    directory = os.path.join(PROFILES_DIR, name)
+    for filename in PROFILE_FILES:
+        if not os.path.isfile(os.path.join(directory, filename)):
+            raise FileNotFoundError(f"Profile {name} has no {filename}")
+    config = {}
+    config_path = os.path.join(directory, CONFIG_FILE)
+    if os.path.isfile(config_path):
+        with open(config_path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    airtable = config.get("airtable")
+    csv_file = config.get("csv")
+    if airtable is None and csv_file is None:
+        csv_file = DEFAULT_CSV
+    return Profile(
+        name,
+        directory,
+        threshold=config.get("threshold"),
+        airtable=(airtable["app_id"], airtable["table_id"]) if airtable else None,
+        csv_file=os.path.join(directory, csv_file) if csv_file else None,
+    )
+
+
+def load_profiles(include_default: bool = True) -> list[Profile]:
+    """All profiles, the default one first."""
+    profiles = [DEFAULT_PROFILE] if include_default else []
+    if os.path.isdir(PROFILES_DIR):
+        for name in sorted(os.listdir(PROFILES_DIR)):
+            directory = os.path.join(PROFILES_DIR, name)
+            if all(os.path.isfile(os.path.join(directory, f)) for f in PROFILE_FILES):
+                profiles.append(load_profile(name))
+    return profiles
+
+
+if __name__ == "__main__":
+    for profile in load_profiles():
+        table = (
+            f"Airtable {profile.airtable[0]}/{profile.airtable[1]}"
+            if profile.airtable
+            else profile.csv_file or "Airtable from the environment"
+        )
+        custom_prompt = os.path.isfile(profile.path(PROMPT_FILE))
+        threshold = "default" if profile.threshold is None else profile.threshold
+        print(
+            f"{profile.label}: {table}, threshold {threshold}"
+            f"{', custom prompt' if custom_prompt else ''}"
+        )
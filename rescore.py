@@ -0,0 +1,191 @@
+"""
+Local re-scoring of the cached evaluations after skills.txt changes.
+
+Every evaluation stores its requirements with the required level, my level
+and how strongly it is required. The skill levels of skills.txt are mapped
+onto the requirements of all evaluations at once, see evaluation_index.py,
+and the coverage of each job's requirements is computed with and without
+them. The difference moves the fit the model gave, so the estimate stays
+anchored to the model's judgement of everything else.
+
+Only jobs whose estimated fit crosses the threshold need a real
+re-evaluation. With --apply, the other evaluations are updated to the
+estimate and marked as current, so a changed skills.txt doesn't re-evaluate
+every cached job. Only evaluations that are stale because of skills.txt alone
+are updated: the ones made with another CV, prompt or model, or by the
+screening model of the cascade, are left to a real re-evaluation. The crossing
+ones are re-evaluated by the next run, or right away with --evaluate.
+
+Run this script after editing skills.txt, e.g. --threshold 80 --top 20.
+"""
+
+import argparse
+import json
+import re
+import time
+from typing import Optional
+
+import numpy as np
+from tqdm import tqdm
+
+from ai_evaluator import cached_job_evaluation, context_fingerprint, prompt_fingerprint
+from evaluation_index import EvaluationIndex, evaluation_index
+from job_description import cached_job_description
+from job_store import job_store
+from prefilter import tokenize
+from profiles import DEFAULT_PROFILE, THRESHOLD, Profile, load_profile
+
+SKILL_LINE = re.compile(r"^(.+):\s*([1-5])\s*$")
+
+
+def parse_skills(text: str) -> dict[str, int]:
+    """Level of every skill in a skills.txt, e.g. "pandas, numpy: 2"."""
+    levels = {}
+    for line in text.splitlines():
+        match = SKILL_LINE.match(line.strip())
+        if match is None:
+            continue
+        for name in match.group(1).split(","):
+            if name.strip():
+                levels[name.strip().lower()] = int(match.group(2))
+    return levels
+
+
+def _matching_level(skill: str, levels: dict[str, int]) -> int:
+    """Level of a requirement's skill, 0 if skills.txt doesn't mention it.
+
+    A skill matches a skills.txt entry that is the same or whose words are in
+    it, e.g. "python" matches "Python programming". The highest level wins.
+    """
+    if skill in levels:
+        return levels[skill]
+    words = f" {' '.join(tokenize(skill))} "
+    return max(
+        (
+            level
+            for name, level in levels.items()
+            if len(name) > 1 and f" {' '.join(tokenize(name))} " in words
+        ),
+        default=0,
+    )
+
+
+def skill_levels(index: EvaluationIndex, levels: dict[str, int]) -> np.ndarray:
+    """Level of every skill of the index, 0 where skills.txt doesn't say."""
+    return np.array(
+        [_matching_level(skill, levels) for skill in index.skill_values], np.int8
+    )
+
+
+def coverage(index: EvaluationIndex, mine: np.ndarray) -> np.ndarray:
+    """Share of every job's requirements I meet, weighted by their strength."""
+    required = np.maximum(index.requirement_required, 1).astype(np.float64)
+    met = np.minimum(mine, required) / required
+    strength = index.requirement_strength.astype(np.float64)
+    weight = np.bincount(index.requirement_job, strength, minlength=len(index))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        share = (
+            np.bincount(index.requirement_job, strength * met, minlength=len(index))
+            / weight
+        )
+    return np.nan_to_num(share, nan=1.0)
+
+
+def estimated_fits(index: EvaluationIndex, levels: np.ndarray) -> np.ndarray:
+    """Fit of every job with my levels replaced by `levels` where they are known."""
+    known = levels[index.requirement_skill]
+    mine = np.where(known > 0, known, index.requirement_mine)
+    change = coverage(index, mine) - coverage(index, index.requirement_mine)
+    return np.clip(np.rint(index.fit + 100 * change), 0, 100).astype(np.int16)
+
+
+def apply(
+    index: EvaluationIndex,
+    estimated: np.ndarray,
+    rows: np.ndarray,
+    levels: dict[str, int],
+    profile: Profile = DEFAULT_PROFILE,
+) -> int:
+    """Store the estimates of `rows` as current evaluations, returning how many.
+
+    Evaluations that are current already or stale for more than skills.txt,
+    see ai_evaluator.context_fingerprint, are left as they are.
+    """
+    store = job_store()
+    fingerprint = prompt_fingerprint(profile)
+    context = context_fingerprint(profile)
+    updated = []
+    for row in rows:
+        job_id = str(index.job_id[row])
+        cached = store.get_evaluation(job_id, profile.name)
+        if cached is None or cached[1] == fingerprint or cached[2] != context:
+            continue
+        evaluation = json.loads(cached[0])
+        for requirement in evaluation["requirements"]:
+            level = _matching_level(requirement["skill"].strip().lower(), levels)
+            if level:
+                requirement["my_proficiency_level_1_to_5"] = level
+        evaluation["fit_to_requirements_percentage"] = int(estimated[row])
+        updated.append(
+            (
+                profile.name,
+                job_id,
+                int(estimated[row]),
+                fingerprint,
+                context,
+                json.dumps(evaluation),
+            )
+        )
+    store.put_evaluations(updated)
+    return len(updated)
+
+
+def rescore(
+    profile: Profile = DEFAULT_PROFILE,
+    threshold: int = THRESHOLD,
+    index: Optional[EvaluationIndex] = None,
+) -> tuple[EvaluationIndex, np.ndarray, np.ndarray, dict[str, int]]:
+    """Index, estimated fits, rows crossing `threshold` and the skill levels."""
+    index = index if index is not None else evaluation_index(profile=profile)
+    with open(profile.path("skills.txt"), "r", encoding="utf-8") as f:
+        levels = parse_skills(f.read())
+    estimated = estimated_fits(index, skill_levels(index, levels))
+    crossing = np.flatnonzero((index.fit >= threshold) != (estimated >= threshold))
+    return index, estimated, crossing, levels
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-score evaluations locally")
+    parser.add_argument("--threshold", type=int, default=THRESHOLD)
+    parser.add_argument("--profile", default="", help="name of a profile")
+    parser.add_argument("--top", type=int, default=20, help="crossing jobs to show")
+    parser.add_argument(
+        "--apply", action="store_true", help="store the estimates of the others"
+    )
+    parser.add_argument(
+        "--evaluate", action="store_true", help="re-evaluate the crossing jobs"
+    )
+    args = parser.parse_args()
+
+    rescore_profile = load_profile(args.profile)
+    index = evaluation_index(profile=rescore_profile)
+    start = time.perf_counter()
+    index, estimated, crossing, levels = rescore(rescore_profile, args.threshold, index)
+    seconds = time.perf_counter() - start
+    up = int(np.count_nonzero(estimated[crossing] >= args.threshold))
+    changed = int(np.count_nonzero(np.abs(estimated - index.fit) >= 5))
+    print(
+        f"Re-scored {len(index)} evaluations in {seconds * 1000:.0f}ms: "
+        f"{changed} changed by 5+ points, {len(crossing)} cross {args.threshold}% "
+        f"({up} up, {len(crossing) - up} down) and need a re-evaluation"
+    )
+    for row in crossing[np.argsort(-estimated[crossing], kind="stable")][: args.top]:
+        print(f"{estimated[row]:>3}% estimated, was {index.describe(row)}")
+    if args.apply:
+        keep = np.setdiff1d(np.arange(len(index)), crossing)
+        updated = apply(index, estimated, keep, levels, rescore_profile)
+        print(f"Updated {updated} evaluations to their estimate")
+    if args.evaluate:
+        for row in tqdm(crossing, desc="Re-evaluating crossing jobs"):
+            job = cached_job_description(str(index.job_id[row]))
+            cached_job_evaluation(job, rescore_profile)
@@ -0,0 +1,137 @@
+"""
+Journal of a run, so a crashed or interrupted run resumes where it stopped.
+
+The journal lives in the job store next to the caches. It records how far
+each search got, so search pages are not fetched again, and the last stage
+every job went through: search, fetch, prefilter or publish, once it is
+published for every profile. Evaluations are cached, see ai_evaluator.py. A run
+that did not finish is resumed by the next one, which continues its searches
+from their frontier and feeds its unfinished jobs back into the pipeline.
+
+Jobs whose fetch or evaluation fails go to a retry queue instead of aborting
+the run. Every run retries them first, up to MAX_ATTEMPTS times. Jobs deferred
+by the evaluation budget go to the retry queue too, without using an attempt.
+
+Run this script to see the state of the latest run and the retry queue.
+"""
+
+import functools
+import threading
+from datetime import datetime
+from typing import Iterable, Optional
+
+from job_store import JobStore, job_store
+from metrics import METRICS
+
+MAX_ATTEMPTS = 3
+LAST_STAGE = "publish"
+
+
+class RunJournal:
+    """Checkpoints of the current run, started or resumed on first use."""
+
+    def __init__(self, store: JobStore):
+        self.store = store
+        self.resumed = False
+        self._run_id: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def run_id(self) -> int:
+        """Id of the current run."""
+        with self._lock:
+            if self._run_id is None:
+                self._run_id = self._start()
+            return self._run_id
+
+    def _start(self) -> int:
+        last = self.store.last_run()
+        if last is not None and last[1] is None:
+            self.resumed = True
+            return last[0]
+        return self.store.start_run(datetime.now().isoformat(timespec="seconds"))
+
+    def finish(self) -> None:
+        """Mark the run as finished, the next run starts a new one."""
+        self.store.finish_run(self.run_id, datetime.now().isoformat(timespec="seconds"))
+        with self._lock:
+            self._run_id = None
+            self.resumed = False
+
+    def frontier(self, search: str) -> tuple[int, int, bool]:
+        """Next offset, ids found and whether a search is done."""
+        return self.store.get_search_frontier(self.run_id, search) or (0, 0, False)
+
+    def record_page(
+        self, search: str, next_offset: int, found: int, done: bool = False
+    ) -> None:
+        """Record that a search got up to `next_offset`."""
+        self.store.put_search_frontier(self.run_id, search, next_offset, found, done)
+
+    def record(self, job_ids: Iterable[str], stage: str) -> None:
+        """Record that jobs went through a stage."""
+        self.store.put_run_jobs(self.run_id, job_ids, stage, "ok")
+
+    def record_skipped(self, job_ids: Iterable[str], stage: str) -> None:
+        """Record that jobs were dropped on purpose, e.g. by the pre-filter."""
+        self.store.put_run_jobs(self.run_id, job_ids, stage, "skipped")
+
+    def record_deferred(self, job_ids: Iterable[str], stage: str) -> None:
+        """Put jobs into the retry queue without counting an attempt."""
+        self.store.put_run_jobs(self.run_id, job_ids, stage, "deferred")
+
+    def record_failure(self, job_id: str, stage: str, error: Exception) -> None:
+        """Put a job into the retry queue."""
+        self.store.put_run_failure(self.run_id, job_id, stage, str(error))
+        METRICS.increment("run_job_failures_total", stage=stage)
+
+    def job_ids(self) -> set[str]:
+        """Ids of all jobs recorded in this run."""
+        return self.store.get_run_job_ids(self.run_id)
+
+    def retry_queue(self) -> list[tuple[str, str, int, str]]:
+        """Job id, stage, attempts and error of the failed or deferred jobs."""
+        return self.store.get_failed_jobs(MAX_ATTEMPTS)
+
+    def pending(self) -> list[str]:
+        """Ids of the jobs to feed into the pipeline before searching.
+
+        The failed jobs to retry, then the unfinished jobs of a resumed run.
+        """
+        run_id = self.run_id
+        retries = [job_id for job_id, *_ in self.retry_queue()]
+        unfinished = self.store.get_unfinished_jobs(run_id, LAST_STAGE)
+        return list(dict.fromkeys(retries + unfinished))
+
+    def summary(self) -> str:
+        """Human readable summary."""
+        run_id = self.run_id
+        action = "Resuming" if self.resumed else "Starting"
+        unfinished = self.store.get_unfinished_jobs(run_id, LAST_STAGE)
+        return (
+            f"📒 {action} run {run_id}: {len(unfinished)} unfinished jobs, "
+            f"{len(self.retry_queue())} failed jobs to retry"
+        )
+
+
+@functools.cache
+def run_journal() -> RunJournal:
+    """The journal shared by the whole process."""
+    return RunJournal(job_store())
+
+
+if __name__ == "__main__":
+    journal = run_journal()
+    last = job_store().last_run()
+    if last is None:
+        print("No runs yet")
+    elif last[1] is None:
+        unfinished = job_store().get_unfinished_jobs(last[0], LAST_STAGE)
+        print(f"Run {last[0]} did not finish, {len(unfinished)} jobs to resume")
+    else:
+        print(f"Run {last[0]} finished at {last[1]}")
+    for job_id, stage, attempts, error in journal.retry_queue():
+        if error is None:
+            print(f"{job_id}: {stage} deferred by the budget")
+            continue
+        print(f"{job_id}: {stage} failed {attempts}x: {error.splitlines()[0]}")
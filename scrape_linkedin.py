@@ -3,15 +3,18 @@ This script scrapes jobs from LinkedIn.
 """
 
 import re
-import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from enum import Enum
+from typing import Iterator
 from urllib.parse import quote
 
-import requests
-from bs4 import BeautifulSoup
 from tqdm import tqdm
 
+import http_client
+import linkedin_html
+from http_cache import http_cache
 from job_description import JobDescription, cache_job_description
 
 BASE_SEARCH_URL = (
@@ -56,6 +59,7 @@ def format_search_url(
     post_time: PostingTime = PostingTime.PAST_WEEK,
     remote: Remote = Remote.ANY,
     offset: int = 0,
+    sort_by_date: bool = False,
 ) -> str:
     """Format the search URL"""
     return BASE_SEARCH_URL + "".join(
@@ -66,6 +70,7 @@ def format_search_url(
             "&f_JT=F",  # Full-time
             post_time.value,
             remote.value,
+            "&sortBy=DD" if sort_by_date else "",  # Newest first
             f"&start={offset}",
         ]
     )
@@ -73,20 +78,44 @@ def format_search_url(
 
 def get_search_page(search_url: str) -> list[str]:
     """Get the search page"""
-    l = []
-    res = requests.get(search_url, timeout=30)
-    all_jobs_on_this_page = BeautifulSoup(res.text, "html.parser").find_all("li")
-    for job_item in all_jobs_on_this_page:
-        try:
-            jobid = (
-                job_item.find(attrs={"data-entity-urn": True})
-                .get("data-entity-urn")
-                .split(":")[3]
-            )
-            l.append(jobid)
-        except (AttributeError, IndexError) as e:
-            print(f"Failed to parse this job item:\n{job_item}\nError: {e}")
-    return l
+    res = http_client.get(search_url)
+    return linkedin_html.EXTRACTOR.job_ids(res.text)
+
+
+@dataclass(frozen=True)
+class Search:
+    """A LinkedIn job search"""
+
+    search_query: str
+    num_results: int
+    geo_id: Geoid = Geoid.BERLIN
+    post_time: PostingTime = PostingTime.PAST_WEEK
+    remote: Remote = Remote.ANY
+    sort_by_date: bool = False
+
+    def url(self, offset: int) -> str:
+        """URL of the search page starting at `offset`"""
+        return format_search_url(
+            self.search_query,
+            self.geo_id,
+            self.post_time,
+            self.remote,
+            offset,
+            self.sort_by_date,
+        )
+
+
+def iter_search_pages(search: Search) -> Iterator[list[str]]:
+    """Yield the job ids of each search page until `num_results` are found"""
+    found: set[str] = set()
+    start = 0
+    while len(found) < search.num_results:
+        page = get_search_page(search.url(start))
+        if len(page) == 0:
+            break
+        found.update(page)
+        yield page
+        start += len(page)
 
 
 def crawl_search(
@@ -98,15 +127,10 @@ def crawl_search(
 ) -> list[str]:
     """Crawl the search"""
     out: set[str] = set()
-    start = 0
-    while len(out) < num_results:
-        search_url = format_search_url(search_query, geo_id, post_time, remote, start)
-        page = get_search_page(search_url)
-        if len(page) == 0:
-            break
+    search = Search(search_query, num_results, geo_id, post_time, remote)
+    for page in iter_search_pages(search):
         out.update(page)
         print(f"Found {len(out)} jobs")
-        start += len(page)
     return list(out)
 
 
@@ -138,50 +162,25 @@ def parse_posted_time(posted: str) -> str:
 def get_linkedin_job_description(job_id: str) -> JobDescription:
     """Get the job description from LinkedIn"""
     job_url = JOB_URL.format(job_id=job_id)
-    resp = requests.get(job_url, timeout=30)
-    if resp.status_code == 429:
-        print("😴 Rate limited, sleeping for 5 seconds")
-        time.sleep(5)
-        resp = requests.get(job_url, timeout=30)
+    resp = http_client.get(job_url)
     if not resp.ok:
-        raise RuntimeError(f"Failed to fetch job {job_id}")
-    soup = BeautifulSoup(resp.text, "html.parser")
-    try:
-        company_elem = soup.find("a", class_="topcard__org-name-link") or soup.find(
-            "span", class_="topcard__flavor"
-        )
-        title_h2 = soup.find("h2", class_="top-card-layout__title")
-        desc_elem = soup.find("div", class_="show-more-less-html__markup")
-        date_elem = soup.find(
-            "span", class_=lambda c: c and ("posted-time-ago__text" in c)
+        raise RuntimeError(
+            f"Failed to fetch job {job_id}: {resp.status_code} {resp.reason}"
         )
-
-        if (
-            company_elem is None
-            or title_h2 is None
-            or desc_elem is None
-            or date_elem is None
-            or title_h2.parent is None
-        ):
-            raise AttributeError("Failed to find required elements")
-
-        company = company_elem.text.strip()
-        title = title_h2.text.strip()
-        url = title_h2.parent.get("href")
-        if not isinstance(url, str):
-            raise AttributeError("Failed to find valid URL")
-        description = desc_elem.get_text("\n", strip=True)
-        date_posted = parse_posted_time(date_elem.text.strip())
+    try:
+        posting = linkedin_html.EXTRACTOR.job_posting(resp.text)
     except (AttributeError, IndexError) as e:
+        # Don't request it again on every run
+        http_cache().mark_unparseable(job_url, f"{type(e).__name__}: {e}")
         raise RuntimeError(f"Failed to parse job {job_id}: {e}\n{resp.text}") from e
 
     return JobDescription(
         job_id=job_id,
-        url=url,
-        company=company,
-        title=title,
-        description=description,
-        posted_date=date_posted,
+        url=posting.url,
+        company=posting.company,
+        title=posting.title,
+        description=posting.description,
+        posted_date=parse_posted_time(posting.posted),
     )
 
 
@@ -191,10 +190,15 @@ def scrape_linkedin(
     geo_id: Geoid = Geoid.BERLIN,
     post_time: PostingTime = PostingTime.PAST_WEEK,
     remote: Remote = Remote.ANY,
+    max_workers: int = 8,
 ) -> list[JobDescription]:
-    """Scrape LinkedIn"""
+    """Scrape LinkedIn, fetching job descriptions concurrently"""
     job_ids = crawl_search(search_query, num_results, geo_id, post_time, remote)
-    job_descriptions = []
-    for job_id in tqdm(job_ids, desc="Scraping LinkedIn job descriptions"):
-        job_descriptions.append(get_linkedin_job_description(job_id))
-    return job_descriptions
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(
+            tqdm(
+                executor.map(get_linkedin_job_description, job_ids),
+                total=len(job_ids),
+                desc="Scraping LinkedIn job descriptions",
+            )
+        )
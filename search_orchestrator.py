@@ -0,0 +1,192 @@
+"""
+Concurrent orchestration of many LinkedIn searches.
+
+A matrix of queries, regions and remote modes runs with several searches in
+flight. Each search fetches its next pages speculatively while the current
+one is processed. All searches share one set of seen job ids, so a posting
+found by several queries is yielded once. A search stops paging as soon as
+a page holds only ids that are already in the job store, so scheduled runs
+only touch new postings, and the stored ones whose evaluation is stale.
+
+With a run journal, every processed page is checkpointed, so a resumed run
+continues each search where it stopped, see run_journal.py.
+"""
+
+import itertools
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional
+
+import scrape_linkedin
+from job_store import job_store
+from metrics import METRICS
+from run_journal import RunJournal
+from scrape_linkedin import Geoid, PostingTime, Remote, Search
+
+MAX_SEARCHES = 4  # Searches in flight
+PREFETCH_PAGES = 2  # Pages requested ahead of the one being processed, at least 1
+
+DONE = object()  # Sentinel of a finished search
+
+# Ids known to be in the job store, kept warm across the runs of a long-lived
+# process, see daemon.py. Stored jobs are never removed from the store.
+_stored_ids: set[str] = set()
+
+
+def search_matrix(
+    queries: Iterable[str],
+    geo_ids: Iterable[Geoid] = (Geoid.BERLIN,),
+    remotes: Iterable[Remote] = (Remote.ANY,),
+    num_results: int = 100,
+    post_time: PostingTime = PostingTime.PAST_WEEK,
+) -> list[Search]:
+    """Every combination of query, region and remote mode, newest postings first."""
+    return [
+        Search(query, num_results, geo_id, post_time, remote, sort_by_date=True)
+        for query, geo_id, remote in itertools.product(queries, geo_ids, remotes)
+    ]
+
+
+class SearchOrchestrator:
+    """Runs searches concurrently, yielding every new job id once.
+
+    With `stop_on_known`, a search stops at the first page whose ids were all
+    stored before this run, which assumes its results are sorted newest first.
+    Ids found by other searches of the same run don't stop it, e.g. Berlin
+    postings found again by a search in Germany.
+
+    Ids stored before this run are only yielded if `stale` returns them, e.g.
+    because their evaluation was made with an older CV. Ids in `seen` are never
+    yielded, e.g. because they are already queued.
+    With a `journal`, found ids and search frontiers are recorded as pages are
+    processed, and searches of a resumed run continue from their frontier.
+    """
+
+    def __init__(
+        self,
+        max_searches: int = MAX_SEARCHES,
+        prefetch: int = PREFETCH_PAGES,
+        stop_on_known: bool = True,
+        journal: Optional[RunJournal] = None,
+        seen: Iterable[str] = (),
+        stale: Optional[Callable[[list[str]], set[str]]] = None,
+    ):
+        self.max_searches = max_searches
+        self.prefetch = prefetch
+        self.stop_on_known = stop_on_known
+        self.journal = journal
+        self.seen: set[str] = set(seen)
+        self.stale = stale
+        if journal is not None:
+            self.seen.update(journal.job_ids())
+        self.known: set[str] = set()  # Seen ids stored before this run
+        self.pages = 0
+        self.stopped_early = 0
+        self._lock = threading.Lock()
+
+    def _claim(self, ids: list[str]) -> tuple[list[str], bool]:
+        """Ids of a page to yield and whether all were stored before this run."""
+        with self._lock:
+            unseen = list(dict.fromkeys(i for i in ids if i not in self.seen))
+            unknown = [i for i in unseen if i not in _stored_ids]
+            stored = job_store().existing_job_ids(unknown) if unknown else set()
+            _stored_ids.update(stored)
+            stored.update(i for i in unseen if i in _stored_ids)
+            self.seen.update(unseen)
+            self.known.update(stored)
+            all_known = all(job_id in self.known for job_id in ids)
+        revisit = self.stale(list(stored)) if self.stale and stored else set()
+        return [i for i in unseen if i not in stored or i in revisit], all_known
+
+    def _crawl(
+        self, search: Search, page_pool: ThreadPoolExecutor, out: queue.Queue
+    ) -> None:
+        """Page through a search, putting its new ids into `out`."""
+        key = search.url(0).partition("?")[2]  # Independent of the host
+        offset, found_before, done = (
+            self.journal.frontier(key) if self.journal else (0, 0, False)
+        )
+        pending: deque[tuple[int, Future]] = deque()
+        try:
+            if done:
+                return
+            page = scrape_linkedin.get_search_page(search.url(offset))
+            page_size = len(page)
+            next_offset = offset + page_size
+            found: set[str] = set()
+            while page:
+                with self._lock:
+                    self.pages += 1
+                METRICS.increment("search_pages_total")
+                found.update(page)
+                new_ids, all_known = self._claim(page)
+                if self.journal:
+                    self.journal.record(new_ids, "search")
+                for job_id in new_ids:
+                    out.put(job_id)
+                if self.stop_on_known and all_known:
+                    with self._lock:
+                        self.stopped_early += 1
+                    METRICS.increment("search_early_stops_total")
+                    break
+                if (
+                    len(page) < page_size
+                    or found_before + len(found) >= search.num_results
+                ):
+                    break
+                if self.journal:
+                    self.journal.record_page(
+                        key, offset + len(page), found_before + len(found)
+                    )
+                # Speculate up to num_results, then one page at a time
+                while len(pending) < max(1, self.prefetch) and (
+                    next_offset < search.num_results or not pending
+                ):
+                    future = page_pool.submit(
+                        scrape_linkedin.get_search_page, search.url(next_offset)
+                    )
+                    pending.append((next_offset, future))
+                    next_offset += page_size
+                offset, future = pending.popleft()
+                page = future.result()
+            if self.journal:
+                self.journal.record_page(key, offset, found_before + len(found), True)
+        except Exception as e:
+            print(f"⚠️  Search {search.search_query} failed: {e}")
+        finally:
+            for _, future in pending:
+                future.cancel()
+            out.put(DONE)
+
+    def run(self, searches: list[Search]) -> Iterator[str]:
+        """Yield the new job ids of all searches as their pages arrive."""
+        out: queue.Queue = queue.Queue()
+        workers = max(1, min(self.max_searches, len(searches)))
+        with ThreadPoolExecutor(workers) as search_pool, ThreadPoolExecutor(
+            workers * self.prefetch or 1
+        ) as page_pool:
+            for search in searches:
+                search_pool.submit(self._crawl, search, page_pool, out)
+            running = len(searches)
+            while running:
+                item = out.get()
+                if item is DONE:
+                    running -= 1
+                else:
+                    yield item
+
+    def summary(self) -> str:
+        """Human readable summary."""
+        return (
+            f"🔎 {len(self.seen)} job ids seen in {self.pages} search pages, "
+            f"{self.stopped_early} searches stopped at known postings"
+        )
+
+
+def crawl_searches(searches: list[Search], **kwargs) -> Iterator[str]:
+    """New job ids of all searches, see SearchOrchestrator."""
+    orchestrator = SearchOrchestrator(**kwargs)
+    yield from orchestrator.run(searches)
+    print(orchestrator.summary())